@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ActivationConfig(AppConfig):
     name = 'activation'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,9 @@
+from .validity import current_validity, days_remaining
+
+
+def validity(request):
+    """`validity` and `validityDaysRemaining` for templates, read from the in-process copy."""
+    return {
+        'validity': current_validity(),
+        'validityDaysRemaining': days_remaining(),
+    }
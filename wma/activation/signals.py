@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Validity
+from .validity import invalidate_validity
+
+
+@receiver([post_save, post_delete], sender=Validity)
+def expire_cached_validity(sender, instance, **kwargs):
+    invalidate_validity()
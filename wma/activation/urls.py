@@ -1,7 +1,7 @@
-from django.conf.urls import url
+from django.urls import path
 from .views import *
 
 urlpatterns = [
     # pages
-    url(r'^$', activate, name='activate'),
-    ]
\ No newline at end of file
+    path('', activate, name='activate'),
+    ]
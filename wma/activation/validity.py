@@ -0,0 +1,51 @@
+import threading
+import time
+from datetime import date
+
+from .models import Validity
+
+# other processes see a changed Validity row after at most this long
+REFRESH_AFTER = 60 * 5
+
+_lock = threading.Lock()
+_window = None
+_loaded_at = None
+
+
+def _load():
+    return Validity.objects.order_by('-id').values('activationDate', 'expiryDate', 'activationType').first()
+
+
+def current_validity():
+    """
+    The newest activation window as a dict (activationDate, expiryDate, activationType), or None
+    when the app was never activated. Kept in process memory and re-read every REFRESH_AFTER
+    seconds, or on the next call after a Validity row is saved in this process.
+    """
+    global _window, _loaded_at
+    if _loaded_at is None or time.monotonic() - _loaded_at > REFRESH_AFTER:
+        with _lock:
+            if _loaded_at is None or time.monotonic() - _loaded_at > REFRESH_AFTER:
+                _window = _load()
+                _loaded_at = time.monotonic()
+    return _window
+
+
+def invalidate_validity():
+    global _loaded_at
+    _loaded_at = None
+
+
+def is_valid(today=None):
+    window = current_validity()
+    if window is None or window['expiryDate'] is None:
+        return False
+    return window['expiryDate'] >= (today or date.today())
+
+
+def days_remaining(today=None):
+    """Days left including today, 0 once expired, None when never activated."""
+    window = current_validity()
+    if window is None or window['expiryDate'] is None:
+        return None
+    return max((window['expiryDate'] - (today or date.today())).days + 1, 0)
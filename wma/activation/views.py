@@ -3,22 +3,17 @@ from functools import wraps
 from django.shortcuts import render, redirect
 
 # Create your views here.
-from .models import *
-from datetime import datetime, date
+from .validity import is_valid
 
 
 def is_activated():
+    # answered from the in-process validity window, no query per request
     def _is_activated(view_func):
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
-            try:
-                val = Validity.objects.last()
-
-                if val.expiryDate < datetime.today().date():
-                    return redirect('/activate/')
-                return view_func(request, *args, **kwargs)
-            except:
-                return view_func(request, *args, **kwargs)
+            if not is_valid():
+                return redirect('/activate/')
+            return view_func(request, *args, **kwargs)
 
         return wrapper
 
@@ -0,0 +1,25 @@
+// Keyset paging for server side DataTables (see utils/keyset_pagination.py).
+// Use `ajax: keysetAjax(url)`. Every response carries the cursor of the next page; when the
+// user moves to that page the cursor is sent back, so the server seeks to it instead of
+// skipping `start` rows. Any other jump, sort or search change falls back to plain paging.
+function keysetAjax(url) {
+    return {
+        url: url,
+        data: function (data, settings) {
+            var query = JSON.stringify([settings.ajax.url, data.order, data.search, data.columns, data.length]);
+            if (!settings.keyset || settings.keyset.query !== query) {
+                settings.keyset = {query: query, cursors: {}};
+            }
+            data.keyset = 1;
+            if (settings.keyset.cursors[data.start]) {
+                data.cursor = settings.keyset.cursors[data.start];
+            }
+        }
+    };
+}
+
+$(document).on('xhr.dt', function (e, settings, json) {
+    if (settings.keyset && json && json.nextCursor) {
+        settings.keyset.cursors[json.nextStart] = json.nextCursor;
+    }
+});
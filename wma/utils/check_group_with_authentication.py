@@ -19,8 +19,8 @@ def check_groups(*group_names):
                 logout(request)
                 return redirect('/')  # Or your login URL
 
-            # Step 2: Check group membership
-            if request.user.groups.filter(name__in=group_names).exists():
+            # Step 2: Check group membership (groups come from the session cached tenant context)
+            if request.tenant.has_group(*group_names):
                 return view_func(request, *args, **kwargs)
 
             # Step 3: If not in allowed groups, deny access
@@ -0,0 +1,77 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Sum
+
+from utils.logger import logger
+from wmaApp.models import Customer, CustomerBalance, CustomerLedger
+
+
+def lock_customer_balance(owner_id, customer_id):
+    """
+    The customer's balance row, locked until the end of the transaction. Every ledger write of
+    the customer goes through it, so they are applied one at a time.
+    A missing row is created from the customer's live ledger entries, which customers from
+    before the balance rows were introduced may already have.
+    """
+    head = CustomerBalance.objects.select_for_update().filter(customerID_id=customer_id).first()
+    if head is not None:
+        return head
+    live = CustomerLedger.objects.filter(customerID_id=customer_id, isDeleted=False)
+    totals = live.aggregate(credit=Sum("credit"), debit=Sum("debit"))
+    last = live.order_by("-id").values_list("balance", "addedDate").first()
+    try:
+        with transaction.atomic():
+            CustomerBalance.objects.create(
+                ownerID_id=owner_id,
+                customerID_id=customer_id,
+                totalCredit=totals["credit"] or 0,
+                totalDebit=totals["debit"] or 0,
+                balance=last[0] if last else 0,
+                lastTransactionDate=last[1] if last else None,
+            )
+    except IntegrityError:
+        # another request created the row first
+        pass
+    return CustomerBalance.objects.select_for_update().get(customerID_id=customer_id)
+
+
+def rebuild_customer_balances(owner_id=None, batch_size=1000):
+    """Recompute every CustomerBalance row from CustomerLedger. Returns the number of rows written."""
+    customers = Customer.objects.all()
+    ledgers = CustomerLedger.objects.filter(isDeleted=False, customerID__isnull=False)
+    if owner_id is not None:
+        customers = customers.filter(ownerID_id=owner_id)
+        ledgers = ledgers.filter(customerID__ownerID_id=owner_id)
+
+    totals = {
+        row["customerID_id"]: row
+        for row in ledgers.values("customerID_id").annotate(
+            total_credit=Sum("credit"),
+            total_debit=Sum("debit"),
+            last_date=Max("addedDate"),
+        ).order_by()
+    }
+
+    rows = []
+    for customer_id, customer_owner_id in customers.values_list("id", "ownerID_id").iterator(chunk_size=batch_size):
+        total = totals.get(customer_id, {})
+        credit = total.get("total_credit") or 0
+        debit = total.get("total_debit") or 0
+        rows.append(
+            CustomerBalance(
+                ownerID_id=customer_owner_id,
+                customerID_id=customer_id,
+                totalCredit=credit,
+                totalDebit=debit,
+                balance=credit - debit,
+                lastTransactionDate=total.get("last_date"),
+            )
+        )
+
+    with transaction.atomic():
+        existing = CustomerBalance.objects.all()
+        if owner_id is not None:
+            existing = existing.filter(customerID__ownerID_id=owner_id)
+        existing.delete()
+        CustomerBalance.objects.bulk_create(rows, batch_size=batch_size)
+    logger.info(f"Customer balances rebuilt for owner {owner_id or 'All'}: {len(rows)} rows")
+    return len(rows)
@@ -0,0 +1,195 @@
+import csv
+import io
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db import transaction
+
+from utils.document_number import CUSTOMER_PREFIX, allocate_document_numbers, format_document_number
+from utils.logger import logger
+from utils.search_index import index_objects
+from utils.versioned_cache import bump_model_version
+from wmaApp.models import Customer, CustomerBalance, Location
+
+REQUIRED_COLUMNS = {"Name", "Location", "Address"}
+# rows written per transaction; a failing chunk only loses its own rows
+CHUNK_SIZE = 500
+# the response lists this many row errors, the rest are only counted
+MAX_REPORTED_ERRORS = 200
+PROGRESS_TIMEOUT = 60 * 60
+
+FIELD_LENGTH = Customer._meta.get_field("name").max_length
+
+
+class CustomerImportError(ValueError):
+    pass
+
+
+def import_progress_key(owner_id, import_id):
+    return f"CustomerImport{owner_id}:{import_id}"
+
+
+class CustomerImport:
+    """
+    Import customers from a CSV file with Name, Location and Address (and optionally Phone)
+    columns. The file is read row by row; the owner's locations and existing customers are
+    loaded once, and new customers are written with bulk_create in chunks of CHUNK_SIZE.
+    A row whose name, address and location (case-insensitive) already exist is skipped.
+    """
+
+    def __init__(self, owner_id, staff_id, import_id=None, chunk_size=CHUNK_SIZE):
+        self.owner_id = owner_id
+        self.staff_id = staff_id
+        self.import_id = import_id
+        self.chunk_size = chunk_size
+        self.rows = 0
+        self.created = 0
+        self.duplicates = 0
+        self.error_count = 0
+        self.errors = []
+        self.locations = {}
+        self.existing = set()
+
+    def run(self, binary_file, total_bytes=None):
+        text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+        try:
+            return self._run(csv.DictReader(text), binary_file, total_bytes)
+        except UnicodeDecodeError:
+            raise CustomerImportError(f"Line {self.rows + 2} is not UTF-8 text, please save the file as CSV UTF-8")
+        finally:
+            # leave the upload open for its owner
+            text.detach()
+
+    def _run(self, reader, binary_file, total_bytes):
+        if not REQUIRED_COLUMNS.issubset(reader.fieldnames or ()):
+            raise CustomerImportError("CSV must contain Name, Location and Address columns")
+        self._preload()
+
+        chunk = []
+        for line_number, row in enumerate(reader, start=2):
+            self.rows += 1
+            customer = self._customer_from_row(line_number, row)
+            if customer is not None:
+                chunk.append((line_number, customer))
+            if len(chunk) == self.chunk_size:
+                self._write_chunk(chunk)
+                chunk = []
+                self._report_progress(binary_file, total_bytes)
+        if chunk:
+            self._write_chunk(chunk)
+        if self.created:
+            bump_model_version(Customer, self.owner_id)
+        self._report_progress(binary_file, total_bytes, done=True)
+        logger.info(
+            f"Customer import for owner {self.owner_id}: {self.rows} rows, {self.created} created, "
+            f"{self.duplicates} duplicates, {self.error_count} errors"
+        )
+        return self.result()
+
+    def result(self, done=True):
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "duplicates": self.duplicates,
+            "errorCount": self.error_count,
+            "errors": self.errors,
+            "done": done,
+        }
+
+    def _preload(self):
+        for pk, name, _ in Location.objects.filter(ownerID_id=self.owner_id).order_by(
+            "-isDeleted", "pk"
+        ).values_list("pk", "name", "isDeleted"):
+            # a live location wins over a deleted one with the same name
+            self.locations[(name or "").strip().lower()] = pk
+        self.existing = {
+            self._customer_key(name, address, location_id)
+            for name, address, location_id in Customer.objects.filter(ownerID_id=self.owner_id).values_list(
+                "name", "address", "locationID_id"
+            )
+        }
+
+    @staticmethod
+    def _customer_key(name, address, location_id):
+        return (name or "").strip().lower(), (address or "").strip().lower(), location_id
+
+    def _error(self, line_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_number, "error": message})
+
+    def _customer_from_row(self, line_number, row):
+        name = (row.get("Name") or "").strip()
+        location_name = (row.get("Location") or "").strip()
+        address = (row.get("Address") or "").strip()
+        phone = (row.get("Phone") or "").strip()
+        missing = [column for column, value in (("Name", name), ("Location", location_name), ("Address", address))
+                   if not value]
+        if missing:
+            self._error(line_number, f"{', '.join(missing)} is required")
+            return None
+        too_long = [column for column, value in (("Name", name), ("Location", location_name), ("Address", address),
+                                                 ("Phone", phone)) if len(value) > FIELD_LENGTH]
+        if too_long:
+            self._error(line_number, f"{', '.join(too_long)} is longer than {FIELD_LENGTH} characters")
+            return None
+
+        location_id = self._location_id(location_name)
+        key = self._customer_key(name, address, location_id)
+        if key in self.existing:
+            self.duplicates += 1
+            return None
+        self.existing.add(key)
+        return Customer(
+            name=name,
+            address=address,
+            phone=phone or None,
+            locationID_id=location_id,
+            ownerID_id=self.owner_id,
+            addedByID_id=self.staff_id,
+            addedDate=datetime.now(),
+        )
+
+    def _location_id(self, name):
+        key = name.lower()
+        if key not in self.locations:
+            # new locations are few, and created one by one so their signals run
+            self.locations[key] = Location.objects.create(name=name, ownerID_id=self.owner_id).pk
+        return self.locations[key]
+
+    def _write_chunk(self, chunk):
+        customers = [customer for _, customer in chunk]
+        try:
+            with transaction.atomic():
+                numbers = allocate_document_numbers(self.owner_id, CUSTOMER_PREFIX, len(customers))
+                for customer, number in zip(customers, numbers):
+                    customer.customerId = format_document_number(CUSTOMER_PREFIX, number)
+                Customer.objects.bulk_create(customers, batch_size=self.chunk_size)
+                # bulk_create does not return ids on every backend, read them back by number
+                ids = list(Customer.objects.filter(
+                    ownerID_id=self.owner_id, customerId__in=[customer.customerId for customer in customers]
+                ).values_list("pk", flat=True))
+                CustomerBalance.objects.bulk_create(
+                    [CustomerBalance(ownerID_id=self.owner_id, customerID_id=pk) for pk in ids],
+                    batch_size=self.chunk_size,
+                )
+                # bulk_create skips the post_save signals that keep the search tokens current
+                index_objects(Customer, ids)
+        except Exception as e:
+            logger.error(f"Customer import chunk at line {chunk[0][0]} failed: {e}")
+            for line_number, customer in chunk:
+                self.existing.discard(self._customer_key(customer.name, customer.address, customer.locationID_id))
+                self._error(line_number, "Could not be saved, please try this row again")
+            return
+        self.created += len(ids)
+
+    def _report_progress(self, binary_file, total_bytes, done=False):
+        if self.import_id is None:
+            return
+        progress = self.result(done=done)
+        if done or not total_bytes:
+            progress["percent"] = 100 if done else None
+        else:
+            # the reader buffers ahead, so this runs slightly ahead of the rows written
+            progress["percent"] = min(99, int(binary_file.tell() * 100 / total_bytes))
+        cache.set(import_progress_key(self.owner_id, self.import_id), progress, timeout=PROGRESS_TIMEOUT)
@@ -1,39 +1,152 @@
 from datetime import datetime
 
-from utils.get_user_id_detail import get_user_id, get_owner_id
+from django.db import connection, transaction
+from django.db.models import Max
+
+from utils.customer_balance import lock_customer_balance
+from utils.ledger_checkpoints import last_period_end, shift_checkpoints
+from utils.search_index import index_objects
+from utils.tenant_context import get_tenant_context
 from utils.logger import logger
-from wmaApp.models import CustomerLedger
+from utils.versioned_cache import expire_cached_model
+from wmaApp.models import AdvanceOrder, CustomerBalance, CustomerLedger, Payment, Sales
+
+CREDIT = 'credit'
+DEBIT = 'debit'
+REVERSED = {CREDIT: DEBIT, DEBIT: CREDIT}
+
+# model -> (payment type, amount field, date field) of the ledger entry a row posts; rows
+# without a date post on the day they were created
+LEDGER_SOURCES = {
+    Sales: (CREDIT, "totalAmountAfterTax", "saleDate"),
+    AdvanceOrder: (CREDIT, "totalAmountAfterTax", "orderDate"),
+    Payment: (DEBIT, "paymentAmount", "paymentDate"),
+}
+
+
+def append_ledger_entries(owner_id, staff_id, customer_id, entries, entry_date=None):
+    """
+    Append `entries`, (payment_type, amount, remark) tuples, to the customer's ledger in order
+    and return the saved CustomerLedger rows.
+    The previous balance is read from the customer's CustomerBalance row under a row lock, so
+    concurrent appends for one customer queue up behind each other instead of both chaining
+    onto the same balance. The entries and the new balance are written with one insert and
+    one update, however many entries there are.
+    """
+    entry_date = entry_date or datetime.now().date()
+    with transaction.atomic():
+        head = lock_customer_balance(owner_id, customer_id)
+        balance = head.balance
+        total_credit = head.totalCredit
+        total_debit = head.totalDebit
+        ledgers = []
+        for payment_type, amount, remark in entries:
+            # Convert amount to float to ensure numeric operations
+            amount = float(amount)
+            ledger = CustomerLedger(
+                ownerID_id=owner_id,
+                customerID_id=customer_id,
+                addedByID_id=staff_id,
+                addedDate=entry_date,
+                remark=remark,
+                balanceAtDate=balance,
+            )
+            if payment_type == CREDIT:
+                ledger.credit = amount
+                ledger.isCredit = True
+                balance += amount
+                total_credit += amount
+            elif payment_type == DEBIT:
+                ledger.debit = amount
+                balance -= amount
+                total_debit += amount
+            else:
+                raise ValueError(f"Unknown ledger payment type {payment_type!r}")
+            ledger.balance = balance
+            ledgers.append(ledger)
+
+        if connection.features.can_return_rows_from_bulk_insert:
+            CustomerLedger.objects.bulk_create(ledgers)
+        else:
+            # no ids back from bulk_create (MySQL); the customer's entries are appended under the
+            # lock, so the new ones are those past the customer's last id
+            last_id = CustomerLedger.objects.filter(customerID_id=customer_id).aggregate(last=Max("id"))["last"] or 0
+            CustomerLedger.objects.bulk_create(ledgers)
+            new_ids = CustomerLedger.objects.filter(customerID_id=customer_id, id__gt=last_id).order_by("id")
+            for ledger, pk in zip(ledgers, new_ids.values_list("id", flat=True)):
+                ledger.pk = pk
+        ids = [ledger.pk for ledger in ledgers]
+        CustomerBalance.objects.filter(pk=head.pk).update(
+            totalCredit=total_credit,
+            totalDebit=total_debit,
+            balance=balance,
+            lastTransactionDate=entry_date,
+            lastUpdatedOn=datetime.now(),
+        )
+        if entry_date <= last_period_end():
+            # back-dated into a month that may be checkpointed already
+            shift_checkpoints(
+                owner_id, customer_id, entry_date, total_credit - head.totalCredit, total_debit - head.totalDebit
+            )
+        # bulk_create skips the post_save signals that keep the search tokens and cached lists current
+        expire_cached_model(CustomerLedger, owner_id)
+        transaction.on_commit(lambda: index_objects(CustomerLedger, ids), robust=True)
+    logger.info(f"Customer Ledger Balance {customer_id}: {balance} after {len(ledgers)} entries")
+    return ledgers
+
+
+def ledger_date(value):
+    """A date or datetime (as the APIs assign before saving) as the date of a ledger entry."""
+    return value.date() if isinstance(value, datetime) else value
+
+
+def ledger_values(obj):
+    """
+    What `obj` currently posts to a customer ledger, as (customer, payment type, amount, date),
+    or None when it posts nothing (deleted). Take it once before changing a row and once after
+    saving, and pass both to apply_ledger_change.
+    """
+    payment_type, amount_field, date_field = LEDGER_SOURCES[type(obj)]
+    if obj.isDeleted or not obj.customerID_id:
+        return None
+    entry_date = ledger_date(getattr(obj, date_field) or obj.dateCreated)
+    return int(obj.customerID_id), payment_type, float(getattr(obj, amount_field) or 0), entry_date
+
+
+def apply_ledger_change(request, before, after, remark):
+    """
+    Move one row's ledger entry from `before` to `after` (either may be None) by appending a
+    reversing entry for `before` and a new entry for `after`, each dated like the row it
+    stands for. Posted entries are never rewritten, so the running balances after them stay
+    valid.
+    """
+    if before == after:
+        return
+    entries = {}
+    if before is not None:
+        customer_id, payment_type, amount, entry_date = before
+        entries.setdefault((customer_id, entry_date), []).append(
+            (REVERSED[payment_type], amount, f"Reversal: {remark}")
+        )
+    if after is not None:
+        customer_id, payment_type, amount, entry_date = after
+        entries.setdefault((customer_id, entry_date), []).append((payment_type, amount, remark))
+    for (customer_id, entry_date), customer_entries in entries.items():
+        generate_customer_ledger_entries(request, customer_id, customer_entries, entry_date)
+
 
-def generate_customer_ledger(request,customer_id, payment_type, amount, remark):
+def generate_customer_ledger_entries(request, customer_id, entries, entry_date=None):
+    """append_ledger_entries for the request's owner and staff; errors are logged and give None."""
     try:
-        ledger = CustomerLedger()
-        ledger.remark = remark
-        ledger.addedDate = datetime.now().date()
-        ledger.customerID_id = customer_id
-        try:
-            last_customer_ledger = CustomerLedger.objects.filter(customerID_id= customer_id).last()
-            bal = last_customer_ledger.balance
-        except:
-            bal = 0
-        # Convert amount to float to ensure numeric operations
-        amount = float(amount)
-        
-        if payment_type == 'credit':
-            ledger.credit = amount
-            ledger.balance = bal + amount
-            ledger.isCredit = True
-
-        if payment_type == 'debit':
-            ledger.debit = amount
-            ledger.balance = bal - amount
-        ledger.balanceAtDate = bal
-        ledger.ownerID_id = get_owner_id(request)
-        ledger.addedByID_id = get_user_id(request)
-        ledger.save()
-        logger.info("Customer Ledger Balance {}: {}".format(ledger.customerID.name, ledger.balance))
-        return ledger
+        tenant = get_tenant_context(request)
+        return append_ledger_entries(
+            tenant.owner_id, tenant.staff_id, customer_id, entries, ledger_date(entry_date)
+        )
     except Exception as e:
         logger.error(f"Error in generate_customer_ledger {e}")
         return None
 
 
+def generate_customer_ledger(request, customer_id, payment_type, amount, remark, entry_date=None):
+    ledgers = generate_customer_ledger_entries(request, customer_id, [(payment_type, amount, remark)], entry_date)
+    return ledgers[0] if ledgers else None
@@ -0,0 +1,97 @@
+from collections import defaultdict
+from datetime import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+
+from utils.logger import logger
+from wmaApp.models import DailySummary, Expense, JarCounter, Payment, Sales
+
+# model -> (date field, staff field, {DailySummary field: model field})
+SUMMARY_SOURCES = {
+    Sales: ("saleDate", "addedByID_id", {
+        "salesAmount": "totalAmount",
+        "salesAmountAfterTax": "totalAmountAfterTax",
+        "taxAmount": "totalTax",
+    }),
+    Payment: ("paymentDate", "addedByID_id", {"paymentAmount": "paymentAmount"}),
+    JarCounter: ("date", "addedByID_id", {"jarsIn": "inJar", "jarsOut": "outJar"}),
+    Expense: ("expenseDate", "staffID_id", {"expenseAmount": "expenseAmount"}),
+}
+
+SUMMARY_FIELDS = [field for _, _, fields in SUMMARY_SOURCES.values() for field in fields]
+
+
+def summary_values(obj):
+    """
+    What `obj` currently contributes to the daily summary, as (owner, date, staff, totals),
+    or None when it contributes nothing (deleted or undated). Take it once before changing
+    a row and once after saving, and pass both to apply_summary_change.
+    """
+    date_field, staff_field, fields = SUMMARY_SOURCES[type(obj)]
+    date = getattr(obj, date_field)
+    if obj.isDeleted or date is None:
+        return None
+    if isinstance(date, datetime):
+        date = date.date()
+    totals = {field: float(getattr(obj, source) or 0) for field, source in fields.items()}
+    return obj.ownerID_id, date, getattr(obj, staff_field), totals
+
+
+def apply_summary_change(before, after):
+    """Move one row's contribution from `before` to `after` (either may be None)."""
+    if before == after:
+        return
+    if before is not None:
+        owner_id, date, staff_id, totals = before
+        _add_to_daily_summary(owner_id, date, staff_id, {field: -value for field, value in totals.items()})
+    if after is not None:
+        _add_to_daily_summary(*after)
+
+
+def _add_to_daily_summary(owner_id, date, staff_id, totals):
+    # staffID may be NULL, which the unique constraint does not cover, so a race can leave two
+    # rows for the same key. Readers always sum the rows, so only one of them is updated here.
+    row_id = DailySummary.objects.filter(
+        ownerID_id=owner_id, date=date, staffID_id=staff_id
+    ).values_list("id", flat=True).first()
+    if row_id is not None:
+        DailySummary.objects.filter(pk=row_id).update(
+            **{field: F(field) + value for field, value in totals.items()},
+            lastUpdatedOn=datetime.now(),
+        )
+        return
+    try:
+        with transaction.atomic():
+            DailySummary.objects.create(ownerID_id=owner_id, date=date, staffID_id=staff_id, **totals)
+    except IntegrityError:
+        # another request created the row first
+        _add_to_daily_summary(owner_id, date, staff_id, totals)
+
+
+def rebuild_daily_summaries(owner_id=None, batch_size=1000):
+    """Recompute every DailySummary row from the transaction tables. Returns the number of rows written."""
+    rows = defaultdict(dict)
+    for model, (date_field, staff_field, fields) in SUMMARY_SOURCES.items():
+        source = model.objects.filter(isDeleted=False, **{f"{date_field}__isnull": False})
+        if owner_id is not None:
+            source = source.filter(ownerID_id=owner_id)
+        totals = source.values("ownerID_id", date_field, staff_field).annotate(
+            **{f"total_{field}": Sum(model_field) for field, model_field in fields.items()}
+        ).order_by()
+        for total in totals:
+            key = (total["ownerID_id"], total[date_field], total[staff_field])
+            rows[key].update({field: total[f"total_{field}"] or 0 for field in fields})
+
+    summaries = [
+        DailySummary(ownerID_id=owner, date=date, staffID_id=staff, **totals)
+        for (owner, date, staff), totals in rows.items()
+    ]
+    with transaction.atomic():
+        existing = DailySummary.objects.all()
+        if owner_id is not None:
+            existing = existing.filter(ownerID_id=owner_id)
+        existing.delete()
+        DailySummary.objects.bulk_create(summaries, batch_size=batch_size)
+    logger.info(f"Daily summaries rebuilt for owner {owner_id or 'All'}: {len(summaries)} rows")
+    return len(summaries)
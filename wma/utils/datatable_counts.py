@@ -0,0 +1,101 @@
+import hashlib
+import json
+from datetime import date
+
+from django.db import connection
+
+from utils.logger import logger
+from utils.versioned_cache import CACHED_VIEW_DEPENDENCIES, cached_value
+
+# a cached total is recounted at least this often, for writes that bypass the model signals
+COUNT_CACHE_TIMEOUT = 60 * 10
+# tables past this size show the planner's estimate, exact counts of them take too long
+LARGE_TABLE_ROWS = 100_000
+
+
+class CountingMixin:
+    """
+    Record counts for BaseDatatableView draws. Put it before BaseDatatableView in the bases.
+
+    - Counts run without ordering on get_count_queryset(), which views whose rows carry
+      annotations or extra joins override with just the filtered table.
+    - The unfiltered total is cached per owner (and per `count_cache_params` request values)
+      until a model the view depends on changes (CACHED_VIEW_DEPENDENCIES in versioned_cache).
+    - A draw without a search reuses the total instead of counting again.
+    - Above `count_estimate_threshold` rows the planner's row estimate is returned instead
+      (MySQL and PostgreSQL only).
+    """
+    count_cache_params = ()
+    count_estimate_threshold = None
+
+    def get_count_queryset(self):
+        """The rows the view can show, as cheap to count as possible; None counts the initial queryset."""
+        return None
+
+    def count_records(self, qs):
+        # get_context_data counts the initial queryset first, then the filtered one
+        if not hasattr(self, "_count_initial"):
+            self._count_initial = qs
+            self._count_total = self.count_total(qs)
+            return self._count_total
+        if qs is self._count_initial:
+            # no search, filter_queryset handed back the same queryset
+            return self._count_total
+        base = self.get_count_queryset()
+        return self.count_rows(qs if base is None else self.filter_queryset(base))
+
+    def count_total(self, qs):
+        base = self.get_count_queryset()
+        base = qs if base is None else base
+        key = self.count_cache_key()
+        if key is None:
+            return self.count_rows(base)
+        return cached_value(
+            type(self).__name__, self.request.tenant.owner_id, key, lambda: self.count_rows(base),
+            timeout=COUNT_CACHE_TIMEOUT,
+        )
+
+    def count_cache_key(self):
+        view_name = type(self).__name__
+        if view_name not in CACHED_VIEW_DEPENDENCIES:
+            return None
+        params = [self.request.GET.get(name, "") for name in self.count_cache_params]
+        # the date filtered views fall back to "today" when no range is given
+        params.append(date.today().isoformat())
+        digest = hashlib.sha1(repr(params).encode()).hexdigest()[:12]
+        return f"DatatableCount{view_name}{self.request.tenant.owner_id}:{digest}"
+
+    def count_rows(self, qs):
+        qs = qs.order_by()
+        if self.count_estimate_threshold is not None:
+            estimate = estimated_count(qs)
+            if estimate is not None and estimate > self.count_estimate_threshold:
+                return estimate
+        return qs.count()
+
+
+def estimated_count(qs):
+    """The planner's row estimate for `qs`, or None where the backend has none to offer."""
+    if connection.vendor not in ("mysql", "postgresql"):
+        return None
+    try:
+        plan = json.loads(qs.explain(format="json"))
+    except Exception as e:
+        logger.warning(f"Row estimate failed, counting instead: {e}")
+        return None
+    return _plan_rows(plan)
+
+
+def _plan_rows(node):
+    # PostgreSQL reports the rows of the whole plan first, MySQL those of the driving table
+    if isinstance(node, dict):
+        for key in ("Plan Rows", "rows_produced_per_join"):
+            if key in node:
+                return int(node[key])
+        node = list(node.values())
+    if isinstance(node, list):
+        for value in node:
+            rows = _plan_rows(value)
+            if rows is not None:
+                return rows
+    return None
@@ -0,0 +1,123 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+# alias the reads of the current block go to, None for the default routing
+_read_alias = ContextVar("read_alias", default=None)
+
+
+def _pin_key(user_id):
+    return f"DbPrimaryPin{user_id}"
+
+
+def pin_to_primary(user_id):
+    """Keep the user's reads on the primary for REPLICA_PIN_SECONDS, the replica may lag that much."""
+    cache.set(_pin_key(user_id), 1, timeout=settings.REPLICA_PIN_SECONDS)
+
+
+def _pinned(request):
+    user = getattr(request, "user", None)
+    return bool(user and user.is_authenticated and cache.get(_pin_key(user.pk)))
+
+
+def replica_alias():
+    """The replica's DATABASES alias, None when no replica is configured."""
+    alias = getattr(settings, "REPLICA_DATABASE", None)
+    return alias if alias in settings.DATABASES else None
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of code run under read_from_replica() to the replica. Everything else,
+    every write and every read inside a transaction on the primary, stays on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections["default"].in_atomic_block:
+            # a read after a write in the same transaction has to see that write
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica is a copy of the primary, rows read from either can be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replica gets its schema from the primary through replication
+        return db == "default"
+
+
+@contextmanager
+def read_from_replica(request=None):
+    """
+    Route the reads of the block to the replica, unless there is none or the request comes
+    from a user who wrote moments ago (see ReplicaPinMiddleware).
+    """
+    alias = replica_alias()
+    if alias is not None and request is not None and _pinned(request):
+        alias = None
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Route the reads of the block to the primary, for data that is cached under the current
+    model versions (utils/versioned_cache.py): a lagging replica would store stale rows as new.
+    """
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def replica_reads(view):
+    """View decorator: the view's reads may come from the replica (see read_from_replica)."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with read_from_replica(request):
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaReadMixin:
+    """read_from_replica for a class based read-only view, such as the datatable views."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with read_from_replica(request):
+            return super().dispatch(request, *args, **kwargs)
+
+
+class ReplicaPinMiddleware:
+    """
+    After a request that may have written (any method but GET, HEAD and OPTIONS) the user's
+    reads stay on the primary for a few seconds, from any device, so the pages that read from
+    the replica show the user's own writes even while the replica lags behind.
+    Must be placed after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            replica_alias()
+            and request.method not in ("GET", "HEAD", "OPTIONS")
+            and request.user.is_authenticated
+        ):
+            pin_to_primary(request.user.pk)
+        return response
@@ -0,0 +1,54 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from wmaApp.models import AdvanceOrder, Customer, DocumentSequence, Sales
+
+SALES_PREFIX = "S"
+BOOKING_PREFIX = "B"
+CUSTOMER_PREFIX = "CID"
+
+# model whose existing rows seed a sequence the first time it is used
+SEQUENCE_MODELS = {
+    SALES_PREFIX: Sales,
+    BOOKING_PREFIX: AdvanceOrder,
+    CUSTOMER_PREFIX: Customer,
+}
+
+
+def format_document_number(prefix, number):
+    return prefix + str(number).zfill(8)
+
+
+def _create_sequence(owner_id, prefix):
+    model = SEQUENCE_MODELS[prefix]
+    # continue after the numbers handed out by the old count() based scheme
+    seed = model.objects.filter(ownerID_id=owner_id).count()
+    try:
+        with transaction.atomic():
+            DocumentSequence.objects.create(ownerID_id=owner_id, prefix=prefix, lastNumber=seed)
+    except IntegrityError:
+        # created by a concurrent request
+        pass
+
+
+def allocate_document_numbers(owner_id, prefix, count=1):
+    """
+    Reserve `count` consecutive numbers of the owner's `prefix` sequence and return them as a range.
+    The sequence row is incremented atomically, so concurrent requests never get the same number.
+    """
+    if count < 1:
+        return range(0)
+    with transaction.atomic():
+        sequence = DocumentSequence.objects.filter(ownerID_id=owner_id, prefix=prefix)
+        if not sequence.update(lastNumber=F("lastNumber") + count):
+            _create_sequence(owner_id, prefix)
+            sequence.update(lastNumber=F("lastNumber") + count)
+        # the row stays locked by the UPDATE until the transaction ends
+        last_number = sequence.values_list("lastNumber", flat=True).get()
+    return range(last_number - count + 1, last_number + 1)
+
+
+def next_document_number(owner_id, prefix):
+    """Allocate one number and return it formatted, e.g. "S00000042"."""
+    number = allocate_document_numbers(owner_id, prefix)[0]
+    return format_document_number(prefix, number)
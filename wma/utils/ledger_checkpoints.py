@@ -0,0 +1,172 @@
+import calendar
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import F, Max, Min, Sum
+from django.db.models.functions import TruncMonth
+
+from utils.logger import logger
+from wmaApp.models import CustomerLedger, LedgerCheckpoint
+
+
+# A checkpoint holds a customer's ledger totals up to the end of a month. A run up to a month
+# end writes one for every customer with entries by then, so for each owner the newest
+# checkpoint date (the owner's "mark") is the same for all of its customers with history, and
+# a balance as of any date is the checkpoint of the month before plus under a month of entries.
+
+def month_end(day):
+    return day.replace(day=calendar.monthrange(day.year, day.month)[1])
+
+
+def last_period_end(today=None):
+    """End of the last complete month, the latest date a checkpoint is written for."""
+    today = today or date.today()
+    return today.replace(day=1) - timedelta(days=1)
+
+
+def checkpoint_mark(owner_id):
+    """Date of the owner's newest checkpoints, None before the first run."""
+    return LedgerCheckpoint.objects.filter(ownerID_id=owner_id).aggregate(mark=Max("periodEnd"))["mark"]
+
+
+def _month_ends(first, last):
+    day = month_end(first)
+    while day <= last:
+        yield day
+        day = month_end(day + timedelta(days=1))
+
+
+def write_checkpoints(owner_id, until=None, customer_id=None, rebuild=False, batch_size=1000):
+    """
+    Write the owner's checkpoints for the month ends after its mark up to `until` (the last
+    complete month). Customers carry on from their checkpoint at the mark and only entries
+    dated after it are read, so a monthly run reads one month of entries.
+    `rebuild` drops the existing checkpoints first and reads the whole history; with
+    `customer_id` only that customer's are rebuilt (up to the owner's mark, by default).
+    Returns the number of checkpoints written.
+    """
+    checkpoints = LedgerCheckpoint.objects.filter(ownerID_id=owner_id)
+    entries = CustomerLedger.objects.filter(ownerID_id=owner_id, isDeleted=False, customerID__isnull=False)
+    if customer_id is not None:
+        checkpoints = checkpoints.filter(customerID_id=customer_id)
+        entries = entries.filter(customerID_id=customer_id)
+        # the customer's checkpoints have to end where everybody else's do
+        until = until or checkpoint_mark(owner_id)
+        if until is None:
+            return 0
+    until = until or last_period_end()
+
+    with transaction.atomic():
+        if rebuild:
+            checkpoints.delete()
+        mark = checkpoints.aggregate(mark=Max("periodEnd"))["mark"]
+        if mark is not None and mark >= until:
+            return 0
+        totals = {}
+        if mark is not None:
+            entries = entries.filter(addedDate__gt=mark)
+            for row in checkpoints.filter(periodEnd=mark).values("customerID_id", "totalCredit", "totalDebit"):
+                totals[row["customerID_id"]] = (row["totalCredit"], row["totalDebit"])
+
+        months = {}
+        for row in (
+            entries.filter(addedDate__lte=until)
+            .annotate(month=TruncMonth("addedDate"))
+            .values("customerID_id", "month")
+            .annotate(credit=Sum("credit"), debit=Sum("debit"))
+            .order_by()
+        ):
+            months[(row["customerID_id"], month_end(row["month"]))] = (row["credit"] or 0, row["debit"] or 0)
+        first_month = {}
+        for customer, period_end in months:
+            first_month[customer] = min(period_end, first_month.get(customer, period_end))
+
+        rows = []
+        for customer in set(totals) | set(first_month):
+            credit, debit = totals.get(customer, (0.0, 0.0))
+            start = mark + timedelta(days=1) if customer in totals else first_month[customer]
+            for period_end in _month_ends(start, until):
+                month_credit, month_debit = months.get((customer, period_end), (0, 0))
+                credit += month_credit
+                debit += month_debit
+                rows.append(LedgerCheckpoint(
+                    ownerID_id=owner_id,
+                    customerID_id=customer,
+                    periodEnd=period_end,
+                    totalCredit=credit,
+                    totalDebit=debit,
+                    balance=credit - debit,
+                ))
+        LedgerCheckpoint.objects.bulk_create(rows, batch_size=batch_size)
+    logger.info(f"Ledger checkpoints of owner {owner_id} written up to {until}: {len(rows)}")
+    return len(rows)
+
+
+def write_all_checkpoints(until=None, rebuild=False, batch_size=1000):
+    """write_checkpoints for every owner with ledger entries. Returns the number written."""
+    owners = CustomerLedger.objects.filter(ownerID__isnull=False).values_list("ownerID_id", flat=True).distinct()
+    return sum(
+        write_checkpoints(owner_id, until=until, rebuild=rebuild, batch_size=batch_size)
+        for owner_id in owners.order_by("ownerID_id")
+    )
+
+
+def shift_checkpoints(owner_id, customer_id, entry_date, credit, debit):
+    """
+    Count entries dated `entry_date`, already saved, in the checkpoints from their month on.
+    Only needed for dates up to the owner's mark. A customer with no checkpoints yet, or none
+    as early as the entry's month, has the months from the entry on missing and gets its
+    checkpoints rewritten.
+    """
+    mark = checkpoint_mark(owner_id)
+    if mark is None or entry_date > mark:
+        return
+    checkpoints = LedgerCheckpoint.objects.filter(customerID_id=customer_id)
+    first = checkpoints.aggregate(first=Min("periodEnd"))["first"]
+    if first is None or month_end(entry_date) < first:
+        write_checkpoints(owner_id, customer_id=customer_id, rebuild=True)
+        return
+    checkpoints.filter(periodEnd__gte=entry_date).update(
+        totalCredit=F("totalCredit") + credit,
+        totalDebit=F("totalDebit") + debit,
+        balance=F("balance") + credit - debit,
+    )
+
+
+def balances_as_of(owner_id, customer_ids, as_of):
+    """
+    {customer ID: balance} of the owner's customers at the end of `as_of` (that day's entries
+    included): the checkpoint of the last month end before it plus the entries since. Three
+    queries however many customers and however long their history.
+    """
+    customer_ids = list(customer_ids)
+    balances = {customer_id: 0.0 for customer_id in customer_ids}
+    if not customer_ids:
+        return balances
+    checkpoint_date = None
+    mark = checkpoint_mark(owner_id)
+    if mark is not None:
+        month_before = as_of if as_of == month_end(as_of) else as_of.replace(day=1) - timedelta(days=1)
+        checkpoint_date = min(month_before, mark)
+        for customer_id, balance in LedgerCheckpoint.objects.filter(
+            customerID_id__in=customer_ids, periodEnd=checkpoint_date
+        ).values_list("customerID_id", "balance"):
+            balances[customer_id] = balance
+
+    tail = CustomerLedger.objects.filter(customerID_id__in=customer_ids, isDeleted=False, addedDate__lte=as_of)
+    if checkpoint_date is not None:
+        tail = tail.filter(addedDate__gt=checkpoint_date)
+    for row in tail.values("customerID_id").annotate(credit=Sum("credit"), debit=Sum("debit")).order_by():
+        balances[row["customerID_id"]] += (row["credit"] or 0) - (row["debit"] or 0)
+    return balances
+
+
+def balance_as_of(owner_id, customer_id, as_of):
+    return balances_as_of(owner_id, [customer_id], as_of)[customer_id]
+
+
+def opening_closing(owner_id, customer_ids, start_date, end_date):
+    """{customer ID: (balance before start_date, balance at the end of end_date)}."""
+    opening = balances_as_of(owner_id, customer_ids, start_date - timedelta(days=1))
+    closing = balances_as_of(owner_id, customer_ids, end_date)
+    return {customer_id: (opening[customer_id], closing[customer_id]) for customer_id in opening}
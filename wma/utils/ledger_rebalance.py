@@ -0,0 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, connections, transaction
+from django.db.models import Sum
+
+from utils.customer_balance import lock_customer_balance
+from utils.ledger_checkpoints import write_checkpoints
+from utils.logger import logger
+from utils.versioned_cache import expire_cached_model
+from wmaApp.models import Customer, CustomerBalance, CustomerLedger
+
+# customers a bulk rebalance hands to a worker at a time
+REBALANCE_CHUNK_SIZE = 200
+
+
+def _rebalance_sql(vendor):
+    """
+    One UPDATE that rewrites balanceAtDate and balance of a customer's live entries from
+    `start_id` on, as the opening balance plus a running SUM() OVER (ORDER BY id).
+    """
+    ledger = CustomerLedger._meta
+    qn = connection.ops.quote_name
+    table = qn(ledger.db_table)
+    customer, is_deleted, credit, debit, at_date, balance = (
+        qn(ledger.get_field(name).column)
+        for name in ("customerID", "isDeleted", "credit", "debit", "balanceAtDate", "balance")
+    )
+    running = (
+        f"SELECT id, SUM({credit} - {debit}) OVER (ORDER BY id) AS running FROM {table} "
+        f"WHERE {customer} = %(customer_id)s AND {is_deleted} = %(deleted)s AND id >= %(start_id)s"
+    )
+    if vendor == "mysql":
+        # no UPDATE ... FROM there; the derived table is materialised before the update
+        return (
+            f"UPDATE {table} AS l JOIN ({running}) AS r ON r.id = l.id "
+            f"SET l.{at_date} = %(opening)s + r.running - (l.{credit} - l.{debit}), "
+            f"l.{balance} = %(opening)s + r.running"
+        )
+    return (
+        f"UPDATE {table} SET {at_date} = %(opening)s + r.running - ({credit} - {debit}), "
+        f"{balance} = %(opening)s + r.running FROM ({running}) AS r WHERE {table}.id = r.id"
+    )
+
+
+def rebalance_customer_ledger(customer_id, from_id=None):
+    """
+    Recompute the running balance of the customer's ledger from entry `from_id` on (the whole
+    chain when None), taking the entries before it as correct, and bring the CustomerBalance
+    row in line. Deleted entries are skipped. Returns the number of entries rewritten.
+    """
+    with transaction.atomic():
+        owner_id = Customer.objects.filter(pk=customer_id).values_list("ownerID_id", flat=True).first()
+        # appends of the customer wait until the chain is consistent again
+        head = lock_customer_balance(owner_id, customer_id)
+        live = CustomerLedger.objects.filter(customerID_id=customer_id, isDeleted=False)
+        opening = 0.0
+        if from_id is not None:
+            opening = live.filter(id__lt=from_id).order_by("-id").values_list("balance", flat=True).first() or 0.0
+        params = {"customer_id": customer_id, "deleted": False, "start_id": from_id or 0, "opening": opening}
+        with connection.cursor() as cursor:
+            cursor.execute(_rebalance_sql(connection.vendor), params)
+            count = cursor.rowcount
+
+        totals = live.aggregate(credit=Sum("credit"), debit=Sum("debit"))
+        last = live.order_by("-id").values_list("balance", "addedDate").first()
+        CustomerBalance.objects.filter(pk=head.pk).update(
+            totalCredit=totals["credit"] or 0,
+            totalDebit=totals["debit"] or 0,
+            balance=last[0] if last else 0,
+            lastTransactionDate=last[1] if last else None,
+        )
+        # entries deleted outside the write path are still counted in the checkpoints
+        write_checkpoints(owner_id, customer_id=customer_id, rebuild=True)
+        # the raw UPDATE skips the signals that expire the cached ledger lists
+        expire_cached_model(CustomerLedger, owner_id)
+    logger.info(f"Ledger of customer {customer_id} rebalanced from entry {from_id or 'first'}: {count} entries")
+    return count
+
+
+def _rebalance_each(customer_ids):
+    """Rebalance the customers one by one; returns (entries rewritten, IDs of customers that failed)."""
+    count = 0
+    failed = []
+    for customer_id in customer_ids:
+        try:
+            count += rebalance_customer_ledger(customer_id)
+        except Exception as e:
+            logger.error(f"Ledger of customer {customer_id} could not be rebalanced: {e}")
+            failed.append(customer_id)
+    return count, failed
+
+
+def _rebalance_chunk(customer_ids):
+    try:
+        return _rebalance_each(customer_ids)
+    finally:
+        # worker threads open their own connections
+        connections.close_all()
+
+
+def rebalance_owner_ledgers(owner_id, workers=4, chunk_size=REBALANCE_CHUNK_SIZE):
+    """
+    Rebalance the whole ledger of every customer of the owner. Customers are split into
+    chunks worked on by `workers` threads, one transaction per customer, so appends are only
+    held up for the customer being rewritten, and a customer that fails does not stop the
+    others. Returns the number of entries rewritten and the IDs of the customers that failed.
+    """
+    customer_ids = list(
+        CustomerLedger.objects.filter(ownerID_id=owner_id, customerID__isnull=False)
+        .values_list("customerID_id", flat=True).distinct().order_by("customerID_id")
+    )
+    chunks = [customer_ids[i:i + chunk_size] for i in range(0, len(customer_ids), chunk_size)]
+    if workers <= 1 or len(chunks) <= 1:
+        results = [_rebalance_each(customer_ids)]
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_rebalance_chunk, chunks))
+    count = sum(chunk_count for chunk_count, _ in results)
+    failed = [customer_id for _, chunk_failed in results for customer_id in chunk_failed]
+    logger.info(
+        f"Ledgers of owner {owner_id} rebalanced: {len(customer_ids)} customers, {count} entries, "
+        f"{len(failed)} failed"
+    )
+    return count, failed
@@ -0,0 +1,49 @@
+from datetime import datetime
+
+
+class LineItemError(ValueError):
+    pass
+
+
+def parse_line_items(datas):
+    """
+    Parse and validate the `datas` string posted by the sales/booking forms.
+    Items are separated by "@" (with a trailing "@"), fields by "|":
+    product id | product name | quantity | unit price | total | remark | unit
+    """
+    items = []
+    for position, item in enumerate(datas.split("@")[:-1], start=1):
+        item_details = item.split("|")
+        if len(item_details) < 7:
+            raise LineItemError(f"Item {position} is incomplete")
+        try:
+            total_price = float(item_details[4])
+            items.append(
+                {
+                    "productID_id": int(item_details[0]),
+                    "productName": item_details[1],
+                    "quantity": float(item_details[2]),
+                    "unitPrice": float(item_details[3]),
+                    "totalPrice": total_price,
+                    "totalAmountAfterTax": total_price,
+                    "remark": item_details[5],
+                    "unit": item_details[6],
+                }
+            )
+        except ValueError:
+            raise LineItemError(f"Item {position} has an invalid product, quantity or price")
+    return items
+
+
+def save_line_items(model, parent_field, parent_id, owner_id, items, replace=False):
+    """
+    Insert the parsed items of one sale/booking with a single bulk_create.
+    With replace=True the parent's current items are soft-deleted first with one UPDATE.
+    """
+    if replace:
+        model.objects.filter(**{parent_field: parent_id}, isDeleted=False).update(
+            isDeleted=True, lastUpdatedOn=datetime.now()
+        )
+    return model.objects.bulk_create(
+        [model(**{parent_field: parent_id}, ownerID_id=owner_id, **item) for item in items]
+    )
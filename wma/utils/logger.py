@@ -1,10 +1,10 @@
+import copy
 import glob
 import logging
 import threading
 import time
 from logging.handlers import QueueHandler, QueueListener
 import os
-import inspect
 from datetime import datetime, timedelta
 from queue import Queue
 
@@ -24,13 +24,60 @@ _stop_rotation = False
 LOG_TO_FILE = os.getenv("WRITE_LOG_ON_FILE", "true").lower() == "true"
 LOG_TO_CONSOLE = os.getenv("WRITE_LOG_ON_CONSOLE", "true").lower() == "true"
 
-def _get_caller_app_name():
-    stack = inspect.stack()
-    for frame_info in stack:
-        module = inspect.getmodule(frame_info.frame)
-        if module and hasattr(module, "__package__") and module.__package__:
-            return module.__package__.split(".")[0]
-    return "app"
+LOG_FORMAT = "%(asctime)s | %(levelname)s | %(app_name)s | %(filename)s:%(funcName)s:%(lineno)d | %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_app_names = {}
+
+
+def _get_app_name(pathname):
+    """Top level package of the file that logged, e.g. "wmaApp" or "utils" (cached per file)."""
+    app_name = _app_names.get(pathname)
+    if app_name is None:
+        relative = os.path.relpath(pathname, BASE_DIR) if os.path.isabs(pathname or "") else ".."
+        if relative.startswith(".."):
+            app_name = "app"
+        else:
+            app_name = relative.split(os.sep)[0].removesuffix(".py")
+        _app_names[pathname] = app_name
+    return app_name
+
+
+class AppNameFilter(logging.Filter):
+    def filter(self, record):
+        record.app_name = _get_app_name(record.pathname)
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Queue a copy of the record without formatting it; the message and line are built by the
+    listener thread. Arguments that are not plain values are rendered here, so objects are never
+    read from another thread (their __str__ may hit the database or change after the call).
+    A traceback is rendered here too, so the queued record holds no frames.
+    """
+    PLAIN_TYPES = (str, int, float, bool, type(None))
+    _traceback_formatter = logging.Formatter()
+
+    def prepare(self, record):
+        # other handlers of the logger see the record as it was logged
+        record = copy.copy(record)
+        args = record.args
+        if isinstance(args, dict):
+            args = args.values()
+        if not isinstance(record.msg, str) or (args and not all(isinstance(arg, self.PLAIN_TYPES) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or self._traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _create_handler(handler):
+    handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT))
+    handler.addFilter(AppNameFilter())
+    return handler
 
 
 def _cleanup_old_logs(days=5):
@@ -52,19 +99,7 @@ def _create_file_handler():
     global _file_handler, _current_log_date
     _current_log_date = datetime.now().date()
 
-    formatter = logging.Formatter(
-        "%(asctime)s | %(levelname)s | %(app_name)s | %(filename)s:%(funcName)s:%(lineno)d | %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
-
-    class AppNameFilter(logging.Filter):
-        def filter(self, record):
-            record.app_name = _get_caller_app_name()
-            return True
-
-    handler = logging.FileHandler(_get_log_file_path(), encoding="utf-8")
-    handler.setFormatter(formatter)
-    handler.addFilter(AppNameFilter())
+    handler = _create_handler(logging.FileHandler(_get_log_file_path(), encoding="utf-8"))
     _file_handler = handler
 
     _cleanup_old_logs(days=5)
@@ -93,26 +128,13 @@ def _init_logger():
         handlers = []
 
         if LOG_TO_CONSOLE:
-            formatter = logging.Formatter(
-                "%(asctime)s | %(levelname)s | %(app_name)s | %(filename)s:%(funcName)s:%(lineno)d | %(message)s",
-                datefmt="%Y-%m-%d %H:%M:%S"
-            )
-
-            class AppNameFilter(logging.Filter):
-                def filter(self, record):
-                    record.app_name = _get_caller_app_name()
-                    return True
-
-            console_handler = logging.StreamHandler()
-            console_handler.setFormatter(formatter)
-            console_handler.addFilter(AppNameFilter())
-            handlers.append(console_handler)
+            handlers.append(_create_handler(logging.StreamHandler()))
 
         if LOG_TO_FILE:
             file_handler = _create_file_handler()
             handlers.append(file_handler)
 
-        queue_handler = QueueHandler(_log_queue)
+        queue_handler = DeferredQueueHandler(_log_queue)
         logger_instance.addHandler(queue_handler)
 
         if _listener is None:
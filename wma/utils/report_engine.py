@@ -0,0 +1,216 @@
+from abc import ABC, abstractmethod
+
+from django.db.models import Sum
+
+from utils.ledger_checkpoints import opening_closing
+from utils.logger import logger
+from wmaApp.models import CustomerLedger, Expense, JarCounter, Location, Payment, Sales
+
+# rows fetched from the database per round trip when a report is streamed
+ROW_CHUNK_SIZE = 2000
+
+
+class Column:
+    """One report column: `key` names it in the row dicts, `path` is the values_list lookup."""
+
+    def __init__(self, key, header, path=None, total=False):
+        self.key = key
+        self.header = header
+        self.path = path or key
+        self.total = total
+
+
+class Report(ABC):
+    """
+    A report type. `run()` returns the rows (dicts keyed by column key) and the totals of the
+    columns marked total=True; the PDF, CSV/XLSX and JSON renderers only use that.
+    """
+    template = None
+    columns = []
+    # (model, date field) pairs the rows are read from, used to stamp cached PDFs
+    sources = []
+
+    @abstractmethod
+    def run(self, startDate, endDate, location, owner_id, stream=False):
+        """(rows, totals) of the report between startDate and endDate (inclusive)."""
+
+    @property
+    def headers(self):
+        return [column.header for column in self.columns]
+
+
+class PeriodReport(Report):
+    """Rows of one table between two dates (inclusive), optionally for one location."""
+
+    def __init__(self, model, date_field, location_path, columns, order_by, template):
+        self.model = model
+        self.date_field = date_field
+        self.location_path = location_path
+        self.columns = columns
+        self.order_by = order_by
+        self.template = template
+        self.sources = [(model, date_field)]
+
+    def queryset(self, startDate, endDate, location, owner_id):
+        qs = self.model.objects.filter(
+            **{f"{self.date_field}__range": (startDate, endDate)}, isDeleted=False, ownerID_id=owner_id
+        )
+        if location != 'All':
+            qs = qs.filter(**{self.location_path: int(location)})
+        return qs
+
+    def rows_queryset(self, qs):
+        return qs.order_by(*self.order_by).values_list(*[column.path for column in self.columns])
+
+    def run(self, startDate, endDate, location, owner_id, stream=False):
+        qs = self.queryset(startDate, endDate, location, owner_id)
+        # only the columns' lookups are joined, and every total comes from the same aggregate
+        totals = qs.aggregate(**{
+            f"total_{column.key}": Sum(column.path) for column in self.columns if column.total
+        })
+        totals = {key[len("total_"):]: value or 0 for key, value in totals.items()}
+        rows = self.rows_queryset(qs)
+        rows = rows.iterator(chunk_size=ROW_CHUNK_SIZE) if stream else rows
+        keys = [column.key for column in self.columns]
+        return (dict(zip(keys, row)) for row in rows), totals
+
+
+class CustomerSummaryReport(Report):
+    template = "wmaApp/reports/daywise.html"
+    columns = [
+        Column('name', 'CustomerName'),
+        Column('location', 'Location'),
+        Column('sales_amount', 'Sales', total=True),
+        Column('payment_amount', 'Payment', total=True),
+        Column('due_amount', 'Due', total=True),
+        Column('opening', 'OpeningBalance', total=True),
+        Column('closing', 'ClosingBalance', total=True),
+        Column('addedBy', 'CreatedBy'),
+    ]
+    sources = [(Sales, 'saleDate'), (Payment, 'paymentDate'), (CustomerLedger, 'addedDate')]
+
+    def run(self, startDate, endDate, location, owner_id, stream=False):
+        # grouped per customer already, so the list is as long as the period's active customers
+        rows, totals = customer_summary(startDate, endDate, location, owner_id)
+        # ledger balances before and after the period, from the month-end checkpoints
+        balances = opening_closing(owner_id, [row["customer_id"] for row in rows], startDate, endDate)
+        totals["opening"] = totals["closing"] = 0.0
+        for row in rows:
+            row["opening"], row["closing"] = balances[row["customer_id"]]
+            totals["opening"] += row["opening"]
+            totals["closing"] += row["closing"]
+        return rows, totals
+
+
+def customer_summary(startDate, endDate, location, owner_id):
+    """
+    Sales and payment totals per customer between startDate and endDate (inclusive), for the
+    customers with either, sorted by name, with the column totals. Two grouped queries over the
+    period's Sales and Payment rows only, so the cost follows the activity, not the customer count.
+    """
+    customer_columns = ("customerID", "customerID__name", "customerID__locationID__name", "customerID__addedByID__name")
+    sources = (
+        ("sales_amount", Sales, "saleDate", "totalAmountAfterTax"),
+        ("payment_amount", Payment, "paymentDate", "paymentAmount"),
+    )
+    rows = {}
+    for column, model, date_field, amount_field in sources:
+        qs = model.objects.filter(
+            **{f"{date_field}__range": (startDate, endDate)},
+            isDeleted=False, ownerID_id=owner_id, customerID__isDeleted=False,
+        )
+        if location != "All":
+            qs = qs.filter(customerID__locationID_id=int(location))
+        for total in qs.values(*customer_columns).annotate(amount=Sum(amount_field)).order_by():
+            row = rows.setdefault(total["customerID"], {
+                "customer_id": total["customerID"],
+                "name": total["customerID__name"],
+                "location": total["customerID__locationID__name"],
+                "addedBy": total["customerID__addedByID__name"],
+                "sales_amount": 0.0,
+                "payment_amount": 0.0,
+            })
+            row[column] += total["amount"] or 0
+    rows = sorted(
+        (row for row in rows.values() if row["sales_amount"] > 0 or row["payment_amount"] > 0),
+        key=lambda row: ((row["name"] or "").lower(), row["location"] or ""),
+    )
+    totals = {"sales_amount": 0.0, "payment_amount": 0.0, "due_amount": 0.0}
+    for row in rows:
+        row["due_amount"] = row["sales_amount"] - row["payment_amount"]
+        for key in totals:
+            totals[key] += row[key]
+    return rows, totals
+
+
+REPORTS = {
+    'Sales': PeriodReport(
+        Sales, 'saleDate', 'customerID__locationID_id',
+        [
+            Column('invoiceNumber', 'InvoiceNo'),
+            Column('customer', 'CustomerName', 'customerID__name'),
+            Column('totalAmount', 'Amount', total=True),
+            Column('totalTax', 'Tax', total=True),
+            Column('additionalCharge', 'AdditionalCharge', total=True),
+            Column('totalAmountAfterTax', 'AmountAfterTax', total=True),
+            Column('addedBy', 'CreatedBy', 'addedByID__name'),
+            Column('location', 'Location', 'customerID__locationID__name'),
+            Column('saleDate', 'SaleDate'),
+        ],
+        ('addedByID__name', 'id'), "wmaApp/reports/salesPDF.html",
+    ),
+    'Jar': PeriodReport(
+        JarCounter, 'date', 'customerID__locationID_id',
+        [
+            Column('customer', 'CustomerName', 'customerID__name'),
+            Column('inJar', 'InJar', total=True),
+            Column('outJar', 'OutJar', total=True),
+            Column('addedBy', 'CreatedBy', 'addedByID__name'),
+            Column('location', 'Location', 'customerID__locationID__name'),
+            Column('date', 'EntryDate'),
+        ],
+        ('addedByID__name', 'id'), "wmaApp/reports/jarPDF.html",
+    ),
+    'Expense': PeriodReport(
+        Expense, 'expenseDate', 'staffID__locationID_id',
+        [
+            Column('group', 'Group', 'groupID__name'),
+            Column('expenseAmount', 'Amount', total=True),
+            Column('expenseDescription', 'Remark'),
+            Column('staff', 'CreatedBy', 'staffID__name'),
+            Column('location', 'Location', 'staffID__locationID__name'),
+            Column('expenseDate', 'ExpenseDate'),
+        ],
+        ('-id',), "wmaApp/reports/expensePDF.html",
+    ),
+    'Collection': PeriodReport(
+        Payment, 'paymentDate', 'customerID__locationID_id',
+        [
+            Column('customer', 'CustomerName', 'customerID__name'),
+            Column('paymentAmount', 'Amount', total=True),
+            Column('remark', 'Remark'),
+            Column('addedBy', 'CreatedBy', 'addedByID__name'),
+            Column('location', 'Location', 'customerID__locationID__name'),
+            Column('paymentDate', 'PaymentDate'),
+        ],
+        ('-id',), "wmaApp/reports/collectionPDF.html",
+    ),
+    'CustomerSummary': CustomerSummaryReport(),
+}
+
+
+def location_name(location, owner_id):
+    return 'All' if location == 'All' else Location.objects.get(id=location, ownerID_id=owner_id).name
+
+
+def report_context(reportType, startDate, endDate, location, owner_id):
+    """Template context of a report: the rows as `col` and the column totals as `totals`."""
+    logger.info(f"Generating {reportType} report for owner_id: {owner_id}")
+    rows, totals = REPORTS[reportType].run(startDate, endDate, location, owner_id)
+    return {
+        'startDate': startDate,
+        'endDate': endDate,
+        'col': list(rows),
+        'location': location_name(location, owner_id),
+        'totals': totals,
+    }
@@ -0,0 +1,159 @@
+import csv
+import re
+import zipfile
+from datetime import date
+from xml.sax.saxutils import escape
+
+from utils.logger import logger
+from utils.report_engine import REPORTS
+
+# rows written to the client per chunk of the response
+ROWS_PER_CHUNK = 500
+
+CSV = 'csv'
+XLSX = 'xlsx'
+EXPORT_FORMATS = {
+    CSV: 'text/csv; charset=utf-8',
+    XLSX: 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def export_rows(reportType, startDate, endDate, location, owner_id):
+    """
+    Header, data rows and a totals row of one report. Rows are read from a chunked iterator
+    as the response is written, so memory does not grow with the range.
+    """
+    report = REPORTS[reportType]
+    rows, totals = report.run(startDate, endDate, location, owner_id, stream=True)
+    yield report.headers
+    count = 0
+    for row in rows:
+        count += 1
+        yield [row[column.key] for column in report.columns]
+    yield []
+    yield [f'Total ({count} rows)'] + [totals.get(column.key, '') for column in report.columns[1:]]
+    logger.info(f"{reportType} export for owner {owner_id} streamed {count} rows")
+
+
+def _cell_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, date):
+        return value.strftime('%d/%m/%Y')
+    return value
+
+
+class _Echo:
+    """File object for csv.writer that hands back what it is given."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    # byte order mark, so Excel opens the file as UTF-8
+    yield '\ufeff'
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow([_cell_text(value) for value in row]))
+        if len(chunk) == ROWS_PER_CHUNK:
+            yield ''.join(chunk)
+            chunk = []
+    yield ''.join(chunk)
+
+
+# ---------------------------- xlsx ---------------------------
+# a minimal single-sheet workbook: cells are inline strings or numbers, so no shared string
+# table has to be held in memory, and the zip is written to the response as it grows
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Report" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_END = '</sheetData></worksheet>'
+# characters XML 1.0 does not allow, e.g. control characters pasted into a remark
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _xlsx_cell(value):
+    value = _cell_text(value)
+    if isinstance(value, bool):
+        value = str(value)
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_INVALID_XML.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+class _Pipe:
+    """Write-only, unseekable file object that collects what zipfile writes until it is drained."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def stream_xlsx(rows):
+    pipe = _Pipe()
+    with zipfile.ZipFile(pipe, 'w', compression=zipfile.ZIP_DEFLATED) as workbook:
+        for name, content in _XLSX_PARTS.items():
+            workbook.writestr(name, content)
+        with workbook.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write(_SHEET_START.encode())
+            chunk = []
+            for row in rows:
+                chunk.append('<row>' + ''.join(_xlsx_cell(value) for value in row) + '</row>')
+                if len(chunk) == ROWS_PER_CHUNK:
+                    sheet.write(''.join(chunk).encode())
+                    chunk = []
+                    yield pipe.drain()
+            sheet.write((''.join(chunk) + _SHEET_END).encode())
+    yield pipe.drain()
+
+
+STREAMERS = {CSV: stream_csv, XLSX: stream_xlsx}
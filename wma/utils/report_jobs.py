@@ -0,0 +1,115 @@
+import hashlib
+import os
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+
+from utils.logger import logger
+from utils.report_engine import REPORTS
+from utils.report_pdf import render_report_pdf
+from wmaApp.models import Customer, Location, ReportJob, StaffUser
+
+PENDING = 'Pending'
+RUNNING = 'Running'
+DONE = 'Done'
+FAILED = 'Failed'
+
+# a Running job older than this is assumed to belong to a worker that died
+STALE_AFTER = timedelta(minutes=15)
+
+
+def report_data_version(owner_id, reportType, startDate, endDate):
+    """
+    Stamp of the data a report is built from. Rows are only ever soft-deleted and every save
+    bumps lastUpdatedOn, so any change to the rows in the date range moves either the row
+    count or the newest lastUpdatedOn. Customer, staff and location names shown in the
+    reports are covered by the owner-wide lastUpdatedOn of those tables.
+    """
+    parts = []
+    for model, date_field in REPORTS[reportType].sources:
+        stats = model.objects.filter(
+            **{f"{date_field}__range": (startDate, endDate)}, ownerID_id=owner_id
+        ).aggregate(rows=Count('id'), updated=Max('lastUpdatedOn'))
+        parts += [stats['rows'], stats['updated']]
+    for model in (Customer, StaffUser, Location):
+        parts.append(model.objects.filter(ownerID_id=owner_id).aggregate(updated=Max('lastUpdatedOn'))['updated'])
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+
+def report_file_prefix(owner_id, reportType, startDate, endDate, location):
+    return os.path.join(
+        settings.REPORT_CACHE_ROOT, str(owner_id),
+        f"{reportType}_{startDate:%Y%m%d}_{endDate:%Y%m%d}_{location}_",
+    )
+
+
+def report_file_path(owner_id, reportType, startDate, endDate, location, version):
+    return report_file_prefix(owner_id, reportType, startDate, endDate, location) + version + ".pdf"
+
+
+def queue_report(owner_id, user_id, reportType, startDate, endDate, location):
+    """
+    Return a job for the report. If the PDF for the current data is already on disk the job is
+    created as Done; an identical job that is still waiting or running is reused.
+    """
+    version = report_data_version(owner_id, reportType, startDate, endDate)
+    path = report_file_path(owner_id, reportType, startDate, endDate, location, version)
+    job_fields = dict(
+        ownerID_id=owner_id, reportType=reportType, startDate=startDate, endDate=endDate, location=location
+    )
+    if os.path.exists(path):
+        return ReportJob.objects.create(
+            **job_fields, requestedByID_id=user_id, status=DONE, dataVersion=version, filePath=path,
+            finishedOn=datetime.now(),
+        )
+    job = ReportJob.objects.filter(
+        **job_fields, dataVersion=version, status__in=[PENDING, RUNNING]
+    ).order_by('-id').first()
+    if job is None:
+        job = ReportJob.objects.create(**job_fields, requestedByID_id=user_id, dataVersion=version)
+    return job
+
+
+def claim_next_job():
+    """Mark the oldest waiting (or stale running) job as Running and return it, or None."""
+    claimable = Q(status=PENDING) | Q(status=RUNNING, startedOn__lt=datetime.now() - STALE_AFTER)
+    for job_id in ReportJob.objects.filter(claimable).order_by('id').values_list('id', flat=True)[:10]:
+        # conditional update, so two workers never run the same job
+        started = datetime.now()
+        if ReportJob.objects.filter(claimable, pk=job_id).update(status=RUNNING, startedOn=started):
+            return ReportJob.objects.get(pk=job_id)
+    return None
+
+
+def run_job(job):
+    try:
+        # stamp again, the data may have changed while the job was waiting
+        version = report_data_version(job.ownerID_id, job.reportType, job.startDate, job.endDate)
+        path = report_file_path(job.ownerID_id, job.reportType, job.startDate, job.endDate, job.location, version)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{job.pk}.tmp"
+            render_report_pdf(job.reportType, job.startDate, job.endDate, job.location, job.ownerID_id, tmp_path)
+            os.replace(tmp_path, path)
+            remove_old_versions(job, path)
+        job.status, job.dataVersion, job.filePath = DONE, version, path
+        logger.info(f"Report job {job.pk} ({job.reportType}) finished")
+    except Exception as e:
+        job.status, job.error = FAILED, str(e)
+        logger.error(f"Report job {job.pk} ({job.reportType}) failed: {e}")
+    job.finishedOn = datetime.now()
+    job.save()
+    return job
+
+
+def remove_old_versions(job, current_path):
+    prefix = report_file_prefix(job.ownerID_id, job.reportType, job.startDate, job.endDate, job.location)
+    directory, name_prefix = os.path.split(prefix)
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.startswith(name_prefix) and name.endswith(".pdf") and path != current_path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
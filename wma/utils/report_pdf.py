@@ -0,0 +1,16 @@
+from django.template.loader import render_to_string
+
+from utils.report_engine import REPORTS, report_context
+
+PAGE_CSS = '@page { size: A5; margin: .3cm ; }'
+
+
+def render_report_pdf(reportType, startDate, endDate, location, owner_id, target):
+    """Render one report and write the PDF to `target` (a path or file object)."""
+    # imported here so web workers never load WeasyPrint, only the report worker does
+    from weasyprint import HTML, CSS
+
+    html = render_to_string(
+        REPORTS[reportType].template, report_context(reportType, startDate, endDate, location, owner_id)
+    )
+    HTML(string=html).write_pdf(target, stylesheets=[CSS(string=PAGE_CSS)])
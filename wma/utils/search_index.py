@@ -0,0 +1,238 @@
+import re
+import string
+from datetime import date, datetime
+from functools import lru_cache
+
+from django.db import transaction
+
+from utils.logger import logger
+from wmaApp.models import (
+    AdvanceOrder, Customer, CustomerLedger, Expense, JarAllocation, JarCounter, Payment, Product, Sales,
+    SearchIndexJob, SearchToken,
+)
+
+# model -> columns searched by its datatable (same columns the old __icontains filters used)
+SEARCH_FIELDS = {
+    Customer: ["name", "locationID__name", "phone", "address", "addedByID__name", "dateCreated"],
+    Product: [
+        "productName", "categoryID__name", "rate", "quantity", "unitID__name", "taxID__hsn", "sp",
+        "productDescription", "dateCreated",
+    ],
+    Sales: [
+        "invoiceNumber", "saleDate", "customerID__name", "customerID__locationID__name", "totalAmount",
+        "totalTax", "additionalCharge", "totalAmountAfterTax", "addedByID__name", "dateCreated",
+    ],
+    AdvanceOrder: [
+        "invoiceNumber", "expectedDeliveryDate", "customerID__name", "customerID__locationID__name",
+        "totalAmount", "totalTax", "additionalCharge", "totalAmountAfterTax", "addedByID__name", "dateCreated",
+    ],
+    Expense: ["groupID__name", "expenseAmount", "expenseDescription", "expenseDate", "staffID__name", "dateCreated"],
+    JarCounter: [
+        "customerID__name", "addedByID__name", "inJar", "outJar", "date", "remark",
+        "customerID__locationID__name", "dateCreated",
+    ],
+    Payment: [
+        "customerID__name", "paymentAmount", "paymentDate", "remark", "customerID__locationID__name", "dateCreated",
+    ],
+    CustomerLedger: ["remark", "credit", "debit", "dateCreated"],
+    JarAllocation: ["driverID__name", "addedByID__name", "inJar", "outJar", "date", "remark", "dateCreated"],
+}
+
+# rows re-indexed on commit after a change they show (a customer rename), more are queued
+DEPENDENT_INDEX_INLINE_LIMIT = 2000
+
+# shortest part from the middle of a number-like word that a search finds
+NUMBER_PART_LENGTH = 3
+
+TOKEN_LENGTH = SearchToken._meta.get_field("token").max_length
+_WORD_PARTS = re.compile(r"[^\W_]+")
+_NUMBERED = re.compile(r"([^\W\d_]+)0*(\d+)$")
+_DIGIT = re.compile(r"\d")
+
+
+def value_tokens(value):
+    """Lower-cased words a column value can be found by."""
+    if value is None or value == "":
+        return set()
+    if isinstance(value, float):
+        tokens = {str(value)}
+        if value.is_integer():
+            tokens.add(str(int(value)))
+        return tokens
+    if isinstance(value, datetime):
+        return {value.date().isoformat(), value.strftime("%H:%M:%S")}
+    if isinstance(value, date):
+        return {value.isoformat()}
+    tokens = set()
+    for word in str(value).lower().split():
+        tokens.add(word)
+        parts = _WORD_PARTS.findall(word)
+        tokens.update(parts)
+        numbered = _NUMBERED.match(word)
+        if numbered:
+            # invoice/customer numbers, e.g. "s00000042" can be found by "42"
+            tokens.add(numbered.group(2))
+        for part in parts:
+            if _DIGIT.search(part):
+                # phone and invoice numbers can be found by any part of them, e.g. "6543" in "9876543210"
+                tokens.update(part[i:] for i in range(1, len(part) - NUMBER_PART_LENGTH + 1))
+    return {token[:TOKEN_LENGTH] for token in tokens}
+
+
+def search_terms(search):
+    terms = []
+    for term in search.lower().split():
+        term = term.strip(string.punctuation) or term
+        terms.append(term[:TOKEN_LENGTH])
+    return terms
+
+
+def search_filter(qs, search, owner_id):
+    """
+    Keep the rows where every word of `search` is the start of a word in one of the searchable
+    columns. Each word is one prefix lookup on the (owner, model, token) index.
+    """
+    model_name = qs.model.__name__
+    for term in search_terms(search):
+        qs = qs.filter(pk__in=SearchToken.objects.filter(
+            ownerID_id=owner_id, modelName=model_name, token__startswith=term
+        ).values("objectID"))
+    return qs
+
+
+def index_objects(model, ids):
+    """Rebuild the search tokens of the given rows (one read, one delete and one insert)."""
+    ids = list(ids)
+    model_name = model.__name__
+    tokens = []
+    for row in model.objects.filter(pk__in=ids).values("pk", "ownerID_id", *SEARCH_FIELDS[model]):
+        words = set()
+        for field in SEARCH_FIELDS[model]:
+            words |= value_tokens(row[field])
+        tokens += [
+            SearchToken(ownerID_id=row["ownerID_id"], modelName=model_name, objectID=row["pk"], token=word)
+            for word in words
+        ]
+    with transaction.atomic():
+        SearchToken.objects.filter(modelName=model_name, objectID__in=ids).delete()
+        SearchToken.objects.bulk_create(tokens, batch_size=1000)
+
+
+def index_queryset(qs, batch_size=500):
+    ids = []
+    count = 0
+    for pk in qs.values_list("pk", flat=True).iterator(chunk_size=batch_size):
+        ids.append(pk)
+        if len(ids) == batch_size:
+            index_objects(qs.model, ids)
+            count += len(ids)
+            ids = []
+    if ids:
+        index_objects(qs.model, ids)
+        count += len(ids)
+    return count
+
+
+def rebuild_search_index(owner_id=None, batch_size=500):
+    """Re-create the tokens of every searchable row. Returns the number of rows indexed."""
+    count = 0
+    for model in SEARCH_FIELDS:
+        qs = model.objects.all()
+        if owner_id is not None:
+            qs = qs.filter(ownerID_id=owner_id)
+        with transaction.atomic():
+            stale = SearchToken.objects.filter(modelName=model.__name__)
+            if owner_id is not None:
+                stale = stale.filter(ownerID_id=owner_id)
+            stale.delete()
+            count += index_queryset(qs, batch_size)
+    logger.info(f"Search index rebuilt for owner {owner_id or 'All'}: {count} rows")
+    return count
+
+
+@lru_cache(maxsize=None)
+def dependent_lookups(related_model):
+    """
+    (model, lookup, column) for every searchable model that shows a column of `related_model`,
+    e.g. Customer -> (Sales, "customerID", "name"), Location -> (Sales, "customerID__locationID", "name").
+    """
+    lookups = []
+    for model, fields in SEARCH_FIELDS.items():
+        for path in fields:
+            parts = path.split("__")
+            current = model
+            for position, part in enumerate(parts[:-1]):
+                current = current._meta.get_field(part).related_model
+                if current is related_model:
+                    lookups.append((model, "__".join(parts[:position + 1]), parts[position + 1]))
+    return tuple(lookups)
+
+
+def related_models():
+    """Models whose columns are shown in other models' search tokens."""
+    models = set()
+    for model, fields in SEARCH_FIELDS.items():
+        for path in fields:
+            current = model
+            for part in path.split("__")[:-1]:
+                current = current._meta.get_field(part).related_model
+                models.add(current)
+    return models
+
+
+def watched_columns(related_model):
+    """Columns of `related_model` whose change makes other rows' tokens stale."""
+    names = {column for _, _, column in dependent_lookups(related_model)}
+    return sorted(related_model._meta.get_field(name).attname for name in names)
+
+
+def schedule_index(instance):
+    model, pk = type(instance), instance.pk
+    transaction.on_commit(lambda: index_objects(model, [pk]), robust=True)
+
+
+def dependent_querysets(related_model, pk):
+    """The rows whose tokens show a column of the `related_model` row `pk`."""
+    lookups = {(model, lookup) for model, lookup, _ in dependent_lookups(related_model)}
+    return [model.objects.filter(**{lookup: pk}) for model, lookup in sorted(lookups, key=str)]
+
+
+def index_dependents(related_model, pk, batch_size=500):
+    """Rebuild the tokens of the rows showing the `related_model` row `pk`, a chunk at a time."""
+    return sum(index_queryset(qs, batch_size) for qs in dependent_querysets(related_model, pk))
+
+
+def schedule_dependent_index(instance):
+    """
+    Re-index the rows showing `instance` once it is committed. Up to DEPENDENT_INDEX_INLINE_LIMIT
+    rows are re-indexed right away; a row shown by more (a long-standing customer renamed) is
+    queued for run_search_index_worker instead, so the request is not held up.
+    """
+    related_model, pk, owner_id = type(instance), instance.pk, getattr(instance, "ownerID_id", None)
+
+    def reindex():
+        limit = DEPENDENT_INDEX_INLINE_LIMIT
+        rows = sum(qs[:limit + 1].count() for qs in dependent_querysets(related_model, pk))
+        if rows > limit:
+            SearchIndexJob.objects.create(ownerID_id=owner_id, modelName=related_model.__name__, objectID=pk)
+            logger.info(f"Search index of the rows showing {related_model.__name__} {pk} queued")
+        else:
+            index_dependents(related_model, pk)
+
+    transaction.on_commit(reindex, robust=True)
+
+
+def claim_next_index_job():
+    """Take the oldest queued SearchIndexJob off the queue and return it, or None."""
+    for job in SearchIndexJob.objects.order_by("id")[:10]:
+        # conditional delete, so two workers never run the same job; a later change queues a new one
+        if SearchIndexJob.objects.filter(pk=job.pk).delete()[0]:
+            return job
+    return None
+
+
+def run_index_job(job, batch_size=500):
+    related_model = {model.__name__: model for model in related_models()}[job.modelName]
+    count = index_dependents(related_model, job.objectID, batch_size)
+    logger.info(f"Search index of the rows showing {job.modelName} {job.objectID} rebuilt: {count} rows")
+    return count
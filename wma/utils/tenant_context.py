@@ -0,0 +1,121 @@
+import time
+
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from utils.logger import logger
+from wmaApp.models import Owner, StaffUser
+
+SESSION_KEY = "_tenant_context"
+
+
+def _version_key(user_id):
+    return f"TenantContextVersion{user_id}"
+
+
+def _new_version():
+    # from the clock, so a version key lost to eviction never comes back to a version a session holds
+    return int(time.time() * 1000)
+
+
+class TenantContext:
+    """Identity of the logged in user: owner (tenant) ID, staff ID and auth group names."""
+
+    def __init__(self, owner_id=None, staff_id=None, groups=()):
+        self.owner_id = owner_id
+        self.staff_id = staff_id
+        self.groups = frozenset(groups)
+
+    def has_group(self, *group_names):
+        return not self.groups.isdisjoint(group_names)
+
+    def to_dict(self):
+        return {
+            "owner_id": self.owner_id,
+            "staff_id": self.staff_id,
+            "groups": sorted(self.groups),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["owner_id"], data["staff_id"], data["groups"])
+
+
+def resolve_tenant_context(user):
+    """Load the tenant context of a user from the database."""
+    if not user or not user.is_authenticated:
+        return TenantContext()
+
+    owner_id = None
+    # First check if user is StaffUser
+    staff = StaffUser.objects.filter(userID=user).values("id", "ownerID_id").first()
+    staff_id = staff["id"] if staff else None
+    if staff and staff["ownerID_id"]:
+        owner_id = staff["ownerID_id"]
+    else:
+        # Otherwise, check if user is Owner
+        owner_id = Owner.objects.filter(userID=user).values_list("id", flat=True).first()
+
+    groups = user.groups.values_list("name", flat=True)
+    return TenantContext(owner_id, staff_id, groups)
+
+
+def invalidate_tenant_context(user_id):
+    """Expire every cached tenant context of the user (all sessions)."""
+    key = _version_key(user_id)
+    current = cache.get(key) or 0
+    cache.set(key, max(_new_version(), current + 1), timeout=None)
+
+
+def _current_version(user_id):
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # a missing key is a new version, never one a stored context was saved under
+        cache.add(key, _new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def _load_tenant_context(request):
+    user = getattr(request, "user", None)
+    if not user or not user.is_authenticated:
+        return TenantContext()
+
+    session = getattr(request, "session", None)
+    version = _current_version(user.pk)
+    if session is not None:
+        stored = session.get(SESSION_KEY)
+        if stored and stored.get("user_id") == user.pk and stored.get("version") == version:
+            return TenantContext.from_dict(stored)
+
+    context = resolve_tenant_context(user)
+    if session is not None:
+        session[SESSION_KEY] = {**context.to_dict(), "user_id": user.pk, "version": version}
+    logger.info(f"Tenant context resolved for user {user.pk}: owner {context.owner_id}")
+    return context
+
+
+def get_tenant_context(request):
+    """Return the tenant context of the request, resolving it once if the middleware did not."""
+    tenant = getattr(request, "tenant", None)
+    if tenant is None:
+        tenant = _load_tenant_context(request)
+        request.tenant = tenant
+    return tenant
+
+
+class TenantContextMiddleware:
+    """
+    Attach `request.tenant` (a TenantContext) to every request.
+    It is resolved lazily on first access and cached in the session until the
+    user's StaffUser/Owner row or group membership changes.
+    Must be placed after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.tenant = SimpleLazyObject(lambda: _load_tenant_context(request))
+        return self.get_response(request)
@@ -0,0 +1,147 @@
+import gzip
+import json
+import time
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from utils.db_router import read_from_primary
+from utils.logger import logger
+from wmaApp.models import (
+    Category, Customer, CustomerLedger, Expense, JarCounter, Location, Payment, Product, Sales, StaffUser,
+    Supplier, TaxAndHsn, Unit,
+)
+
+# cached view -> models whose rows appear in it; a write to any of them expires the view
+CACHED_VIEW_DEPENDENCIES = {
+    "CustomerList": [Customer, Location],
+    "ProductList": [Product, Unit, Category, TaxAndHsn],
+    # datatable record counts (see utils/datatable_counts.py)
+    "CustomerListJson": [Customer],
+    "ProductListJson": [Product],
+    "SalesListJson": [Sales],
+    "PaymentListJson": [Payment],
+    "JarListJson": [JarCounter],
+    "CustomerLedgerListJson": [CustomerLedger],
+    # the day's figures come from DailySummary, which only changes together with these rows
+    "Dashboard": [Sales, Payment, JarCounter, Expense, Customer, StaffUser, Supplier, Location],
+}
+
+# lists of owners nobody has asked for in a week are dropped
+CACHED_VIEW_TIMEOUT = 60 * 60 * 24 * 7
+# only one worker per owner and view rebuilds a missing entry; the lock expires if it dies
+FILL_LOCK_TIMEOUT = 30
+# how long a request without a stale copy waits for that worker before building the body itself
+FILL_WAIT = 5
+
+
+def _version_key(model, owner_id):
+    return f"CacheVersion{model.__name__}{owner_id}"
+
+
+def _new_version():
+    # a lost version key restarts from the clock, so it never comes back to a version already used
+    return int(time.time() * 1000)
+
+
+def bump_model_version(model, owner_id):
+    """Expire every cached view of the owner that depends on `model`."""
+    key = _version_key(model, owner_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+
+
+def expire_cached_model(model, owner_id):
+    """
+    bump_model_version once now, so the writer's own transaction reads fresh entries, and again
+    on commit, so an entry another worker built from the pre-commit rows in between is not kept.
+    For writes that skip the post_save signals, such as bulk_create and update().
+    """
+    bump_model_version(model, owner_id)
+    transaction.on_commit(lambda: bump_model_version(model, owner_id))
+
+
+def _current_version(keys, values):
+    missing = {key: _new_version() for key in keys if key not in values}
+    if missing:
+        cache.set_many(missing, timeout=None)
+    return "-".join(str(values.get(key, missing.get(key))) for key in keys)
+
+
+def _json_body(message, data):
+    # same payload as SuccessResponse(message, data=data).to_json_response()
+    payload = {"message": message, "success": True, "status": 200, "data": data}
+    return gzip.compress(json.dumps(payload, cls=DjangoJSONEncoder).encode("utf-8"))
+
+
+def _gzip_json_response(request, body):
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        response = HttpResponse(body, content_type="application/json")
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(gzip.decompress(body), content_type="application/json")
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+def cached_json_response(request, view_name, owner_id, message, build):
+    """
+    Serve a cached list view. The entry holds the finished gzipped JSON body together with the
+    model versions it was built from, so a hit is one get_many and no serialization.
+    On a miss one worker rebuilds it (`build()` returns the data) while the others return the
+    stale body, or wait for the new one when there is none.
+    """
+    version_keys = [_version_key(model, owner_id) for model in CACHED_VIEW_DEPENDENCIES[view_name]]
+    body_key = f"{view_name}{owner_id}"
+    values = cache.get_many(version_keys + [body_key])
+    version = _current_version(version_keys, values)
+    stored = values.get(body_key)
+    if stored and stored[0] == version:
+        return _gzip_json_response(request, stored[1])
+
+    lock_key = f"{body_key}:fill"
+    if not cache.add(lock_key, 1, timeout=FILL_LOCK_TIMEOUT):
+        if stored:
+            logger.info(f"{view_name} for owner {owner_id} is being rebuilt, serving the previous copy")
+            return _gzip_json_response(request, stored[1])
+        deadline = time.monotonic() + FILL_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.1)
+            stored = cache.get(body_key)
+            if stored:
+                return _gzip_json_response(request, stored[1])
+        logger.warning(f"Timed out waiting for {view_name} of owner {owner_id}, building it here")
+        with read_from_primary():
+            return _gzip_json_response(request, _json_body(message, build()))
+
+    try:
+        with read_from_primary():
+            body = _json_body(message, build())
+        cache.set(body_key, (version, body), timeout=CACHED_VIEW_TIMEOUT)
+    finally:
+        cache.delete(lock_key)
+    logger.info(f"{view_name} for owner {owner_id} rebuilt")
+    return _gzip_json_response(request, body)
+
+
+def cached_value(view_name, owner_id, key, build, timeout=CACHED_VIEW_TIMEOUT):
+    """`build()` cached under `key` until a model `view_name` depends on changes for the owner."""
+    version_keys = [_version_key(model, owner_id) for model in CACHED_VIEW_DEPENDENCIES[view_name]]
+    values = cache.get_many(version_keys + [key])
+    version = _current_version(version_keys, values)
+    stored = values.get(key)
+    if stored and stored[0] == version:
+        return stored[1]
+    with read_from_primary():
+        value = build()
+    cache.set(key, (version, value), timeout=timeout)
+    return value
+
+
+def dependent_models():
+    return {model for models in CACHED_VIEW_DEPENDENCIES.values() for model in models}
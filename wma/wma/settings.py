@@ -50,6 +50,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'utils.tenant_context.TenantContextMiddleware',
+    'utils.db_router.ReplicaPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -102,6 +104,33 @@ else:
         }
     }
 
+# Read replica for the reports, the dashboard and the datatables (see utils/db_router.py).
+# MySQL: DB_REPLICA_HOST (and DB_REPLICA_NAME for a second schema on the same server).
+# SQLite: SQLITE_REPLICA names a second database file, e.g. a copy of db.sqlite3.
+if os.environ.get("USE_MYSQL", "false") == "true":
+    if os.environ.get("DB_REPLICA_HOST") or os.environ.get("DB_REPLICA_NAME"):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.environ.get("DB_REPLICA_HOST", DATABASES['default']['HOST']),
+            'NAME': os.environ.get("DB_REPLICA_NAME", DATABASES['default']['NAME']),
+        }
+elif os.environ.get("SQLITE_REPLICA"):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / os.environ["SQLITE_REPLICA"],
+    }
+if 'replica' in DATABASES:
+    # tests read the replica through the primary's connection
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+DATABASE_ROUTERS = ['utils.db_router.ReplicaRouter']
+REPLICA_DATABASE = 'replica'
+# how long a user who wrote reads from the primary only, at least the replica's usual lag
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", 5))
+
+# MySQL has no partial indexes; the isDeleted=False index conditions in
+# wmaApp.models are dropped there and plain composite indexes are created instead.
+SILENCED_SYSTEM_CHECKS = ["models.W037"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -154,6 +183,8 @@ STATIC_ROOT = os.path.join(os.path.dirname(BASE_DIR), "static_cdn")
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(os.path.dirname(BASE_DIR), "media_cdn")
+# rendered report PDFs, served only through the authenticated download api
+REPORT_CACHE_ROOT = os.path.join(os.path.dirname(BASE_DIR), "report_cache")
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -112,8 +112,9 @@ class CustomerAdmin(ImagePreviewMixin, ActiveDeletedMixin, admin.ModelAdmin):
 
 # ---------- Register remaining without customization ----------
 models_to_register = [
-    ExpenseGroup, Expense, Location, CustomerLedger, TaxAndHsn, Category, Unit,
-    Supplier, SaleProduct, Payment, AdvanceOrder, AdvanceOrderProduct, JarCounter,
+    ExpenseGroup, Expense, Location, CustomerLedger, CustomerBalance, LedgerCheckpoint, DailySummary, TaxAndHsn,
+    Category, Unit, Supplier, SaleProduct, Payment, AdvanceOrder, AdvanceOrderProduct, JarCounter, ReportJob,
+    SearchIndexJob,
 ]
 
 for model in models_to_register:
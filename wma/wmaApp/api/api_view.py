@@ -1,7 +1,7 @@
 from datetime import datetime
+from django.core.cache import cache
 from django.db import transaction
 from django.db.models import Q, Sum, Count, Avg, F, Value
-from django.core.cache import cache
 from django.utils.html import escape
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
@@ -10,9 +10,20 @@ from django.contrib.auth.models import User, Group
 from django_datatables_view.base_datatable_view import BaseDatatableView
 
 from utils.custom_response import SuccessResponse, ErrorResponse
-from utils.customer_ledger_generator import generate_customer_ledger
-from utils.get_user_id_detail import get_owner_id, get_user_id
+from utils.customer_import import CustomerImport, CustomerImportError, import_progress_key
+from utils.customer_ledger_generator import (
+    CREDIT, DEBIT, apply_ledger_change, generate_customer_ledger, generate_customer_ledger_entries,
+    ledger_values,
+)
+from utils.daily_summary import apply_summary_change, summary_values
+from utils.datatable_counts import LARGE_TABLE_ROWS, CountingMixin
+from utils.db_router import ReplicaReadMixin
+from utils.document_number import BOOKING_PREFIX, CUSTOMER_PREFIX, SALES_PREFIX, next_document_number
 from utils.json_validator import validate_input
+from utils.keyset_pagination import KeysetPaginationMixin
+from utils.ledger_checkpoints import balance_as_of
+from utils.line_items import LineItemError, parse_line_items, save_line_items
+from utils.search_index import search_filter
 from wmaApp.models import *
 from utils.logger import logger
 from django.db.models.functions import Coalesce
@@ -35,7 +46,7 @@ from django.db.models.functions import Coalesce
 @transaction.atomic
 def add_staff_api(request):
     data = request.POST.dict()
-    owner_id = get_owner_id(request)
+    owner_id = request.tenant.owner_id
     try:
         profile_pic = request.FILES.get("profile_pic")
         # Get or create the UserGroup instance
@@ -148,7 +159,7 @@ def update_staff_api(request):
         ).to_json_response()
 
 
-class StaffUserListJson(BaseDatatableView):
+class StaffUserListJson(ReplicaReadMixin, BaseDatatableView):
     order_columns = [
         "profile_pic",
         "name",
@@ -163,8 +174,8 @@ class StaffUserListJson(BaseDatatableView):
 
     def get_initial_queryset(self):
         # if 'Admin' in self.request.user.groups.values_list('name', flat=True):
-        return StaffUser.objects.select_related().filter(
-            isDeleted__exact=False, ownerID_id=get_owner_id(self.request)
+        return StaffUser.objects.select_related("groupID").filter(
+            isDeleted__exact=False, ownerID_id=self.request.tenant.owner_id
         )
 
     def filter_queryset(self, qs):
@@ -188,11 +199,7 @@ class StaffUserListJson(BaseDatatableView):
             images = '<img class="ui avatar image" src="{}">'.format(
                 item.profile_pic.thumb.url
             )
-            if (
-                "Owner" in self.request.user.groups.values_list("name", flat=True)
-                or "Manager" in self.request.user.groups.values_list("name", flat=True)
-                or "Admin" in self.request.user.groups.values_list("name", flat=True)
-            ):
+            if self.request.tenant.has_group("Owner", "Manager", "Admin"):
                 action = (
                     """<button data-inverted="" data-tooltip="Edit Detail" data-position="left center" data-variation="mini" style="font-size:10px;" onclick = "GetUserDetails('{}')" class="ui circular facebook icon button green">
                     <i class="pen icon"></i>
@@ -236,7 +243,7 @@ def get_staff_detail(request):
         # Get single staff user
         try:
             staff = StaffUser.objects.get(
-                id=staff_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=staff_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
             data = {
                 "id": staff.id,
@@ -273,7 +280,7 @@ def delete_staff(request):
     try:
         try:
             staff = StaffUser.objects.get(
-                id=staff_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=staff_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
         except StaffUser.DoesNotExist:
             logger.error(f"Staff user not found")
@@ -308,7 +315,7 @@ def add_location_api(request):
     try:
         # Check if location with same name already exists
         if Location.objects.filter(
-            name__iexact=data["name"], ownerID_id=get_owner_id(request), isDeleted=False
+            name__iexact=data["name"], ownerID_id=request.tenant.owner_id, isDeleted=False
         ).exists():
             logger.error(f"Location with name '{data['name']}' already exists")
             return ErrorResponse(
@@ -316,7 +323,7 @@ def add_location_api(request):
             ).to_json_response()
         obj = Location(
             name=data["name"],
-            ownerID_id=get_owner_id(request),
+            ownerID_id=request.tenant.owner_id,
         )
         obj.save()
         logger.info("Location created successfully")
@@ -328,13 +335,13 @@ def add_location_api(request):
         ).to_json_response()
 
 
-class LocationListJson(BaseDatatableView):
+class LocationListJson(ReplicaReadMixin, BaseDatatableView):
     order_columns = ["name", "dateCreated"]
 
     def get_initial_queryset(self):
         # if 'Admin' in self.request.user.groups.values_list('name', flat=True):
         return Location.objects.select_related().filter(
-            isDeleted__exact=False, ownerID_id=get_owner_id(self.request)
+            isDeleted__exact=False, ownerID_id=self.request.tenant.owner_id
         )
 
     def filter_queryset(self, qs):
@@ -347,11 +354,7 @@ class LocationListJson(BaseDatatableView):
     def prepare_results(self, qs):
         json_data = []
         for item in qs:
-            if (
-                "Owner" in self.request.user.groups.values_list("name", flat=True)
-                or "Manager" in self.request.user.groups.values_list("name", flat=True)
-                or "Admin" in self.request.user.groups.values_list("name", flat=True)
-            ):
+            if self.request.tenant.has_group("Owner", "Manager", "Admin"):
                 action = (
                     """<button data-inverted="" data-tooltip="Edit Detail" data-position="left center" data-variation="mini" style="font-size:10px;" onclick = "GetUserDetails('{}')" class="ui circular facebook icon button green">
                     <i class="pen icon"></i>
@@ -386,7 +389,7 @@ def delete_location_api(request):
     try:
         try:
             obj = Location.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
         except Location.DoesNotExist:
             logger.error(f"Location not found")
@@ -414,7 +417,7 @@ def get_location_detail(request):
         # Get single staff user
         try:
             obj = Location.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
             data = {
                 "id": obj.id,
@@ -445,7 +448,7 @@ def update_location_api(request):
         # Check if location exists and belongs to the owner
         try:
             obj = Location.objects.get(
-                id=data["id"], ownerID_id=get_owner_id(request), isDeleted=False
+                id=data["id"], ownerID_id=request.tenant.owner_id, isDeleted=False
             )
         except Location.DoesNotExist:
             logger.error(f"Location with ID {data['id']}' not found")
@@ -457,7 +460,7 @@ def update_location_api(request):
         if (
             Location.objects.filter(
                 name__iexact=data["name"],
-                ownerID_id=get_owner_id(request),
+                ownerID_id=request.tenant.owner_id,
                 isDeleted=False,
             )
             .exclude(id=data["id"])
@@ -492,7 +495,7 @@ def add_expense_group_api(request):
     try:
         # Check if Expense Group with same name already exists
         if ExpenseGroup.objects.filter(
-            name__iexact=data["name"], ownerID_id=get_owner_id(request), isDeleted=False
+            name__iexact=data["name"], ownerID_id=request.tenant.owner_id, isDeleted=False
         ).exists():
             logger.error(f"Expense Group with name '{data['name']}' already exists")
             return ErrorResponse(
@@ -500,7 +503,7 @@ def add_expense_group_api(request):
             ).to_json_response()
         obj = ExpenseGroup(
             name=data["name"],
-            ownerID_id=get_owner_id(request),
+            ownerID_id=request.tenant.owner_id,
         )
         obj.save()
         logger.info("Expense Group created successfully")
@@ -512,13 +515,13 @@ def add_expense_group_api(request):
         ).to_json_response()
 
 
-class ExpenseGroupListJson(BaseDatatableView):
+class ExpenseGroupListJson(ReplicaReadMixin, BaseDatatableView):
     order_columns = ["name", "dateCreated"]
 
     def get_initial_queryset(self):
         # if 'Admin' in self.request.user.groups.values_list('name', flat=True):
         return ExpenseGroup.objects.select_related().filter(
-            isDeleted__exact=False, ownerID_id=get_owner_id(self.request)
+            isDeleted__exact=False, ownerID_id=self.request.tenant.owner_id
         )
 
     def filter_queryset(self, qs):
@@ -531,11 +534,7 @@ class ExpenseGroupListJson(BaseDatatableView):
     def prepare_results(self, qs):
         json_data = []
         for item in qs:
-            if (
-                "Owner" in self.request.user.groups.values_list("name", flat=True)
-                or "Manager" in self.request.user.groups.values_list("name", flat=True)
-                or "Admin" in self.request.user.groups.values_list("name", flat=True)
-            ):
+            if self.request.tenant.has_group("Owner", "Manager", "Admin"):
                 action = (
                     """<button data-inverted="" data-tooltip="Edit Detail" data-position="left center" data-variation="mini" style="font-size:10px;" onclick = "GetUserDetails('{}')" class="ui circular facebook icon button green">
                     <i class="pen icon"></i>
@@ -570,7 +569,7 @@ def delete_expense_group_api(request):
     try:
         try:
             obj = ExpenseGroup.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
         except ExpenseGroup.DoesNotExist:
             logger.error(f"Expense Group not found")
@@ -598,7 +597,7 @@ def get_expense_group_detail(request):
         # Get single staff user
         try:
             obj = ExpenseGroup.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
             data = {
                 "id": obj.id,
@@ -631,7 +630,7 @@ def update_expense_group_api(request):
         # Check if Expense Group exists and belongs to the owner
         try:
             obj = ExpenseGroup.objects.get(
-                id=data["id"], ownerID_id=get_owner_id(request), isDeleted=False
+                id=data["id"], ownerID_id=request.tenant.owner_id, isDeleted=False
             )
         except ExpenseGroup.DoesNotExist:
             logger.error(f"Expense Group with ID {data['id']}' not found")
@@ -643,7 +642,7 @@ def update_expense_group_api(request):
         if (
             ExpenseGroup.objects.filter(
                 name__iexact=data["name"],
-                ownerID_id=get_owner_id(request),
+                ownerID_id=request.tenant.owner_id,
                 isDeleted=False,
             )
             .exclude(id=data["id"])
@@ -678,7 +677,7 @@ def update_expense_group_api(request):
 def add_customer_api(request):
     data = request.POST.dict()
     try:
-        owner_id = get_owner_id(request)
+        owner_id = request.tenant.owner_id
         profile_pic = request.FILES.get("profile_pic")
         try:
             location = Location.objects.get(
@@ -699,7 +698,7 @@ def add_customer_api(request):
             address=data.get("address", ""),
             addedDate=datetime.today().now(),
             ownerID_id=owner_id,
-            addedByID_id=get_user_id(request),
+            addedByID_id=request.tenant.staff_id,
         )
         username = "CUS" + get_random_string(length=8, allowed_chars="1234567890")
         password = get_random_string(length=8, allowed_chars="1234567890")
@@ -714,19 +713,13 @@ def add_customer_api(request):
             new_user.save()
             obj.username = username
             obj.userID = new_user
+            obj.customerId = next_document_number(owner_id, CUSTOMER_PREFIX)
             obj.save()
-            customer_count = (
-                Customer.objects.select_related()
-                .filter(ownerID_id=get_owner_id(request))
-                .count()
-            )
-            obj.customerId = "CID" + str(customer_count).zfill(8)
-            obj.save()
+            CustomerBalance.objects.create(ownerID_id=owner_id, customerID=obj)
             # Add user to group
             group, created = Group.objects.get_or_create(name="Customer")
             group.user_set.add(new_user)
             group.save()
-            cache.delete(f"CustomerList{owner_id}")
         logger.info("Customer user created successfully")
         return SuccessResponse("Customer user created successfully").to_json_response()
     except Exception as e:
@@ -743,7 +736,7 @@ def add_customer_api(request):
 def update_customer_api(request):
     data = request.POST.dict()
     try:
-        owner_id = get_owner_id(request)
+        owner_id = request.tenant.owner_id
         # Get the Location instance
         try:
             loc = Location.objects.get(
@@ -754,7 +747,7 @@ def update_customer_api(request):
             return ErrorResponse(f"Location does not exist").to_json_response()
         try:
             obj = Customer.objects.get(
-                pk=data["id"], isDeleted=False, ownerID_id=get_owner_id(request)
+                pk=data["id"], isDeleted=False, ownerID_id=request.tenant.owner_id
             )
 
             obj.name = data["name"]
@@ -763,7 +756,6 @@ def update_customer_api(request):
             obj.address = data.get("address", "")
             obj.phone = data["phone"]
             obj.save()
-            cache.delete(f"CustomerList{owner_id}")
 
             logger.info("Customer user updated successfully")
             return SuccessResponse(
@@ -779,12 +771,12 @@ def update_customer_api(request):
         ).to_json_response()
 
 
-class CustomerListJson(BaseDatatableView):
+class CustomerListJson(ReplicaReadMixin, CountingMixin, BaseDatatableView):
     order_columns = [
         "profile_pic",
         "customerId",
         "name",
-        "due_amount",
+        "customerbalance__balance",
         "locationID",
         "phone",
         "address",
@@ -792,48 +784,29 @@ class CustomerListJson(BaseDatatableView):
         "dateCreated",
     ]
 
+    def get_count_queryset(self):
+        # without the balance join and annotation of the rows
+        return Customer.objects.filter(isDeleted=False, ownerID_id=self.request.tenant.owner_id)
 
     def get_initial_queryset(self):
-        owner_id = get_owner_id(self.request)
+        owner_id = self.request.tenant.owner_id
 
+        # due amount is read from the per-customer balance row kept by the ledger write path
         return (
-            Customer.objects.filter(
+            Customer.objects.select_related("locationID", "addedByID", "customerbalance")
+            .filter(
                 isDeleted=False,
                 ownerID_id=owner_id
             )
             .annotate(
-                total_debit=Coalesce(
-                    Sum(
-                        'customerledger__debit',
-                        filter=Q(customerledger__isDeleted=False) &
-                            Q(customerledger__ownerID_id=owner_id)
-                    ),
-                    Value(0.0)
-                ),
-                total_credit=Coalesce(
-                    Sum(
-                        'customerledger__credit',
-                        filter=Q(customerledger__isDeleted=False) &
-                            Q(customerledger__ownerID_id=owner_id)
-                    ),
-                    Value(0.0)
-                ),
-                due_amount= F("total_credit") - F("total_debit")
+                due_amount=Coalesce(F("customerbalance__balance"), Value(0.0))
             )
         )
 
     def filter_queryset(self, qs):
         search = self.request.GET.get("search[value]", None)
         if search:
-            qs = qs.filter(
-                Q(name__icontains=search)
-                | Q(name__icontains=search)
-                | Q(locationID__name__icontains=search)
-                | Q(phone__icontains=search)
-                | Q(address__icontains=search)
-                | Q(addedByID__name__icontains=search)
-                | Q(dateCreated__icontains=search)
-            )
+            qs = search_filter(qs, search, self.request.tenant.owner_id)
 
         return qs
 
@@ -845,11 +818,7 @@ class CustomerListJson(BaseDatatableView):
                 if item.profile_pic
                 else "/static/images/user-icon.png"
             )
-            if (
-                "Owner" in self.request.user.groups.values_list("name", flat=True)
-                or "Manager" in self.request.user.groups.values_list("name", flat=True)
-                or "Admin" in self.request.user.groups.values_list("name", flat=True)
-            ):
+            if self.request.tenant.has_group("Owner", "Manager", "Admin"):
                 action = (
                     """
                 <a href="/customer_ledger/{}/" data-inverted="" data-tooltip="View Ledger" data-position="left center" data-variation="mini" style="font-size:10px;" class="ui circular facebook icon button pink">
@@ -925,7 +894,7 @@ def get_customer_detail(request):
 def delete_customer(request):
     id = request.POST.get("id")
     try:
-        owner_id = get_owner_id(request)
+        owner_id = request.tenant.owner_id
         try:
             obj = Customer.objects.get(id=id, isDeleted=False, ownerID_id=owner_id)
         except Customer.DoesNotExist:
@@ -943,7 +912,6 @@ def delete_customer(request):
         if obj.userID:
             obj.userID.is_active = False
             obj.userID.save()
-        cache.delete(f"CustomerList{owner_id}")
         logger.info("Customer user deleted successfully")
         return SuccessResponse("Customer user deleted successfully").to_json_response()
 
@@ -964,7 +932,7 @@ def add_category_api(request):
     try:
         # Check if location with same name already exists
         if Category.objects.filter(
-            name__iexact=data["name"], ownerID_id=get_owner_id(request), isDeleted=False
+            name__iexact=data["name"], ownerID_id=request.tenant.owner_id, isDeleted=False
         ).exists():
             logger.error(f"Category with name '{data['name']}' already exists")
             return ErrorResponse(
@@ -972,7 +940,7 @@ def add_category_api(request):
             ).to_json_response()
         obj = Category(
             name=data["name"],
-            ownerID_id=get_owner_id(request),
+            ownerID_id=request.tenant.owner_id,
         )
         obj.save()
         logger.info("Category created successfully")
@@ -984,13 +952,13 @@ def add_category_api(request):
         ).to_json_response()
 
 
-class CategoryListJson(BaseDatatableView):
+class CategoryListJson(ReplicaReadMixin, BaseDatatableView):
     order_columns = ["name", "dateCreated"]
 
     def get_initial_queryset(self):
         # if 'Admin' in self.request.user.groups.values_list('name', flat=True):
         return Category.objects.select_related().filter(
-            isDeleted__exact=False, ownerID_id=get_owner_id(self.request)
+            isDeleted__exact=False, ownerID_id=self.request.tenant.owner_id
         )
 
     def filter_queryset(self, qs):
@@ -1003,11 +971,7 @@ class CategoryListJson(BaseDatatableView):
     def prepare_results(self, qs):
         json_data = []
         for item in qs:
-            if (
-                "Owner" in self.request.user.groups.values_list("name", flat=True)
-                or "Manager" in self.request.user.groups.values_list("name", flat=True)
-                or "Admin" in self.request.user.groups.values_list("name", flat=True)
-            ):
+            if self.request.tenant.has_group("Owner", "Manager", "Admin"):
                 action = (
                     """<button data-inverted="" data-tooltip="Edit Detail" data-position="left center" data-variation="mini" style="font-size:10px;" onclick = "GetUserDetails('{}')" class="ui circular facebook icon button green">
                     <i class="pen icon"></i>
@@ -1042,7 +1006,7 @@ def delete_category_api(request):
     try:
         try:
             obj = Category.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
         except Category.DoesNotExist:
             logger.error(f"Category not found")
@@ -1072,7 +1036,7 @@ def get_category_detail(request):
         # Get single staff user
         try:
             obj = Category.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
             data = {
                 "id": obj.id,
@@ -1103,7 +1067,7 @@ def update_category_api(request):
         # Check if Category exists and belongs to the owner
         try:
             obj = Category.objects.get(
-                id=data["id"], ownerID_id=get_owner_id(request), isDeleted=False
+                id=data["id"], ownerID_id=request.tenant.owner_id, isDeleted=False
             )
         except Category.DoesNotExist:
             logger.error(f"Category with ID {data['id']}' not found")
@@ -1115,7 +1079,7 @@ def update_category_api(request):
         if (
             Category.objects.filter(
                 name__iexact=data["name"],
-                ownerID_id=get_owner_id(request),
+                ownerID_id=request.tenant.owner_id,
                 isDeleted=False,
             )
             .exclude(id=data["id"])
@@ -1150,7 +1114,7 @@ def add_unit_api(request):
     try:
         # Check if location with same name already exists
         if Unit.objects.filter(
-            name__iexact=data["name"], ownerID_id=get_owner_id(request), isDeleted=False
+            name__iexact=data["name"], ownerID_id=request.tenant.owner_id, isDeleted=False
         ).exists():
             logger.error(f"Unit with name '{data['name']}' already exists")
             return ErrorResponse(
@@ -1158,7 +1122,7 @@ def add_unit_api(request):
             ).to_json_response()
         obj = Unit(
             name=data["name"],
-            ownerID_id=get_owner_id(request),
+            ownerID_id=request.tenant.owner_id,
         )
         obj.save()
         logger.info("Unit created successfully")
@@ -1170,13 +1134,13 @@ def add_unit_api(request):
         ).to_json_response()
 
 
-class UnitListJson(BaseDatatableView):
+class UnitListJson(ReplicaReadMixin, BaseDatatableView):
     order_columns = ["name", "dateCreated"]
 
     def get_initial_queryset(self):
         # if 'Admin' in self.request.user.groups.values_list('name', flat=True):
         return Unit.objects.select_related().filter(
-            isDeleted__exact=False, ownerID_id=get_owner_id(self.request)
+            isDeleted__exact=False, ownerID_id=self.request.tenant.owner_id
         )
 
     def filter_queryset(self, qs):
@@ -1189,11 +1153,7 @@ class UnitListJson(BaseDatatableView):
     def prepare_results(self, qs):
         json_data = []
         for item in qs:
-            if (
-                "Owner" in self.request.user.groups.values_list("name", flat=True)
-                or "Manager" in self.request.user.groups.values_list("name", flat=True)
-                or "Admin" in self.request.user.groups.values_list("name", flat=True)
-            ):
+            if self.request.tenant.has_group("Owner", "Manager", "Admin"):
                 action = (
                     """<button data-inverted="" data-tooltip="Edit Detail" data-position="left center" data-variation="mini" style="font-size:10px;" onclick = "GetUserDetails('{}')" class="ui circular facebook icon button green">
                     <i class="pen icon"></i>
@@ -1228,7 +1188,7 @@ def delete_unit_api(request):
     try:
         try:
             obj = Unit.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
         except Unit.DoesNotExist:
             logger.error(f"Unit not found")
@@ -1255,7 +1215,7 @@ def get_unit_detail(request):
         obj_id = request.GET.get("id")
         try:
             obj = Unit.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
             data = {
                 "id": obj.id,
@@ -1283,7 +1243,7 @@ def update_unit_api(request):
     try:
         try:
             obj = Unit.objects.get(
-                id=data["id"], ownerID_id=get_owner_id(request), isDeleted=False
+                id=data["id"], ownerID_id=request.tenant.owner_id, isDeleted=False
             )
         except Unit.DoesNotExist:
             logger.error(f"Unit with ID {data['id']}' not found")
@@ -1292,7 +1252,7 @@ def update_unit_api(request):
         if (
             Unit.objects.filter(
                 name__iexact=data["name"],
-                ownerID_id=get_owner_id(request),
+                ownerID_id=request.tenant.owner_id,
                 isDeleted=False,
             )
             .exclude(id=data["id"])
@@ -1328,7 +1288,7 @@ def add_hsn_and_tax_api(request):
         if TaxAndHsn.objects.filter(
             hsn__iexact=data["name"],
             taxRate=data["tax"],
-            ownerID_id=get_owner_id(request),
+            ownerID_id=request.tenant.owner_id,
             isDeleted=False,
         ).exists():
             logger.error(
@@ -1340,7 +1300,7 @@ def add_hsn_and_tax_api(request):
         obj = TaxAndHsn(
             hsn=data["name"],
             taxRate=data["tax"],
-            ownerID_id=get_owner_id(request),
+            ownerID_id=request.tenant.owner_id,
         )
         obj.save()
         logger.info("HSN Tax created successfully")
@@ -1352,13 +1312,13 @@ def add_hsn_and_tax_api(request):
         ).to_json_response()
 
 
-class HSNTAXListJson(BaseDatatableView):
+class HSNTAXListJson(ReplicaReadMixin, BaseDatatableView):
     order_columns = ["name", "taxRate", "dateCreated"]
 
     def get_initial_queryset(self):
         # if 'Admin' in self.request.user.groups.values_list('name', flat=True):
         return TaxAndHsn.objects.select_related().filter(
-            isDeleted__exact=False, ownerID_id=get_owner_id(self.request)
+            isDeleted__exact=False, ownerID_id=self.request.tenant.owner_id
         )
 
     def filter_queryset(self, qs):
@@ -1375,11 +1335,7 @@ class HSNTAXListJson(BaseDatatableView):
     def prepare_results(self, qs):
         json_data = []
         for item in qs:
-            if (
-                "Owner" in self.request.user.groups.values_list("name", flat=True)
-                or "Manager" in self.request.user.groups.values_list("name", flat=True)
-                or "Admin" in self.request.user.groups.values_list("name", flat=True)
-            ):
+            if self.request.tenant.has_group("Owner", "Manager", "Admin"):
                 action = (
                     """<button data-inverted="" data-tooltip="Edit Detail" data-position="left center" data-variation="mini" style="font-size:10px;" onclick = "GetUserDetails('{}')" class="ui circular facebook icon button green">
                     <i class="pen icon"></i>
@@ -1415,7 +1371,7 @@ def delete_hsn_and_tax_api(request):
     try:
         try:
             obj = TaxAndHsn.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
         except TaxAndHsn.DoesNotExist:
             logger.error(f"HSN Tax not found")
@@ -1444,7 +1400,7 @@ def get_hsn_and_tax_detail(request):
         obj_id = request.GET.get("id")
         try:
             obj = TaxAndHsn.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
             data = {
                 "id": obj.id,
@@ -1475,7 +1431,7 @@ def update_hsn_and_tax_api(request):
     try:
         try:
             obj = TaxAndHsn.objects.get(
-                id=data["id"], ownerID_id=get_owner_id(request), isDeleted=False
+                id=data["id"], ownerID_id=request.tenant.owner_id, isDeleted=False
             )
         except TaxAndHsn.DoesNotExist:
             logger.error(f"HSN Tax with ID {data['id']}' not found")
@@ -1487,7 +1443,7 @@ def update_hsn_and_tax_api(request):
             TaxAndHsn.objects.filter(
                 hsn__iexact=data["name"],
                 taxRate=data["tax"],
-                ownerID_id=get_owner_id(request),
+                ownerID_id=request.tenant.owner_id,
                 isDeleted=False,
             )
             .exclude(id=data["id"])
@@ -1534,7 +1490,7 @@ def update_hsn_and_tax_api(request):
 def add_product_api(request):
     data = request.POST.dict()
     try:
-        owner_id = get_owner_id(request)
+        owner_id = request.tenant.owner_id
         if Product.objects.filter(
             productName__iexact=data["product"], ownerID_id=owner_id, isDeleted=False
         ).exists():
@@ -1554,7 +1510,6 @@ def add_product_api(request):
             ownerID_id=owner_id,
         )
         obj.save()
-        cache.delete(f"ProductList{owner_id}")
         logger.info("Product created successfully")
         return SuccessResponse("Product created successfully").to_json_response()
     except Exception as e:
@@ -1564,7 +1519,7 @@ def add_product_api(request):
         ).to_json_response()
 
 
-class ProductListJson(BaseDatatableView):
+class ProductListJson(ReplicaReadMixin, CountingMixin, BaseDatatableView):
     order_columns = [
         "productName",
         "categoryID",
@@ -1579,35 +1534,21 @@ class ProductListJson(BaseDatatableView):
 
     def get_initial_queryset(self):
         # if 'Admin' in self.request.user.groups.values_list('name', flat=True):
-        return Product.objects.select_related().filter(
-            isDeleted__exact=False, ownerID_id=get_owner_id(self.request)
+        return Product.objects.select_related("categoryID", "taxID", "unitID").filter(
+            isDeleted__exact=False, ownerID_id=self.request.tenant.owner_id
         )
 
     def filter_queryset(self, qs):
         search = self.request.GET.get("search[value]", None)
         if search:
-            qs = qs.filter(
-                Q(productName__icontains=search)
-                | Q(categoryID__name__icontains=search)
-                | Q(rate__icontains=search)
-                | Q(quantity__icontains=search)
-                | Q(unitID__name__icontains=search)
-                | Q(taxID__hsn__icontains=search)
-                | Q(sp__icontains=search)
-                | Q(productDescription__icontains=search)
-                | Q(dateCreated__icontains=search)
-            )
+            qs = search_filter(qs, search, self.request.tenant.owner_id)
 
         return qs
 
     def prepare_results(self, qs):
         json_data = []
         for item in qs:
-            if (
-                "Owner" in self.request.user.groups.values_list("name", flat=True)
-                or "Manager" in self.request.user.groups.values_list("name", flat=True)
-                or "Admin" in self.request.user.groups.values_list("name", flat=True)
-            ):
+            if self.request.tenant.has_group("Owner", "Manager", "Admin"):
                 action = (
                     """<button data-inverted="" data-tooltip="Edit Detail" data-position="left center" data-variation="mini" style="font-size:10px;" onclick = "GetUserDetails('{}')" class="ui circular facebook icon button green">
                     <i class="pen icon"></i>
@@ -1645,7 +1586,7 @@ class ProductListJson(BaseDatatableView):
 @validate_input(["id"])
 @transaction.atomic
 def delete_product_api(request):
-    owner_id = get_owner_id(request)
+    owner_id = request.tenant.owner_id
     obj_id = request.POST.get("id")
     try:
         try:
@@ -1659,7 +1600,6 @@ def delete_product_api(request):
         # Soft delete
         obj.isDeleted = True
         obj.save()
-        cache.delete(f"ProductList{owner_id}")
         logger.info("Product deleted successfully")
         return SuccessResponse("Product deleted successfully").to_json_response()
 
@@ -1677,7 +1617,7 @@ def get_product_detail(request):
         obj_id = request.GET.get("id")
         try:
             obj = Product.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
             data = {
                 "id": obj.id,
@@ -1724,7 +1664,7 @@ def get_product_detail(request):
 def update_product_api(request):
     data = request.POST.dict()
     try:
-        owner_id = get_owner_id(request)
+        owner_id = request.tenant.owner_id
         try:
             obj = Product.objects.get(
                 id=data["id"], ownerID_id=owner_id, isDeleted=False
@@ -1761,7 +1701,6 @@ def update_product_api(request):
         obj.categoryID_id = data["category"]
         obj.unitID_id = data["unit"]
         obj.save()
-        cache.delete(f"ProductList{owner_id}")
         logger.info(f"Product '{data['id']}' updated successfully")
         return SuccessResponse("Product updated successfully").to_json_response()
 
@@ -1794,7 +1733,8 @@ def update_product_api(request):
 def add_sales_api(request):
     data = request.POST.dict()
     try:
-        owner_id = get_owner_id(request)
+        owner_id = request.tenant.owner_id
+        items = parse_line_items(data["datas"])
         if data["catering"] == "0":
             obj = Sales(
                 customerID_id=data["customer"],
@@ -1804,29 +1744,12 @@ def add_sales_api(request):
                 additionalCharge=data["additionalCharge"],
                 totalAmountAfterTax=data["grandTotal"],
                 ownerID_id=owner_id,
-                addedByID_id=get_user_id(request),
+                addedByID_id=request.tenant.staff_id,
+                invoiceNumber=next_document_number(owner_id, SALES_PREFIX),
             )
             obj.save()
-            obj.invoiceNumber = "S" + str(
-                Sales.objects.filter(ownerID_id=owner_id).count()
-            ).zfill(8)
-            obj.save()
-            splited_receive_item = data["datas"].split("@")
-            for item in splited_receive_item[:-1]:
-                item_details = item.split("|")
-
-                p = SaleProduct()
-                p.salesID_id = obj.pk
-                p.productID_id = item_details[0]
-                p.productName = item_details[1]
-                p.quantity = item_details[2]
-                p.unitPrice = item_details[3]
-                p.totalPrice = item_details[4]
-                p.totalAmountAfterTax = item_details[4]
-                p.remark = item_details[5]
-                p.unit = item_details[6]
-                p.ownerID_id = owner_id
-                p.save()
+            apply_summary_change(None, summary_values(obj))
+            save_line_items(SaleProduct, "salesID_id", obj.pk, owner_id, items)
 
             jar_obj = JarCounter(
                 customerID_id=data["customer"],
@@ -1834,11 +1757,12 @@ def add_sales_api(request):
                 outJar=data["jarOut"],
                 remark=data["remarkAdditional"],
                 date=datetime.today().date(),
-                ownerID_id=get_owner_id(request),
-                addedByID_id=get_user_id(request),
+                ownerID_id=request.tenant.owner_id,
+                addedByID_id=request.tenant.staff_id,
             )
             if int(data["jarIn"]) > 0 or int(data["jarOut"]) > 0:
                 jar_obj.save()
+                apply_summary_change(None, summary_values(jar_obj))
                 logger.info("Jar record added successfully")
 
             payment_obj = Payment(
@@ -1846,28 +1770,23 @@ def add_sales_api(request):
                 paymentAmount=data["amountCollected"],
                 remark=data["remarkAdditional"],
                 paymentDate=datetime.today().date(),
-                ownerID_id=get_owner_id(request),
-                addedByID_id=get_user_id(request),
+                ownerID_id=request.tenant.owner_id,
+                addedByID_id=request.tenant.staff_id,
             )
 
-            generate_customer_ledger(
-                request,
-                data["customer"],
-                "credit",
-                obj.totalAmountAfterTax,
-                "New Sales",
-            )
+            # ledger entries by date, the sale on its sale date and the payment today
+            ledger_entries = {obj.saleDate.date(): [(CREDIT, obj.totalAmountAfterTax, "New Sales")]}
             logger.info("Sales created successfully")
             if int(data["amountCollected"]) > 0:
                 payment_obj.save()
-                generate_customer_ledger(
-                    request,
-                    data["customer"],
-                    "debit",
-                    payment_obj.paymentAmount,
-                    "Payment Received",
+                apply_summary_change(None, summary_values(payment_obj))
+                ledger_entries.setdefault(payment_obj.paymentDate, []).append(
+                    (DEBIT, payment_obj.paymentAmount, "Payment Received")
                 )
                 logger.info("Payment record added successfully")
+            # a sale of today and its payment go on the ledger in one append
+            for entry_date, entries in ledger_entries.items():
+                generate_customer_ledger_entries(request, data["customer"], entries, entry_date)
             return SuccessResponse("Sales created successfully").to_json_response()
         else:
             obj = AdvanceOrder(
@@ -1878,29 +1797,11 @@ def add_sales_api(request):
                 additionalCharge=data["additionalCharge"],
                 totalAmountAfterTax=data["grandTotal"],
                 ownerID_id=owner_id,
-                addedByID_id=get_user_id(request),
+                addedByID_id=request.tenant.staff_id,
+                invoiceNumber=next_document_number(owner_id, BOOKING_PREFIX),
             )
             obj.save()
-            obj.invoiceNumber = "B" + str(
-                AdvanceOrder.objects.filter(ownerID_id=owner_id).count()
-            ).zfill(8)
-            obj.save()
-            splited_receive_item = data["datas"].split("@")
-            for item in splited_receive_item[:-1]:
-                item_details = item.split("|")
-
-                p = AdvanceOrderProduct()
-                p.orderID_id = obj.pk
-                p.productID_id = item_details[0]
-                p.productName = item_details[1]
-                p.quantity = item_details[2]
-                p.unitPrice = item_details[3]
-                p.totalPrice = item_details[4]
-                p.totalAmountAfterTax = item_details[4]
-                p.remark = item_details[5]
-                p.unit = item_details[6]
-                p.ownerID_id = owner_id
-                p.save()
+            save_line_items(AdvanceOrderProduct, "orderID_id", obj.pk, owner_id, items)
 
             jar_obj = JarCounter(
                 customerID_id=data["customer"],
@@ -1908,11 +1809,12 @@ def add_sales_api(request):
                 outJar=data["jarOut"],
                 remark=data["remarkAdditional"],
                 date=datetime.today().date(),
-                ownerID_id=get_owner_id(request),
-                addedByID_id=get_user_id(request),
+                ownerID_id=request.tenant.owner_id,
+                addedByID_id=request.tenant.staff_id,
             )
             if int(data["jarIn"]) > 0 or int(data["jarOut"]) > 0:
                 jar_obj.save()
+                apply_summary_change(None, summary_values(jar_obj))
                 logger.info("Jar record added successfully")
 
             payment_obj = Payment(
@@ -1920,29 +1822,23 @@ def add_sales_api(request):
                 paymentAmount=data["amountCollected"],
                 remark=data["remarkAdditional"],
                 paymentDate=datetime.today().date(),
-                ownerID_id=get_owner_id(request),
-                addedByID_id=get_user_id(request),
+                ownerID_id=request.tenant.owner_id,
+                addedByID_id=request.tenant.staff_id,
             )
 
-            generate_customer_ledger(
-                request,
-                data["customer"],
-                "credit",
-                obj.totalAmountAfterTax,
-                "New Sales",
-            )
+            ledger_entries = [(CREDIT, obj.totalAmountAfterTax, "New Sales")]
             logger.info("Booking created successfully")
             if int(data["amountCollected"]) > 0:
                 payment_obj.save()
-                generate_customer_ledger(
-                    request,
-                    data["customer"],
-                    "debit",
-                    payment_obj.paymentAmount,
-                    "Payment Received",
-                )
+                apply_summary_change(None, summary_values(payment_obj))
+                ledger_entries.append((DEBIT, payment_obj.paymentAmount, "Payment Received"))
                 logger.info("Payment record added successfully")
+            # the sale and its payment go on the ledger in one append
+            generate_customer_ledger_entries(request, data["customer"], ledger_entries)
             return SuccessResponse("Booking created successfully").to_json_response()
+    except LineItemError as e:
+        logger.error(f"Invalid sale items: {e}")
+        return ErrorResponse(str(e)).to_json_response()
     except Exception as e:
         logger.error(f"Error while creating Booking: {e}")
         return ErrorResponse(
@@ -1950,7 +1846,9 @@ def add_sales_api(request):
         ).to_json_response()
 
 
-class SalesListJson(BaseDatatableView):
+class SalesListJson(ReplicaReadMixin, KeysetPaginationMixin, CountingMixin, BaseDatatableView):
+    count_cache_params = ("startDate", "endDate", "staffID")
+    count_estimate_threshold = LARGE_TABLE_ROWS
     order_columns = [
         "invoiceNumber",
         "saleDate",
@@ -1965,7 +1863,7 @@ class SalesListJson(BaseDatatableView):
 
     def get_initial_queryset(self):
         # if 'Admin' in self.request.user.groups.values_list('name', flat=True):
-        owner_id = get_owner_id(self.request)
+        owner_id = self.request.tenant.owner_id
         try:
             startDateV = self.request.GET.get("startDate")
             endDateV = self.request.GET.get("endDate")
@@ -1973,13 +1871,13 @@ class SalesListJson(BaseDatatableView):
             sDate = datetime.strptime(startDateV, "%d/%m/%Y")
             eDate = datetime.strptime(endDateV, "%d/%m/%Y")
             if staffID == "All":
-                return Sales.objects.select_related().filter(
+                return Sales.objects.select_related("customerID__locationID", "addedByID").filter(
                     isDeleted__exact=False,
                     ownerID_id=owner_id,
                     saleDate__range=[sDate.date(), eDate.date()],
                 )
             else:
-                return Sales.objects.select_related().filter(
+                return Sales.objects.select_related("customerID__locationID", "addedByID").filter(
                     isDeleted__exact=False,
                     ownerID_id=owner_id,
                     saleDate__range=[sDate.date(), eDate.date()],
@@ -1987,7 +1885,7 @@ class SalesListJson(BaseDatatableView):
                 )
 
         except:
-            return Sales.objects.select_related().filter(
+            return Sales.objects.select_related("customerID__locationID", "addedByID").filter(
                 isDeleted__exact=False,
                 ownerID_id=owner_id,
                 saleDate__icontains=datetime.today().date(),
@@ -1996,29 +1894,14 @@ class SalesListJson(BaseDatatableView):
     def filter_queryset(self, qs):
         search = self.request.GET.get("search[value]", None)
         if search:
-            qs = qs.filter(
-                Q(invoiceNumber__icontains=search)
-                | Q(saleDate__icontains=search)
-                | Q(customerID__name__icontains=search)
-                | Q(customerID__locationID__name__icontains=search)
-                | Q(totalAmount__icontains=search)
-                | Q(totalTax__icontains=search)
-                | Q(additionalCharge__icontains=search)
-                | Q(totalAmountAfterTax__icontains=search)
-                | Q(addedByID__name__icontains=search)
-                | Q(dateCreated__icontains=search)
-            )
+            qs = search_filter(qs, search, self.request.tenant.owner_id)
 
         return qs
 
     def prepare_results(self, qs):
         json_data = []
         for item in qs:
-            if (
-                "Owner" in self.request.user.groups.values_list("name", flat=True)
-                or "Manager" in self.request.user.groups.values_list("name", flat=True)
-                or "Admin" in self.request.user.groups.values_list("name", flat=True)
-            ):
+            if self.request.tenant.has_group("Owner", "Manager", "Admin"):
                 action = (
                     """
                 
@@ -2062,7 +1945,7 @@ class SalesListJson(BaseDatatableView):
 @validate_input(["id"])
 @transaction.atomic
 def delete_sales_api(request):
-    owner_id = get_owner_id(request)
+    owner_id = request.tenant.owner_id
     obj_id = request.POST.get("id")
     try:
         try:
@@ -2071,9 +1954,13 @@ def delete_sales_api(request):
             logger.error(f"Sales not found")
             return ErrorResponse("Sales not found", status_code=404).to_json_response()
 
+        before = summary_values(obj)
+        ledger_before = ledger_values(obj)
         # Soft delete
         obj.isDeleted = True
         obj.save()
+        apply_summary_change(before, summary_values(obj))
+        apply_ledger_change(request, ledger_before, ledger_values(obj), f"Sales {obj.invoiceNumber} deleted")
         logger.info("Sales deleted successfully")
         return SuccessResponse("Sales deleted successfully").to_json_response()
 
@@ -2103,8 +1990,11 @@ def update_sales_api(request):
     data = request.POST.dict()
 
     try:
-        owner_id = get_owner_id(request)
+        owner_id = request.tenant.owner_id
+        items = parse_line_items(data["datas"])
         obj = Sales.objects.get(pk=data["id"], ownerID_id=owner_id, isDeleted=False)
+        before = summary_values(obj)
+        ledger_before = ledger_values(obj)
         obj.customerID_id = data["customer"]
         obj.saleDate = datetime.strptime(data["saleDate"], "%d/%m/%Y")
         obj.totalAmount = data["subTotal"]
@@ -2112,34 +2002,15 @@ def update_sales_api(request):
         obj.additionalCharge = data["additionalCharge"]
         obj.totalAmountAfterTax = data["grandTotal"]
         obj.save()
-        obj.invoiceNumber = "S" + str(
-            Sales.objects.filter(ownerID_id=owner_id).count()
-        ).zfill(8)
-        obj.save()
-        splited_receive_item = data["datas"].split("@")
-        old_items = SaleProduct.objects.filter(salesID_id=data["id"])
-        for o in old_items:
-            o.isDeleted = True
-            o.save()
-
-        for item in splited_receive_item[:-1]:
-            item_details = item.split("|")
-
-            p = SaleProduct()
-            p.salesID_id = obj.pk
-            p.productID_id = item_details[0]
-            p.productName = item_details[1]
-            p.quantity = item_details[2]
-            p.unitPrice = item_details[3]
-            p.totalPrice = item_details[4]
-            p.totalAmountAfterTax = item_details[4]
-            p.remark = item_details[5]
-            p.unit = item_details[6]
-            p.ownerID_id = owner_id
-            p.save()
+        apply_summary_change(before, summary_values(obj))
+        apply_ledger_change(request, ledger_before, ledger_values(obj), f"Sales {obj.invoiceNumber} updated")
+        save_line_items(SaleProduct, "salesID_id", obj.pk, owner_id, items, replace=True)
 
         logger.info("Sales updated successfully")
         return SuccessResponse("Sales updated successfully").to_json_response()
+    except LineItemError as e:
+        logger.error(f"Invalid sale items: {e}")
+        return ErrorResponse(str(e)).to_json_response()
     except Exception as e:
         logger.error(f"Error while updated Sales: {e}")
         return ErrorResponse(
@@ -2160,10 +2031,11 @@ def add_expense_api(request):
             expenseAmount=data["amount"],
             expenseDescription=data["description"],
             expenseDate=datetime.today().date(),
-            ownerID_id=get_owner_id(request),
-            staffID_id=get_user_id(request),
+            ownerID_id=request.tenant.owner_id,
+            staffID_id=request.tenant.staff_id,
         )
         obj.save()
+        apply_summary_change(None, summary_values(obj))
         logger.info("Expense added successfully")
         return SuccessResponse("Expense added successfully").to_json_response()
     except Exception as e:
@@ -2173,7 +2045,7 @@ def add_expense_api(request):
         ).to_json_response()
 
 
-class ExpenseListJson(BaseDatatableView):
+class ExpenseListJson(ReplicaReadMixin, BaseDatatableView):
     order_columns = [
         "groupID",
         "expenseAmount",
@@ -2185,7 +2057,7 @@ class ExpenseListJson(BaseDatatableView):
 
     def get_initial_queryset(self):
         # if 'Admin' in self.request.user.groups.values_list('name', flat=True):
-        owner_id = get_owner_id(self.request)
+        owner_id = self.request.tenant.owner_id
         try:
             startDateV = self.request.GET.get("startDate")
             endDateV = self.request.GET.get("endDate")
@@ -2193,13 +2065,13 @@ class ExpenseListJson(BaseDatatableView):
             sDate = datetime.strptime(startDateV, "%d/%m/%Y")
             eDate = datetime.strptime(endDateV, "%d/%m/%Y")
             if staffID == "All":
-                return Expense.objects.select_related().filter(
+                return Expense.objects.select_related("groupID", "staffID").filter(
                     isDeleted__exact=False,
                     ownerID_id=owner_id,
                     expenseDate__range=[sDate.date(), eDate.date()],
                 )
             else:
-                return Expense.objects.select_related().filter(
+                return Expense.objects.select_related("groupID", "staffID").filter(
                     isDeleted__exact=False,
                     ownerID_id=owner_id,
                     expenseDate_range=[sDate.date(), eDate.date()],
@@ -2207,7 +2079,7 @@ class ExpenseListJson(BaseDatatableView):
                 )
 
         except:
-            return Expense.objects.select_related().filter(
+            return Expense.objects.select_related("groupID", "staffID").filter(
                 isDeleted__exact=False,
                 ownerID_id=owner_id,
                 expenseDate__icontains=datetime.today().date(),
@@ -2216,25 +2088,14 @@ class ExpenseListJson(BaseDatatableView):
     def filter_queryset(self, qs):
         search = self.request.GET.get("search[value]", None)
         if search:
-            qs = qs.filter(
-                Q(groupID__name__icontains=search)
-                | Q(expenseAmount__icontains=search)
-                | Q(expenseDescription__icontains=search)
-                | Q(expenseDate__icontains=search)
-                | Q(staffID__name__icontains=search)
-                | Q(dateCreated__icontains=search)
-            )
+            qs = search_filter(qs, search, self.request.tenant.owner_id)
 
         return qs
 
     def prepare_results(self, qs):
         json_data = []
         for item in qs:
-            if (
-                "Owner" in self.request.user.groups.values_list("name", flat=True)
-                or "Manager" in self.request.user.groups.values_list("name", flat=True)
-                or "Admin" in self.request.user.groups.values_list("name", flat=True)
-            ):
+            if self.request.tenant.has_group("Owner", "Manager", "Admin"):
                 action = (
                     """<button data-inverted="" data-tooltip="Edit Detail" data-position="left center" data-variation="mini" style="font-size:10px;" onclick = "GetUserDetails('{}')" class="ui circular facebook icon button green">
                     <i class="pen icon"></i>
@@ -2273,7 +2134,7 @@ def delete_expense_api(request):
     try:
         try:
             obj = Expense.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
         except Expense.DoesNotExist:
             logger.error(f"Expense not found")
@@ -2281,9 +2142,11 @@ def delete_expense_api(request):
                 "Expense not found", status_code=404
             ).to_json_response()
 
+        before = summary_values(obj)
         # Soft delete
         obj.isDeleted = True
         obj.save()
+        apply_summary_change(before, summary_values(obj))
 
         logger.info("Expense deleted successfully")
         return SuccessResponse("Expense deleted successfully").to_json_response()
@@ -2301,7 +2164,7 @@ def get_expense_detail(request):
         # Get single staff user
         try:
             obj = Expense.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
             data = {
                 "id": obj.id,
@@ -2336,7 +2199,7 @@ def update_expense_api(request):
     try:
         try:
             obj = Expense.objects.get(
-                id=data["id"], ownerID_id=get_owner_id(request), isDeleted=False
+                id=data["id"], ownerID_id=request.tenant.owner_id, isDeleted=False
             )
         except Expense.DoesNotExist:
             logger.error(f"Expense  with ID {data['id']}' not found")
@@ -2344,10 +2207,12 @@ def update_expense_api(request):
                 "Expense not found", status_code=404
             ).to_json_response()
 
+        before = summary_values(obj)
         obj.groupID_id = data["expense_type"]
         obj.expenseAmount = data["amount"]
         obj.expenseDescription = data["description"]
         obj.save()
+        apply_summary_change(before, summary_values(obj))
 
         logger.info(f"Expense '{data['id']}' updated successfully")
         return SuccessResponse("Expense updated successfully").to_json_response()
@@ -2373,10 +2238,11 @@ def add_jar_api(request):
             outJar=data["jar_out"],
             remark=data["remark"],
             date=datetime.today().date(),
-            ownerID_id=get_owner_id(request),
-            addedByID_id=get_user_id(request),
+            ownerID_id=request.tenant.owner_id,
+            addedByID_id=request.tenant.staff_id,
         )
         obj.save()
+        apply_summary_change(None, summary_values(obj))
         logger.info("Jar record added successfully")
         return SuccessResponse("Jar record added successfully").to_json_response()
     except Exception as e:
@@ -2386,7 +2252,9 @@ def add_jar_api(request):
         ).to_json_response()
 
 
-class JarListJson(BaseDatatableView):
+class JarListJson(ReplicaReadMixin, KeysetPaginationMixin, CountingMixin, BaseDatatableView):
+    count_cache_params = ("startDate", "endDate", "staffID")
+    count_estimate_threshold = LARGE_TABLE_ROWS
     order_columns = [
         "customerID",
         "inJar",
@@ -2399,7 +2267,7 @@ class JarListJson(BaseDatatableView):
 
     def get_initial_queryset(self):
         # if 'Admin' in self.request.user.groups.values_list('name', flat=True):
-        owner_id = get_owner_id(self.request)
+        owner_id = self.request.tenant.owner_id
         try:
             startDateV = self.request.GET.get("startDate")
             endDateV = self.request.GET.get("endDate")
@@ -2407,13 +2275,13 @@ class JarListJson(BaseDatatableView):
             sDate = datetime.strptime(startDateV, "%d/%m/%Y")
             eDate = datetime.strptime(endDateV, "%d/%m/%Y")
             if staffID == "All":
-                return JarCounter.objects.select_related().filter(
+                return JarCounter.objects.select_related("customerID__locationID", "addedByID").filter(
                     isDeleted__exact=False,
                     ownerID_id=owner_id,
                     date__range=[sDate.date(), eDate.date()],
                 )
             else:
-                return JarCounter.objects.select_related().filter(
+                return JarCounter.objects.select_related("customerID__locationID", "addedByID").filter(
                     isDeleted__exact=False,
                     ownerID_id=owner_id,
                     date__range=[sDate.date(), eDate.date()],
@@ -2421,7 +2289,7 @@ class JarListJson(BaseDatatableView):
                 )
 
         except:
-            return JarCounter.objects.select_related().filter(
+            return JarCounter.objects.select_related("customerID__locationID", "addedByID").filter(
                 isDeleted__exact=False,
                 ownerID_id=owner_id,
                 date__icontains=datetime.today().date(),
@@ -2430,27 +2298,14 @@ class JarListJson(BaseDatatableView):
     def filter_queryset(self, qs):
         search = self.request.GET.get("search[value]", None)
         if search:
-            qs = qs.filter(
-                Q(customerID__name__icontains=search)
-                | Q(addedByID__name__icontains=search)
-                | Q(inJar__icontains=search)
-                | Q(outJar__icontains=search)
-                | Q(date__icontains=search)
-                | Q(remark__icontains=search)
-                | Q(customerID__locationID__name__icontains=search)
-                | Q(dateCreated__icontains=search)
-            )
+            qs = search_filter(qs, search, self.request.tenant.owner_id)
 
         return qs
 
     def prepare_results(self, qs):
         json_data = []
         for item in qs:
-            if (
-                "Owner" in self.request.user.groups.values_list("name", flat=True)
-                or "Manager" in self.request.user.groups.values_list("name", flat=True)
-                or "Admin" in self.request.user.groups.values_list("name", flat=True)
-            ):
+            if self.request.tenant.has_group("Owner", "Manager", "Admin"):
                 action = (
                     """<button data-inverted="" data-tooltip="Edit Detail" data-position="left center" data-variation="mini" style="font-size:10px;" onclick = "GetUserDetails('{}')" class="ui circular facebook icon button green">
                     <i class="pen icon"></i>
@@ -2492,7 +2347,7 @@ def delete_jar_api(request):
     try:
         try:
             obj = JarCounter.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
         except JarCounter.DoesNotExist:
             logger.error(f"Jar entry not found")
@@ -2500,9 +2355,11 @@ def delete_jar_api(request):
                 "Jar entry not found", status_code=404
             ).to_json_response()
 
+        before = summary_values(obj)
         # Soft delete
         obj.isDeleted = True
         obj.save()
+        apply_summary_change(before, summary_values(obj))
 
         logger.info("Jar entry deleted successfully")
         return SuccessResponse("Jar entry deleted successfully").to_json_response()
@@ -2520,7 +2377,7 @@ def get_jar_detail(request):
         # Get single staff user
         try:
             obj = JarCounter.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
             data = {
                 "id": obj.id,
@@ -2556,7 +2413,7 @@ def update_jar_api(request):
     try:
         try:
             obj = JarCounter.objects.get(
-                id=data["id"], ownerID_id=get_owner_id(request), isDeleted=False
+                id=data["id"], ownerID_id=request.tenant.owner_id, isDeleted=False
             )
         except JarCounter.DoesNotExist:
             logger.error(f"Expense  with ID {data['id']}' not found")
@@ -2564,11 +2421,13 @@ def update_jar_api(request):
                 "Expense not found", status_code=404
             ).to_json_response()
 
+        before = summary_values(obj)
         obj.customerID_id = data["customer"]
         obj.inJar = data["jar_in"]
         obj.outJar = data["jar_out"]
         obj.remark = data["remark"]
         obj.save()
+        apply_summary_change(before, summary_values(obj))
 
         logger.info(f"Jar entry '{data['id']}' updated successfully")
         return SuccessResponse("Jar entry updated successfully").to_json_response()
@@ -2588,17 +2447,22 @@ def update_jar_api(request):
 def add_payment_api(request):
     data = request.POST.dict()
     try:
+        # optional, for a payment received on an earlier day
+        payment_date = data.get("paymentDate")
         obj = Payment(
             customerID_id=data["customer"],
             paymentAmount=data["amount"],
             remark=data["remark"],
-            paymentDate=datetime.today().date(),
-            ownerID_id=get_owner_id(request),
-            addedByID_id=get_user_id(request),
+            paymentDate=(
+                datetime.strptime(payment_date, "%d/%m/%Y").date() if payment_date else datetime.today().date()
+            ),
+            ownerID_id=request.tenant.owner_id,
+            addedByID_id=request.tenant.staff_id,
         )
         obj.save()
+        apply_summary_change(None, summary_values(obj))
         generate_customer_ledger(
-            request, data["customer"], "debit", obj.paymentAmount, "Payment Received"
+            request, data["customer"], "debit", obj.paymentAmount, "Payment Received", obj.paymentDate
         )
         logger.info("Payment record added successfully")
         return SuccessResponse("Payment record added successfully").to_json_response()
@@ -2609,7 +2473,9 @@ def add_payment_api(request):
         ).to_json_response()
 
 
-class PaymentListJson(BaseDatatableView):
+class PaymentListJson(ReplicaReadMixin, KeysetPaginationMixin, CountingMixin, BaseDatatableView):
+    count_cache_params = ("startDate", "endDate", "staffID")
+    count_estimate_threshold = LARGE_TABLE_ROWS
     order_columns = [
         "customerID",
         "paymentAmount",
@@ -2623,7 +2489,7 @@ class PaymentListJson(BaseDatatableView):
 
     def get_initial_queryset(self):
         # if 'Admin' in self.request.user.groups.values_list('name', flat=True):
-        owner_id = get_owner_id(self.request)
+        owner_id = self.request.tenant.owner_id
         try:
             startDateV = self.request.GET.get("startDate")
             endDateV = self.request.GET.get("endDate")
@@ -2631,13 +2497,13 @@ class PaymentListJson(BaseDatatableView):
             sDate = datetime.strptime(startDateV, "%d/%m/%Y")
             eDate = datetime.strptime(endDateV, "%d/%m/%Y")
             if staffID == "All":
-                return Payment.objects.select_related().filter(
+                return Payment.objects.select_related("customerID__locationID", "addedByID").filter(
                     isDeleted__exact=False,
                     ownerID_id=owner_id,
                     paymentDate__range=[sDate.date(), eDate.date()],
                 )
             else:
-                return Payment.objects.select_related().filter(
+                return Payment.objects.select_related("customerID__locationID", "addedByID").filter(
                     isDeleted__exact=False,
                     ownerID_id=owner_id,
                     paymentDate_range=[sDate.date(), eDate.date()],
@@ -2645,7 +2511,7 @@ class PaymentListJson(BaseDatatableView):
                 )
 
         except:
-            return Payment.objects.select_related().filter(
+            return Payment.objects.select_related("customerID__locationID", "addedByID").filter(
                 isDeleted__exact=False,
                 ownerID_id=owner_id,
                 paymentDate__icontains=datetime.today().date(),
@@ -2654,25 +2520,14 @@ class PaymentListJson(BaseDatatableView):
     def filter_queryset(self, qs):
         search = self.request.GET.get("search[value]", None)
         if search:
-            qs = qs.filter(
-                Q(customerID__name__icontains=search)
-                | Q(paymentAmount__icontains=search)
-                | Q(paymentDate__icontains=search)
-                | Q(remark__icontains=search)
-                | Q(customerID__locationID__name__icontains=search)
-                | Q(dateCreated__icontains=search)
-            )
+            qs = search_filter(qs, search, self.request.tenant.owner_id)
 
         return qs
 
     def prepare_results(self, qs):
         json_data = []
         for item in qs:
-            if (
-                "Owner" in self.request.user.groups.values_list("name", flat=True)
-                or "Manager" in self.request.user.groups.values_list("name", flat=True)
-                or "Admin" in self.request.user.groups.values_list("name", flat=True)
-            ):
+            if self.request.tenant.has_group("Owner", "Manager", "Admin"):
                 action = (
                     """<button data-inverted="" data-tooltip="Edit Detail" data-position="left center" data-variation="mini" style="font-size:10px;" onclick = "GetUserDetails('{}')" class="ui circular facebook icon button green">
                     <i class="pen icon"></i>
@@ -2715,7 +2570,7 @@ def delete_payment_api(request):
     try:
         try:
             obj = Payment.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
         except Payment.DoesNotExist:
             logger.error(f"Payment entry not found")
@@ -2723,9 +2578,13 @@ def delete_payment_api(request):
                 "Payment entry not found", status_code=404
             ).to_json_response()
 
+        before = summary_values(obj)
+        ledger_before = ledger_values(obj)
         # Soft delete
         obj.isDeleted = True
         obj.save()
+        apply_summary_change(before, summary_values(obj))
+        apply_ledger_change(request, ledger_before, ledger_values(obj), "Payment deleted")
 
         logger.info("Payment entry deleted successfully")
         return SuccessResponse("Payment entry deleted successfully").to_json_response()
@@ -2743,7 +2602,7 @@ def get_payment_detail(request):
         # Get single staff user
         try:
             obj = Payment.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
             data = {
                 "id": obj.id,
@@ -2778,7 +2637,7 @@ def update_payment_api(request):
     try:
         try:
             obj = Payment.objects.get(
-                id=data["id"], ownerID_id=get_owner_id(request), isDeleted=False
+                id=data["id"], ownerID_id=request.tenant.owner_id, isDeleted=False
             )
         except Payment.DoesNotExist:
             logger.error(f"Payment  with ID {data['id']}' not found")
@@ -2786,10 +2645,14 @@ def update_payment_api(request):
                 "Payment not found", status_code=404
             ).to_json_response()
 
+        before = summary_values(obj)
+        ledger_before = ledger_values(obj)
         obj.customerID_id = data["customer"]
         obj.paymentAmount = data["amount"]
         obj.remark = data["remark"]
         obj.save()
+        apply_summary_change(before, summary_values(obj))
+        apply_ledger_change(request, ledger_before, ledger_values(obj), "Payment updated")
 
         logger.info(f"Payment entry '{data['id']}' updated successfully")
         return SuccessResponse("Payment entry updated successfully").to_json_response()
@@ -2802,9 +2665,36 @@ def update_payment_api(request):
 
 
 # Customer ledger
+@require_http_methods(["GET"])
+@validate_input(["customerID", "date"])
+def customer_balance_as_of_api(request):
+    owner_id = request.tenant.owner_id
+    try:
+        as_of = datetime.strptime(request.GET["date"], "%d/%m/%Y").date()
+    except ValueError:
+        return ErrorResponse("Date must be in dd/mm/yyyy format").to_json_response()
+    try:
+        customer = Customer.objects.filter(
+            pk=request.GET["customerID"], ownerID_id=owner_id, isDeleted=False
+        ).values_list("pk", flat=True).first()
+        if customer is None:
+            return ErrorResponse("Customer not found", status_code=404).to_json_response()
+        data = {
+            "customerID": customer,
+            "date": as_of.strftime("%d/%m/%Y"),
+            "balance": balance_as_of(owner_id, customer, as_of),
+        }
+        return SuccessResponse("Balance fetched successfully", data=data).to_json_response()
+    except Exception as e:
+        logger.error(f"Error while fetching balance as of date: {e}")
+        return ErrorResponse(
+            "Unable to fetch balance. Please try again", status_code=500
+        ).to_json_response()
 
 
-class CustomerLedgerListJson(BaseDatatableView):
+class CustomerLedgerListJson(ReplicaReadMixin, KeysetPaginationMixin, CountingMixin, BaseDatatableView):
+    count_cache_params = ("customer_id", "customerID", "startDate", "endDate")
+    count_estimate_threshold = LARGE_TABLE_ROWS
     order_columns = [
         "addedDate",
         "isCredit",
@@ -2817,20 +2707,20 @@ class CustomerLedgerListJson(BaseDatatableView):
     ]
 
     def get_initial_queryset(self):
-        owner_id = get_owner_id(self.request)
+        owner_id = self.request.tenant.owner_id
         customer_id = self.request.GET.get("customer_id") or self.request.GET.get(
             "customerID"
         )
 
         # Base queryset with customer filter if provided
         if customer_id:
-            qs = CustomerLedger.objects.select_related().filter(
+            qs = CustomerLedger.objects.select_related("addedByID").filter(
                 isDeleted__exact=False,
                 ownerID_id=owner_id,
                 customerID_id=int(customer_id),
             )
         else:
-            qs = CustomerLedger.objects.select_related().filter(
+            qs = CustomerLedger.objects.select_related("addedByID").filter(
                 isDeleted__exact=False, ownerID_id=owner_id
             )
 
@@ -2850,12 +2740,7 @@ class CustomerLedgerListJson(BaseDatatableView):
     def filter_queryset(self, qs):
         search = self.request.GET.get("search[value]", None)
         if search:
-            qs = qs.filter(
-                Q(remark__icontains=search)
-                | Q(credit__icontains=search)
-                | Q(debit__icontains=search)
-                | Q(dateCreated__icontains=search)
-            )
+            qs = search_filter(qs, search, self.request.tenant.owner_id)
 
         return qs
 
@@ -2903,7 +2788,7 @@ class CustomerLedgerListJson(BaseDatatableView):
 # booking api urls
 
 
-class BookingListJson(BaseDatatableView):
+class BookingListJson(ReplicaReadMixin, BaseDatatableView):
     order_columns = [
         "invoiceNumber",
         "expectedDeliveryDate",
@@ -2918,7 +2803,7 @@ class BookingListJson(BaseDatatableView):
 
     def get_initial_queryset(self):
         # if 'Admin' in self.request.user.groups.values_list('name', flat=True):
-        owner_id = get_owner_id(self.request)
+        owner_id = self.request.tenant.owner_id
         try:
             startDateV = self.request.GET.get("startDate")
             endDateV = self.request.GET.get("endDate")
@@ -2926,13 +2811,13 @@ class BookingListJson(BaseDatatableView):
             sDate = datetime.strptime(startDateV, "%d/%m/%Y")
             eDate = datetime.strptime(endDateV, "%d/%m/%Y")
             if staffID == "All":
-                return AdvanceOrder.objects.select_related().filter(
+                return AdvanceOrder.objects.select_related("customerID__locationID", "addedByID").filter(
                     isDeleted__exact=False,
                     ownerID_id=owner_id,
                     expectedDeliveryDate__range=[sDate.date(), eDate.date()],
                 )
             else:
-                return AdvanceOrder.objects.select_related().filter(
+                return AdvanceOrder.objects.select_related("customerID__locationID", "addedByID").filter(
                     isDeleted__exact=False,
                     ownerID_id=owner_id,
                     expectedDeliveryDate__range=[sDate.date(), eDate.date()],
@@ -2940,7 +2825,7 @@ class BookingListJson(BaseDatatableView):
                 )
 
         except:
-            return AdvanceOrder.objects.select_related().filter(
+            return AdvanceOrder.objects.select_related("customerID__locationID", "addedByID").filter(
                 isDeleted__exact=False,
                 ownerID_id=owner_id,
                 expectedDeliveryDate__icontains=datetime.today().date(),
@@ -2949,29 +2834,14 @@ class BookingListJson(BaseDatatableView):
     def filter_queryset(self, qs):
         search = self.request.GET.get("search[value]", None)
         if search:
-            qs = qs.filter(
-                Q(invoiceNumber__icontains=search)
-                | Q(expetedDeliveryDate__icontains=search)
-                | Q(customerID__name__icontains=search)
-                | Q(customerID__locationID__name__icontains=search)
-                | Q(totalAmount__icontains=search)
-                | Q(totalTax__icontains=search)
-                | Q(additionalCharge__icontains=search)
-                | Q(totalAmountAfterTax__icontains=search)
-                | Q(addedByID__name__icontains=search)
-                | Q(dateCreated__icontains=search)
-            )
+            qs = search_filter(qs, search, self.request.tenant.owner_id)
 
         return qs
 
     def prepare_results(self, qs):
         json_data = []
         for item in qs:
-            if (
-                "Owner" in self.request.user.groups.values_list("name", flat=True)
-                or "Manager" in self.request.user.groups.values_list("name", flat=True)
-                or "Admin" in self.request.user.groups.values_list("name", flat=True)
-            ):
+            if self.request.tenant.has_group("Owner", "Manager", "Admin"):
                 action = (
                     """
                 
@@ -3015,7 +2885,7 @@ class BookingListJson(BaseDatatableView):
 @validate_input(["id"])
 @transaction.atomic
 def delete_booking_api(request):
-    owner_id = get_owner_id(request)
+    owner_id = request.tenant.owner_id
     obj_id = request.POST.get("id")
     try:
         try:
@@ -3028,9 +2898,11 @@ def delete_booking_api(request):
                 "Booking not found", status_code=404
             ).to_json_response()
 
+        ledger_before = ledger_values(obj)
         # Soft delete
         obj.isDeleted = True
         obj.save()
+        apply_ledger_change(request, ledger_before, ledger_values(obj), f"Booking {obj.invoiceNumber} deleted")
         logger.info("Booking deleted successfully")
         return SuccessResponse("Booking deleted successfully").to_json_response()
 
@@ -3060,10 +2932,12 @@ def update_booking_api(request):
     data = request.POST.dict()
 
     try:
-        owner_id = get_owner_id(request)
+        owner_id = request.tenant.owner_id
+        items = parse_line_items(data["datas"])
         obj = AdvanceOrder.objects.get(
             pk=data["id"], ownerID_id=owner_id, isDeleted=False
         )
+        ledger_before = ledger_values(obj)
         obj.customerID_id = data["customer"]
         obj.expectedDeliveryDate = datetime.strptime(data["saleDate"], "%d/%m/%Y")
         obj.totalAmount = data["subTotal"]
@@ -3071,32 +2945,14 @@ def update_booking_api(request):
         obj.additionalCharge = data["additionalCharge"]
         obj.totalAmountAfterTax = data["grandTotal"]
         obj.save()
-        # obj.invoiceNumber = "B"+str(AdvanceOrder.objects.filter(ownerID_id=owner_id).count()).zfill(8)
-        # obj.save()
-        splited_receive_item = data["datas"].split("@")
-        old_items = AdvanceOrderProduct.objects.filter(orderID_id=data["id"])
-        for o in old_items:
-            o.isDeleted = True
-            o.save()
-
-        for item in splited_receive_item[:-1]:
-            item_details = item.split("|")
-
-            p = AdvanceOrderProduct()
-            p.orderID_id = obj.pk
-            p.productID_id = item_details[0]
-            p.productName = item_details[1]
-            p.quantity = item_details[2]
-            p.unitPrice = item_details[3]
-            p.totalPrice = item_details[4]
-            p.totalAmountAfterTax = item_details[4]
-            p.remark = item_details[5]
-            p.unit = item_details[6]
-            p.ownerID_id = owner_id
-            p.save()
+        apply_ledger_change(request, ledger_before, ledger_values(obj), f"Booking {obj.invoiceNumber} updated")
+        save_line_items(AdvanceOrderProduct, "orderID_id", obj.pk, owner_id, items, replace=True)
 
         logger.info("Booking updated successfully")
         return SuccessResponse("Booking updated successfully").to_json_response()
+    except LineItemError as e:
+        logger.error(f"Invalid booking items: {e}")
+        return ErrorResponse(str(e)).to_json_response()
     except Exception as e:
         logger.error(f"Error while updated Booking: {e}")
         return ErrorResponse(
@@ -3118,8 +2974,8 @@ def add_jar_allocation_api(request):
             outJar=data["jar_out"],
             remark=data["remark"],
             date=datetime.today().date(),
-            ownerID_id=get_owner_id(request),
-            addedByID_id=get_user_id(request),
+            ownerID_id=request.tenant.owner_id,
+            addedByID_id=request.tenant.staff_id,
         )
         obj.save()
         logger.info("Jar Allocation record added successfully")
@@ -3133,7 +2989,7 @@ def add_jar_allocation_api(request):
         ).to_json_response()
 
 
-class JarAllocationListJson(BaseDatatableView):
+class JarAllocationListJson(ReplicaReadMixin, BaseDatatableView):
     order_columns = [
         "driverID",
         "inJar",
@@ -3146,7 +3002,7 @@ class JarAllocationListJson(BaseDatatableView):
 
     def get_initial_queryset(self):
         # if 'Admin' in self.request.user.groups.values_list('name', flat=True):
-        owner_id = get_owner_id(self.request)
+        owner_id = self.request.tenant.owner_id
         try:
             startDateV = self.request.GET.get("startDate")
             endDateV = self.request.GET.get("endDate")
@@ -3154,13 +3010,13 @@ class JarAllocationListJson(BaseDatatableView):
             sDate = datetime.strptime(startDateV, "%d/%m/%Y")
             eDate = datetime.strptime(endDateV, "%d/%m/%Y")
             if staffID == "All":
-                return JarAllocation.objects.select_related().filter(
+                return JarAllocation.objects.select_related("driverID", "addedByID").filter(
                     isDeleted__exact=False,
                     ownerID_id=owner_id,
                     date__range=[sDate.date(), eDate.date()],
                 )
             else:
-                return JarAllocation.objects.select_related().filter(
+                return JarAllocation.objects.select_related("driverID", "addedByID").filter(
                     isDeleted__exact=False,
                     ownerID_id=owner_id,
                     date__range=[sDate.date(), eDate.date()],
@@ -3168,7 +3024,7 @@ class JarAllocationListJson(BaseDatatableView):
                 )
 
         except:
-            return JarAllocation.objects.select_related().filter(
+            return JarAllocation.objects.select_related("driverID", "addedByID").filter(
                 isDeleted__exact=False,
                 ownerID_id=owner_id,
                 date__icontains=datetime.today().date(),
@@ -3177,27 +3033,14 @@ class JarAllocationListJson(BaseDatatableView):
     def filter_queryset(self, qs):
         search = self.request.GET.get("search[value]", None)
         if search:
-            qs = qs.filter(
-                Q(driverID__name__icontains=search)
-                | Q(addedByID__name__icontains=search)
-                | Q(inJar__icontains=search)
-                | Q(outJar__icontains=search)
-                | Q(date__icontains=search)
-                | Q(remark__icontains=search)
-                # | Q(customerID__locationID__name__icontains=search)
-                | Q(dateCreated__icontains=search)
-            )
+            qs = search_filter(qs, search, self.request.tenant.owner_id)
 
         return qs
 
     def prepare_results(self, qs):
         json_data = []
         for item in qs:
-            if (
-                "Owner" in self.request.user.groups.values_list("name", flat=True)
-                or "Manager" in self.request.user.groups.values_list("name", flat=True)
-                or "Admin" in self.request.user.groups.values_list("name", flat=True)
-            ):
+            if self.request.tenant.has_group("Owner", "Manager", "Admin"):
                 action = (
                     """<button data-inverted="" data-tooltip="Edit Detail" data-position="left center" data-variation="mini" style="font-size:10px;" onclick = "GetUserDetails('{}')" class="ui circular facebook icon button green">
                     <i class="pen icon"></i>
@@ -3237,7 +3080,7 @@ def delete_jar_allocation_api(request):
     try:
         try:
             obj = JarAllocation.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
         except JarAllocation.DoesNotExist:
             logger.error(f"Jar allocation entry not found")
@@ -3267,7 +3110,7 @@ def get_jar_allocation_detail(request):
         # Get single staff user
         try:
             obj = JarAllocation.objects.get(
-                id=obj_id, isDeleted=False, ownerID_id=get_owner_id(request)
+                id=obj_id, isDeleted=False, ownerID_id=request.tenant.owner_id
             )
             data = {
                 "id": obj.id,
@@ -3303,7 +3146,7 @@ def update_jar_allocation_api(request):
     try:
         try:
             obj = JarAllocation.objects.get(
-                id=data["id"], ownerID_id=get_owner_id(request), isDeleted=False
+                id=data["id"], ownerID_id=request.tenant.owner_id, isDeleted=False
             )
         except JarAllocation.DoesNotExist:
             logger.error(f"Jar allocation entry with ID {data['id']}' not found")
@@ -3329,7 +3172,7 @@ def update_jar_allocation_api(request):
         ).to_json_response()
 
 
-class DriverWiseJarAllocationListJson(BaseDatatableView):
+class DriverWiseJarAllocationListJson(ReplicaReadMixin, BaseDatatableView):
     order_columns = [
         "driverID",
         "inJar",
@@ -3342,54 +3185,37 @@ class DriverWiseJarAllocationListJson(BaseDatatableView):
 
     def get_initial_queryset(self):
         # if 'Admin' in self.request.user.groups.values_list('name', flat=True):
-        owner_id = get_owner_id(self.request)
+        owner_id = self.request.tenant.owner_id
         try:
             startDateV = self.request.GET.get("startDate")
             endDateV = self.request.GET.get("endDate")
             sDate = datetime.strptime(startDateV, "%d/%m/%Y")
             eDate = datetime.strptime(endDateV, "%d/%m/%Y")
-            return JarAllocation.objects.select_related().filter(
+            return JarAllocation.objects.select_related("driverID", "addedByID").filter(
                 isDeleted__exact=False,
                 ownerID_id=owner_id,
                 date__range=[sDate.date(), eDate.date()],
-                driverID_id=StaffUser.objects.get(
-                    userID_id=self.request.user.id, ownerID_id=owner_id
-                ).id,
+                driverID_id=self.request.tenant.staff_id,
             )
         except:
-            return JarAllocation.objects.select_related().filter(
+            return JarAllocation.objects.select_related("driverID", "addedByID").filter(
                 isDeleted__exact=False,
                 ownerID_id=owner_id,
                 date=datetime.now().date(),
-                driverID_id=StaffUser.objects.get(
-                    userID_id=self.request.user.id, ownerID_id=owner_id
-                ).id,
+                driverID_id=self.request.tenant.staff_id,
             )
 
     def filter_queryset(self, qs):
         search = self.request.GET.get("search[value]", None)
         if search:
-            qs = qs.filter(
-                Q(driverID__name__icontains=search)
-                | Q(addedByID__name__icontains=search)
-                | Q(inJar__icontains=search)
-                | Q(outJar__icontains=search)
-                | Q(date__icontains=search)
-                | Q(remark__icontains=search)
-                # | Q(customerID__locationID__name__icontains=search)
-                | Q(dateCreated__icontains=search)
-            )
+            qs = search_filter(qs, search, self.request.tenant.owner_id)
 
         return qs
 
     def prepare_results(self, qs):
         json_data = []
         for item in qs:
-            if (
-                "Owner" in self.request.user.groups.values_list("name", flat=True)
-                or "Manager" in self.request.user.groups.values_list("name", flat=True)
-                or "Admin" in self.request.user.groups.values_list("name", flat=True)
-            ):
+            if self.request.tenant.has_group("Owner", "Manager", "Admin"):
                 action = (
                     """<button data-inverted="" data-tooltip="Edit Detail" data-position="left center" data-variation="mini" style="font-size:10px;" onclick = "GetUserDetails('{}')" class="ui circular facebook icon button green">
                     <i class="pen icon"></i>
@@ -3419,95 +3245,36 @@ class DriverWiseJarAllocationListJson(BaseDatatableView):
 
         return json_data
 
-import csv
-from pathlib import Path
 @csrf_exempt
-@require_http_methods(["GET"])
-@transaction.atomic
+@require_http_methods(["POST"])
+@validate_input(["file"])
 def upload_customer_csv_api(request):
+    upload = request.input_data["file"]
+    owner_id = request.tenant.owner_id
+    # chunks commit on their own, so the page can poll progress while the file is read
+    importer = CustomerImport(owner_id, request.tenant.staff_id, import_id=request.input_data.get("importID"))
     try:
-        owner_id = get_owner_id(request)
-
-        # -------- READ CSV FROM PROJECT DIRECTORY --------
-        BASE_DIR = Path(__file__).resolve().parent.parent
-        print(BASE_DIR)
-        csv_path = BASE_DIR / "api/c.csv"
-
-        if not csv_path.exists():
-            return ErrorResponse(
-                "customers.csv not found in project directory"
-            ).to_json_response()
-
-        created_count = 0
-        skipped_duplicates = 0
-
-        with open(csv_path, "r", encoding="utf-8", newline="") as f:
-            reader = csv.DictReader(f)
-
-            # -------- REQUIRED COLUMN CHECK --------
-            required_columns = {"Name", "Location", "Address"}
-            if not required_columns.issubset(reader.fieldnames):
-                return ErrorResponse(
-                    "CSV must contain name, location, address columns"
-                ).to_json_response()
-
-            for row in reader:
-                name = row.get("Name", "").strip()
-                location_name = row.get("Location", "").strip()
-                address = row.get("Address", "").strip()
-
-                if not name or not location_name or not address:
-                    continue
-
-                # -------- LOCATION GET / CREATE --------
-                location, _ = Location.objects.get_or_create(
-                    name__iexact=location_name,
-                    ownerID_id=owner_id,
-                    defaults={
-                        "name": location_name,
-                        "ownerID_id": owner_id,
-                        "isDeleted": False,
-                    }
-                )
-
-                # -------- DUPLICATE CUSTOMER CHECK --------
-                if Customer.objects.filter(
-                    name__iexact=name,
-                    address__iexact=address,
-                    locationID=location,
-                    ownerID_id=owner_id,
-                ).exists():
-                    skipped_duplicates += 1
-                    continue
-
-                # -------- CUSTOMER CREATE --------
-                c_obj = Customer.objects.create(
-                    name=name,
-                    address=address,
-                    locationID=location,
-                    ownerID_id=owner_id,
-                    addedDate=datetime.now(),
-                )
-                customer_count = (
-                    Customer.objects.select_related()
-                    .filter(ownerID_id=get_owner_id(request))
-                    .count()
-                )
-                c_obj.customerId = "CID" + str(customer_count).zfill(8)
-                c_obj.save()
-
-                created_count += 1
-
-        cache.delete(f"CustomerList{owner_id}")
-
-        return SuccessResponse(
-            f"{created_count} customers added, {skipped_duplicates} duplicates skipped"
-        ).to_json_response()
-
+        result = importer.run(upload.file, total_bytes=upload.size)
+    except CustomerImportError as e:
+        logger.error(f"Customer CSV upload rejected: {e}")
+        return ErrorResponse(str(e)).to_json_response()
     except Exception as e:
-        logger.info(f"Error in upload_customer_csv_api: {e}")   
-        logger.exception("Customer CSV upload failed")
+        logger.exception(f"Customer CSV upload failed: {e}")
         return ErrorResponse(
-            "Failed to upload CSV. Please verify file format."
+            f"Failed to upload CSV after {importer.created} customers were added. Please verify file format."
         ).to_json_response()
+    return SuccessResponse(
+        f"{result['created']} customers added, {result['duplicates']} duplicates skipped, "
+        f"{result['errorCount']} rows with errors",
+        data=result,
+    ).to_json_response()
+
+
+@require_http_methods(["GET"])
+@validate_input(["importID"])
+def customer_import_progress_api(request):
+    progress = cache.get(import_progress_key(request.tenant.owner_id, request.input_data["importID"]))
+    if progress is None:
+        return ErrorResponse("Import not started yet", status_code=404).to_json_response()
+    return SuccessResponse("Import progress", data=progress).to_json_response()
     
\ No newline at end of file
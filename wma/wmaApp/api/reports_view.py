@@ -1,251 +1,124 @@
+import os
+from datetime import datetime
 
-from tkinter.constants import E
-from django.db.models.functions import Exp, Coalesce
-from django.http import HttpResponse
-from django.template.loader import render_to_string
+from django.http import FileResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
-from weasyprint import HTML, CSS
-from datetime import datetime, timedelta
-from wmaApp.models import Sales, Location, JarCounter, Expense, Payment, Customer
-from wmaApp.api.api_view import get_owner_id
-from django.db.models import Sum, OuterRef, Subquery, FloatField, Value, F, Q
-from utils.logger import logger
-from utils.custom_response import ErrorResponse
-
-@csrf_exempt
-def download_report_pdf(request):
-    cDate = request.POST.get('startDate')
-    eDate = request.POST.get('endDate')
-    location = request.POST.get('location')
-    reportType = request.POST.get('reportType')
-    owner_id = get_owner_id(request)
-    startDate = datetime.strptime(cDate, '%d/%m/%Y')
-    endDate = datetime.strptime(eDate, '%d/%m/%Y')
-
-    match reportType:
-        case 'Sales':
-            return generate_sales_report_pdf(request, startDate, endDate, location, owner_id)
-        case 'Jar':
-            return generate_jar_report_pdf(request, startDate, endDate, location, owner_id)
-        case 'Expense':
-            return generate_expense_report_pdf(request, startDate, endDate, location, owner_id)  
-        case 'Collection':
-            return generate_collection_report_pdf(request, startDate, endDate, location, owner_id)
-        case 'CustomerSummary':
-            return get_daywise_customer_summary(request, startDate, owner_id, location)
-
-
-
-def generate_sales_report_pdf(request, startDate, endDate, location, owner_id):
-    logger.info("Generating sales report pdf for owner_id: %s", owner_id)
-    if location == 'All':
-        col = Sales.objects.select_related().filter(saleDate__range=(
-            startDate.date(), endDate.date() + timedelta(days=1)),
-            isDeleted__exact=False, ownerID_id=owner_id).order_by('addedByID__name')
-    else:
-        col = Sales.objects.select_related().filter(saleDate__range=(
-            startDate.date(), endDate.date() + timedelta(days=1)),
-            isDeleted__exact=False, customerID__locationID_id=int(location), ownerID_id=owner_id).order_by('addedByID__name')
-    total = col.aggregate(Sum('totalAmountAfterTax'))
-    totalAmountAfterTax = total['totalAmountAfterTax__sum'] or 0
-    context = {
-        'startDate': startDate,
-        'endDate': endDate,
-        'col': col,
-        'location': 'All' if location == 'All' else Location.objects.get(id=location, ownerID_id=owner_id).name,
-        'total': totalAmountAfterTax,
-    }
-
-    response = HttpResponse(content_type="application/pdf")
-    response['Content-Disposition'] = "report.pdf"
-    html = render_to_string("wmaApp/reports/salesPDF.html", context)
-
-    HTML(string=html).write_pdf(response, stylesheets=[CSS(string='@page { size: A5; margin: .3cm ; }')])
-    return response
-
-def generate_jar_report_pdf(request, startDate, endDate, location, owner_id):
-    logger.info("Generating jar report pdf for owner_id: %s", owner_id)
-    if location == 'All':
-        col = JarCounter.objects.select_related().filter(date__range=(
-            startDate.date(), endDate.date() + timedelta(days=1)),
-            isDeleted__exact=False, ownerID_id=owner_id).order_by('addedByID__name')
-    else:
-        col = JarCounter.objects.select_related().filter(date__range=(
-            startDate.date(), endDate.date() + timedelta(days=1)),
-            isDeleted__exact=False, customerID__locationID_id=int(location), ownerID_id=owner_id).order_by('addedByID__name')
-    in_total = col.aggregate(Sum('inJar'))
-    inJar = in_total['inJar__sum'] or 0
-    out_total = col.aggregate(Sum('outJar'))
-    outJar = out_total['outJar__sum'] or 0
-    context = {
-        'startDate': startDate,
-        'endDate': endDate,
-        'col': col,
-        'location': 'All' if location == 'All' else Location.objects.get(id=location, ownerID_id=owner_id).name,
-        'inJar': inJar,
-        'outJar': outJar,
-    }
+from django.views.decorators.http import require_http_methods
 
-    response = HttpResponse(content_type="application/pdf")
-    response['Content-Disposition'] = "report.pdf"
-    html = render_to_string("wmaApp/reports/jarPDF.html", context)
-
-    HTML(string=html).write_pdf(response, stylesheets=[CSS(string='@page { size: A5; margin: .3cm ; }')])
-    return response    
-
-def generate_expense_report_pdf(request, startDate, endDate, location, owner_id):
-    logger.info("Generating expense report pdf for owner_id: %s", owner_id)
-    if location == 'All':
-        col = Expense.objects.select_related().filter(expenseDate__range=(
-            startDate.date(), endDate.date() + timedelta(days=1)),
-            isDeleted__exact=False, ownerID_id=owner_id).order_by('-id')
-    else:
-        col = Expense.objects.select_related().filter(expenseDate__range=(
-            startDate.date(), endDate.date() + timedelta(days=1)),
-            isDeleted__exact=False, staffID__locationID_id=int(location), ownerID_id=owner_id).order_by('-id')
-    total = col.aggregate(Sum('expenseAmount'))
-    expenseAmount = total['expenseAmount__sum'] or 0
-    context = {
-        'startDate': startDate,
-        'endDate': endDate,
-        'col': col,
-        'location': 'All' if location == 'All' else Location.objects.get(id=location, ownerID_id=owner_id).name,
-        'total': expenseAmount,
+from utils.custom_response import SuccessResponse, ErrorResponse
+from utils.db_router import read_from_replica, replica_reads
+from utils.json_validator import validate_input
+from utils.logger import logger
+from utils.report_export import EXPORT_FORMATS, STREAMERS, export_rows
+from utils.report_jobs import DONE, queue_report
+from utils.report_engine import REPORTS, report_context
+from wmaApp.models import ReportJob
+
+
+def report_job_data(job):
+    data = {
+        "jobID": job.pk,
+        "status": job.status,
+        "reportType": job.reportType,
+        "error": job.error,
     }
+    if job.status == DONE:
+        data["downloadUrl"] = reverse("wma_api:download_report_pdf") + f"?id={job.pk}"
+    return data
+
+
+def parse_report_request(data):
+    """(reportType, startDate, endDate, location) of a report form, or an error message."""
+    reportType = data["reportType"]
+    location = data["location"]
+    if reportType not in REPORTS:
+        return "Invalid report type"
+    if location != "All" and not location.isdigit():
+        return "Invalid location"
+    try:
+        startDate = datetime.strptime(data["startDate"], '%d/%m/%Y').date()
+        endDate = datetime.strptime(data["endDate"], '%d/%m/%Y').date()
+    except ValueError:
+        return "Invalid date"
+    return reportType, startDate, endDate, location
 
-    response = HttpResponse(content_type="application/pdf")
-    response['Content-Disposition'] = "report.pdf"
-    html = render_to_string("wmaApp/reports/expensePDF.html", context)
 
-    HTML(string=html).write_pdf(response, stylesheets=[CSS(string='@page { size: A5; margin: .3cm ; }')])
+@csrf_exempt
+@require_http_methods(["POST"])
+@validate_input(["startDate", "endDate", "location", "reportType"])
+def queue_report_pdf(request):
+    parsed = parse_report_request(request.input_data)
+    if isinstance(parsed, str):
+        return ErrorResponse(parsed).to_json_response()
+    reportType, startDate, endDate, location = parsed
+
+    job = queue_report(request.tenant.owner_id, request.user.pk, reportType, startDate, endDate, location)
+    logger.info(f"Report job {job.pk} ({reportType}) queued with status {job.status}")
+    return SuccessResponse("Report queued", data=report_job_data(job)).to_json_response()
+
+
+@require_http_methods(["GET"])
+@validate_input(["id"])
+def report_job_status(request):
+    job = ReportJob.objects.filter(pk=request.GET.get("id"), ownerID_id=request.tenant.owner_id).first()
+    if job is None:
+        return ErrorResponse("Report job not found", status_code=404).to_json_response()
+    return SuccessResponse("Report job status", data=report_job_data(job)).to_json_response()
+
+
+@require_http_methods(["GET"])
+@validate_input(["id"])
+def download_report_pdf(request):
+    job = ReportJob.objects.filter(
+        pk=request.GET.get("id"), ownerID_id=request.tenant.owner_id, status=DONE
+    ).first()
+    if job is None or not os.path.exists(job.filePath):
+        return ErrorResponse("Report is not available, please generate it again", status_code=404).to_json_response()
+    filename = f"{job.reportType}-{job.startDate:%d-%m-%Y}-{job.endDate:%d-%m-%Y}-report.pdf"
+    return FileResponse(open(job.filePath, "rb"), as_attachment=True, filename=filename, content_type="application/pdf")
+
+
+def _read_from_replica(request, rows):
+    # the rows are read while the response is streamed, after the view has returned
+    with read_from_replica(request):
+        yield from rows
+
+
+@require_http_methods(["GET"])
+@validate_input(["startDate", "endDate", "location", "reportType", "format"])
+def export_report(request):
+    """The rows of a report as a CSV or XLSX download, streamed while they are read."""
+    parsed = parse_report_request(request.input_data)
+    if isinstance(parsed, str):
+        return ErrorResponse(parsed).to_json_response()
+    reportType, startDate, endDate, location = parsed
+    export_format = request.input_data["format"]
+    if export_format not in EXPORT_FORMATS:
+        return ErrorResponse("Invalid export format").to_json_response()
+
+    rows = _read_from_replica(request, export_rows(reportType, startDate, endDate, location, request.tenant.owner_id))
+    response = StreamingHttpResponse(STREAMERS[export_format](rows), content_type=EXPORT_FORMATS[export_format])
+    filename = f"{reportType}-{startDate:%d-%m-%Y}-{endDate:%d-%m-%Y}-report.{export_format}"
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    logger.info(f"{reportType} report export ({export_format}) started")
     return response
 
 
-
-def generate_collection_report_pdf(request, startDate, endDate, location, owner_id):
-    logger.info("Generating collection report pdf for owner_id: %s", owner_id)
-    if location == 'All':
-        col = Payment.objects.select_related().filter(paymentDate__range=(
-            startDate.date(), endDate.date() + timedelta(days=1)),
-            isDeleted__exact=False, ownerID_id=owner_id).order_by('-id')
-    else:
-        col = Payment.objects.select_related().filter(paymentDate__range=(
-            startDate.date(), endDate.date() + timedelta(days=1)),
-            isDeleted__exact=False, customerID__locationID_id=int(location), ownerID_id=owner_id).order_by('-id')
-    total = col.aggregate(Sum('paymentAmount'))
-    paymentAmount = total['paymentAmount__sum'] or 0
-    context = {
-        'startDate': startDate,
-        'endDate': endDate,
-        'col': col,
-        'location': 'All' if location == 'All' else Location.objects.get(id=location, ownerID_id=owner_id).name,
-        'total': paymentAmount,
+@require_http_methods(["GET"])
+@validate_input(["startDate", "endDate", "location", "reportType"])
+@replica_reads
+def report_json(request):
+    """The rows and totals of a report as JSON."""
+    parsed = parse_report_request(request.input_data)
+    if isinstance(parsed, str):
+        return ErrorResponse(parsed).to_json_response()
+    reportType, startDate, endDate, location = parsed
+    context = report_context(reportType, startDate, endDate, location, request.tenant.owner_id)
+    data = {
+        "columns": [{"key": column.key, "header": column.header} for column in REPORTS[reportType].columns],
+        "rows": context["col"],
+        "totals": context["totals"],
+        "location": context["location"],
     }
-
-    response = HttpResponse(content_type="application/pdf")
-    response['Content-Disposition'] = "report.pdf"
-    html = render_to_string("wmaApp/reports/collectionPDF.html", context)
-
-    HTML(string=html).write_pdf(response, stylesheets=[CSS(string='@page { size: A5; margin: .3cm ; }')])
-    return response
-
-def get_daywise_customer_summary(request, report_date, owner_id, location):
-    """
-    Returns queryset with:
-    - customer name
-    - location
-    - sales amount (for the day)
-    - payment amount (for the day)
-    - due (sales - payment)
-    Only customers with sales or payments on that day are included.
-    """
-    logger.info("Generating daywise customer summary for owner_id: %s", owner_id)
-
-    # ---- Sales total per customer for the day ----
-    try:
-        if location == "All":
-            sales_day_subquery = Sales.objects.filter(
-                isDeleted=False,
-                ownerID=owner_id,
-                customerID=OuterRef("pk"),
-                saleDate=report_date
-                ).values("customerID").annotate(
-                    day_sales=Sum("totalAmountAfterTax")
-                ).values("day_sales")[:1]
-
-        # ---- Payment total per customer for the day ----
-            payment_day_subquery = Payment.objects.filter(
-            isDeleted=False,
-            ownerID=owner_id,
-            customerID=OuterRef("pk"),
-            paymentDate=report_date,
-            ).values("customerID").annotate(
-                day_payment=Sum("paymentAmount")
-            ).values("day_payment")[:1]
-        else:
-            sales_day_subquery = Sales.objects.filter(
-                isDeleted=False,
-                ownerID=owner_id,
-                customerID=OuterRef("pk"),
-                saleDate=report_date,
-                customerID__locationID_id=int(location)
-                ).values("customerID").annotate(
-                    day_sales=Sum("totalAmountAfterTax")
-                ).values("day_sales")[:1]
-
-        # ---- Payment total per customer for the day ----
-            payment_day_subquery = Payment.objects.filter(
-            isDeleted=False,
-            ownerID=owner_id,
-            customerID=OuterRef("pk"),
-            paymentDate=report_date,
-            customerID__locationID_id=int(location)
-            ).values("customerID").annotate(
-                day_payment=Sum("paymentAmount")
-            ).values("day_payment")[:1]
-
-
-        # ---- Main queryset ----
-        qs = Customer.objects.filter(
-            isDeleted=False,
-            ownerID_id=owner_id
-        ).annotate(
-            sales_amount=Coalesce(
-                Subquery(sales_day_subquery, output_field=FloatField()),
-                Value(0.0)
-            ),
-            payment_amount=Coalesce(
-                Subquery(payment_day_subquery, output_field=FloatField()),
-                Value(0.0)
-            ),
-            due_amount=F("sales_amount") - F("payment_amount")
-        ).filter(
-            Q(sales_amount__gt=0) | Q(payment_amount__gt=0)
-        ).select_related("locationID")
-        context ={
-            'startDate': report_date,
-            'endDate': report_date,
-            'col': qs,
-            'location': 'All' if location == 'All' else Location.objects.get(id=location, ownerID_id=owner_id).name,
-
-        }
-        sales_total = qs.aggregate(Sum('sales_amount'))
-        context['sales_total'] = sales_total['sales_amount__sum'] or 0
-        payment_total = qs.aggregate(Sum('payment_amount'))
-        context['payment_total'] = payment_total['payment_amount__sum'] or 0
-        due_total = qs.aggregate(Sum('due_amount'))
-        context['due_total'] = due_total['due_amount__sum'] or 0
-
-        response = HttpResponse(content_type="application/pdf")
-        response['Content-Disposition'] = "report.pdf"
-        html = render_to_string("wmaApp/reports/daywise.html", context)
-
-        HTML(string=html).write_pdf(response, stylesheets=[CSS(string='@page { size: A5; margin: .3cm ; }')])
-        return response
-
-            
-    except Exception as e:
-        logger.error(f"Error while generating daywise customer summary: {e}")
-        return ErrorResponse(
-            "Unable to generate daywise customer summary. Please try again"
-        ).to_json_response()
\ No newline at end of file
+    return SuccessResponse("Report fetched successfully", data=data).to_json_response()
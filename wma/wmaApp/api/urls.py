@@ -32,6 +32,7 @@ urlpatterns = [
     path('get_customer_detail/', get_customer_detail, name='get_customer_detail'),
     path('update_customer_api/', update_customer_api, name='update_customer_api'),
     path('upload_customer_csv_api/', upload_customer_csv_api, name='upload_customer_csv_api'),
+    path('customer_import_progress_api/', customer_import_progress_api, name='customer_import_progress_api'),
 
 
     # category api urls
@@ -92,10 +93,15 @@ urlpatterns = [
 
     # Customer Ledger
     path('CustomerLedgerListJson/', CustomerLedgerListJson.as_view(), name='CustomerLedgerListJson'),
+    path('customer_balance_as_of_api/', customer_balance_as_of_api, name='customer_balance_as_of_api'),
 
 
     # Reports PDF
+    path('queue_report_pdf/', queue_report_pdf, name='queue_report_pdf'),
+    path('report_job_status/', report_job_status, name='report_job_status'),
     path('download_report_pdf/', download_report_pdf, name='download_report_pdf'),
+    path('export_report/', export_report, name='export_report'),
+    path('report_json/', report_json, name='report_json'),
 
     # Booking
     path('BookingListJson/', BookingListJson.as_view(), name='BookingListJson'),
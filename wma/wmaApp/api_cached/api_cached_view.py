@@ -1,66 +1,86 @@
-from utils.custom_response import SuccessResponse, ErrorResponse
-from django.core.cache import cache
+from utils.custom_response import ErrorResponse, SuccessResponse
 
-from utils.get_user_id_detail import get_owner_id
+from utils.delta_sync import SyncTokenError, changed_rows, new_sync_token, parse_sync_token
 from utils.logger import logger
+from utils.versioned_cache import cached_json_response
 from wmaApp.models import *
 
-def customer_list_api_cached(request):
-    ownerid = get_owner_id(request)
+def delta_sync_response(request, qs, related, entry, message):
+    """
+    `?since=<token>` variant of a list API: the rows changed after the token, the ids deleted
+    after it and the token for the next call. An empty or "0" token downloads every row.
+    """
     try:
-        o_list = []
-        if cache.get(f'CustomerList{ownerid}'):
-            o_list = cache.get(f'CustomerList{ownerid}')
-            logger.info("Customer list fetched from cache")
-
-        else:
-            obj_list = Customer.objects.select_related().filter(isDeleted__exact=False, ownerID_id=get_owner_id(request)).order_by(
-                'name')
+        since = parse_sync_token(request.GET.get('since', ''))
+    except SyncTokenError as e:
+        return ErrorResponse(str(e)).to_json_response()
+    token = new_sync_token()
+    rows = changed_rows(qs, since, related)
+    changed = [entry(obj) for obj in rows.values() if not obj.isDeleted]
+    deleted = [pk for pk, obj in rows.items() if obj.isDeleted]
+    logger.info(f"{message}: {len(changed)} changed, {len(deleted)} deleted since {request.GET.get('since')}")
+    return SuccessResponse(message, data={'token': token, 'changed': changed, 'deleted': deleted}).to_json_response()
 
-            for obj in obj_list:
-                obj_dic = {
-                    'ID': obj.pk,
-                    'Name': obj.name,
-                    'Location': obj.locationID.name,
-                    'Address': obj.address,
-                    'Phone': obj.phone,
-                    'DisplayDetail': obj.name + ' - ' + obj.locationID.name
-                }
-                o_list.append(obj_dic)
-            cache.set(f'CustomerList{ownerid}', o_list, timeout=None)
+def customer_list_api_cached(request):
+    ownerid = request.tenant.owner_id
+    try:
+        if 'since' in request.GET:
+            qs = Customer.objects.select_related('locationID').filter(ownerID_id=ownerid)
+            return delta_sync_response(request, qs, ['locationID'], customer_entry, "Customer changes fetched successfully")
+        response = cached_json_response(
+            request, 'CustomerList', ownerid, "Customer list fetched successfully", lambda: build_customer_list(ownerid)
+        )
         logger.info("Customer list fetched successfully")
-        return SuccessResponse("Customer list fetched successfully", data=o_list).to_json_response()
+        return response
     except Exception as e:
         logger.error(f"Error while fetching customer list: {e}")
         return ErrorResponse("Error while fetching customer list").to_json_response()
 
-def product_list_api_cached(request):
-    ownerid = get_owner_id(request)
-    try:
-        o_list = []
-        if cache.get(f'ProductList{ownerid}'):
-            o_list = cache.get(f'ProductList{ownerid}')
-            logger.info("Product list fetched from cache")
+def customer_entry(obj):
+    return {
+        'ID': obj.pk,
+        'Name': obj.name,
+        'Location': obj.locationID.name,
+        'Address': obj.address,
+        'Phone': obj.phone,
+        'DisplayDetail': obj.name + ' - ' + obj.locationID.name
+    }
 
-        else:
-            obj_list = Product.objects.select_related().filter(isDeleted__exact=False, ownerID_id=get_owner_id(request)).order_by(
-                'productName')
+def build_customer_list(ownerid):
+    obj_list = Customer.objects.select_related('locationID').filter(isDeleted__exact=False, ownerID_id=ownerid).order_by(
+        'name')
+    return [customer_entry(obj) for obj in obj_list]
 
-            for obj in obj_list:
-                obj_dic = {
-                    'ID': obj.pk,
-                    'Name': obj.productName,
-                    'Rate': obj.rate,
-                    'SP': obj.sp,
-                    'Unit': obj.unitID.name,
-                    'Category': obj.categoryID.name,
-                    'Tax': obj.taxID.taxRate,
-                    'DisplayDetail': obj.productName + ' - ₹ ' + str(obj.sp) + '/' + obj.unitID.name
-                }
-                o_list.append(obj_dic)
-            cache.set(f'ProductList{ownerid}', o_list, timeout=None)
+def product_list_api_cached(request):
+    ownerid = request.tenant.owner_id
+    try:
+        if 'since' in request.GET:
+            qs = Product.objects.select_related('unitID', 'categoryID', 'taxID').filter(ownerID_id=ownerid)
+            return delta_sync_response(
+                request, qs, ['unitID', 'categoryID', 'taxID'], product_entry, "Product changes fetched successfully"
+            )
+        response = cached_json_response(
+            request, 'ProductList', ownerid, "Product List fetched successfully", lambda: build_product_list(ownerid)
+        )
         logger.info("Product List fetched successfully")
-        return SuccessResponse("Product List fetched successfully", data=o_list).to_json_response()
+        return response
     except Exception as e:
         logger.error(f"Error while fetching Product List: {e}")
-        return ErrorResponse("Error while fetching Product List").to_json_response()
\ No newline at end of file
+        return ErrorResponse("Error while fetching Product List").to_json_response()
+
+def product_entry(obj):
+    return {
+        'ID': obj.pk,
+        'Name': obj.productName,
+        'Rate': obj.rate,
+        'SP': obj.sp,
+        'Unit': obj.unitID.name,
+        'Category': obj.categoryID.name,
+        'Tax': obj.taxID.taxRate,
+        'DisplayDetail': obj.productName + ' - ₹ ' + str(obj.sp) + '/' + obj.unitID.name
+    }
+
+def build_product_list(ownerid):
+    obj_list = Product.objects.select_related('unitID', 'categoryID', 'taxID').filter(isDeleted__exact=False, ownerID_id=ownerid).order_by(
+        'productName')
+    return [product_entry(obj) for obj in obj_list]
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class WmaappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'wmaApp'
+
+    def ready(self):
+        from . import signals  # noqa: F401
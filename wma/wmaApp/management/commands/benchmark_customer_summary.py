@@ -0,0 +1,99 @@
+import time
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, FloatField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from utils.report_engine import customer_summary
+from wmaApp.models import Customer, Location, Owner, Payment, Sales
+
+
+class _Rollback(Exception):
+    pass
+
+
+def correlated_summary(report_date, owner_id):
+    """The old summary: every customer annotated with two correlated subqueries, then three aggregates."""
+    sales = Sales.objects.filter(
+        isDeleted=False, ownerID=owner_id, customerID=OuterRef("pk"), saleDate=report_date
+    ).values("customerID").annotate(day_sales=Sum("totalAmountAfterTax")).values("day_sales")[:1]
+    payments = Payment.objects.filter(
+        isDeleted=False, ownerID=owner_id, customerID=OuterRef("pk"), paymentDate=report_date
+    ).values("customerID").annotate(day_payment=Sum("paymentAmount")).values("day_payment")[:1]
+    qs = Customer.objects.filter(isDeleted=False, ownerID_id=owner_id).annotate(
+        sales_amount=Coalesce(Subquery(sales, output_field=FloatField()), Value(0.0)),
+        payment_amount=Coalesce(Subquery(payments, output_field=FloatField()), Value(0.0)),
+        due_amount=F("sales_amount") - F("payment_amount"),
+    ).filter(Q(sales_amount__gt=0) | Q(payment_amount__gt=0)).select_related("locationID")
+    rows = list(qs)
+    for field in ("sales_amount", "payment_amount", "due_amount"):
+        qs.aggregate(Sum(field))
+    return rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the day-wise customer summary (grouped over the day's rows) against the old "
+        "correlated subquery version while the customer table grows and the day's activity stays "
+        "the same. All rows are rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--steps", default="1000,10000,50000",
+            help="Comma separated customer counts to measure at, e.g. 1000,10000,100000",
+        )
+        parser.add_argument("--active", type=int, default=200, help="Customers with a sale and a payment on the day")
+        parser.add_argument("--samples", type=int, default=5, help="Runs timed per step")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        steps = sorted(int(step) for step in options["steps"].split(","))
+        active = options["active"]
+        samples = options["samples"]
+        batch_size = options["batch_size"]
+        report_date = date(2025, 4, 1)
+
+        try:
+            with transaction.atomic():
+                user = User.objects.create(username="benchmark-customer-summary")
+                owner = Owner.objects.create(userID=user, name="benchmark")
+                location = Location.objects.create(ownerID=owner, name="benchmark")
+                customers = 0
+                self.stdout.write(f"{'customers':>12} {'grouped (ms)':>14} {'correlated (ms)':>16}")
+                for step in steps:
+                    while customers < step:
+                        size = min(batch_size, step - customers)
+                        Customer.objects.bulk_create(
+                            [Customer(ownerID=owner, locationID=location, name=f"c{customers + i}") for i in range(size)],
+                            batch_size=batch_size,
+                        )
+                        customers += size
+                    if not Sales.objects.filter(ownerID=owner).exists():
+                        day_customers = Customer.objects.filter(ownerID=owner).values_list("pk", flat=True)[:active]
+                        Sales.objects.bulk_create([
+                            Sales(ownerID=owner, customerID_id=pk, saleDate=report_date, totalAmountAfterTax=100)
+                            for pk in day_customers
+                        ])
+                        Payment.objects.bulk_create([
+                            Payment(ownerID=owner, customerID_id=pk, paymentDate=report_date, paymentAmount=60)
+                            for pk in day_customers
+                        ])
+
+                    started = time.perf_counter()
+                    for _ in range(samples):
+                        customer_summary(report_date, report_date, "All", owner.pk)
+                    grouped_ms = (time.perf_counter() - started) * 1000 / samples
+
+                    started = time.perf_counter()
+                    for _ in range(samples):
+                        correlated_summary(report_date, owner.pk)
+                    correlated_ms = (time.perf_counter() - started) * 1000 / samples
+
+                    self.stdout.write(f"{customers:>12} {grouped_ms:>14.2f} {correlated_ms:>16.2f}")
+                raise _Rollback
+        except _Rollback:
+            pass
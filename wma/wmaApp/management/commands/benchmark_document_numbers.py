@@ -0,0 +1,61 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from utils.document_number import SALES_PREFIX, allocate_document_numbers
+from wmaApp.models import Owner, Sales
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare invoice number allocation (sequence table) with the old count() scheme "
+        "while the Sales table grows. All rows are rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--steps", default="1000,10000,100000",
+            help="Comma separated Sales table sizes to measure at, e.g. 1000,100000,1000000",
+        )
+        parser.add_argument("--samples", type=int, default=200, help="Allocations timed per step")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        steps = sorted(int(step) for step in options["steps"].split(","))
+        samples = options["samples"]
+        batch_size = options["batch_size"]
+
+        try:
+            with transaction.atomic():
+                user = User.objects.create(username="benchmark-document-numbers")
+                owner = Owner.objects.create(userID=user, name="benchmark")
+                rows = 0
+                self.stdout.write(f"{'sales rows':>12} {'sequence (ms)':>15} {'count() (ms)':>15}")
+                for step in steps:
+                    while rows < step:
+                        size = min(batch_size, step - rows)
+                        Sales.objects.bulk_create(
+                            [Sales(ownerID_id=owner.pk) for _ in range(size)], batch_size=batch_size
+                        )
+                        rows += size
+
+                    started = time.perf_counter()
+                    for _ in range(samples):
+                        allocate_document_numbers(owner.pk, SALES_PREFIX)
+                    sequence_ms = (time.perf_counter() - started) * 1000 / samples
+
+                    started = time.perf_counter()
+                    for _ in range(samples):
+                        Sales.objects.filter(ownerID_id=owner.pk).count()
+                    count_ms = (time.perf_counter() - started) * 1000 / samples
+
+                    self.stdout.write(f"{rows:>12} {sequence_ms:>15.3f} {count_ms:>15.3f}")
+                raise _Rollback
+        except _Rollback:
+            pass
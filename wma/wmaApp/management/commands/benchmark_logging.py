@@ -0,0 +1,71 @@
+import inspect
+import logging
+import os
+import time
+from logging.handlers import QueueHandler, QueueListener
+from queue import Queue
+
+from django.core.management.base import BaseCommand
+
+from utils.logger import LOG_DATE_FORMAT, LOG_FORMAT, AppNameFilter, DeferredQueueHandler
+
+
+def _stack_app_name():
+    # the app name lookup utils.logger used before, kept here as the baseline
+    for frame_info in inspect.stack():
+        module = inspect.getmodule(frame_info.frame)
+        if module and hasattr(module, "__package__") and module.__package__:
+            return module.__package__.split(".")[0]
+    return "app"
+
+
+class StackAppNameFilter(logging.Filter):
+    def filter(self, record):
+        record.app_name = _stack_app_name()
+        return True
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure log records per second through the queue logger, with the old inspect.stack() "
+        "app name lookup and with the current pathname based one. Output goes to os.devnull."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--records", type=int, default=20000)
+
+    def handle(self, *args, **options):
+        records = options["records"]
+        # the stack lookup has to run in the calling thread, the listener's stack is not the caller's
+        variants = [
+            ("inspect.stack, formatted on caller", QueueHandler, StackAppNameFilter, True),
+            ("pathname, formatted by listener", DeferredQueueHandler, AppNameFilter, False),
+        ]
+        self.stdout.write(f"{'variant':<38} {'caller rec/s':>14} {'end to end rec/s':>18}")
+        for name, queue_handler_class, filter_class, filter_on_caller in variants:
+            caller, total = self.measure(records, queue_handler_class, filter_class, filter_on_caller)
+            self.stdout.write(f"{name:<38} {records / caller:>14,.0f} {records / total:>18,.0f}")
+
+    def measure(self, records, queue_handler_class, filter_class, filter_on_caller):
+        log_queue = Queue()
+        with open(os.devnull, "w") as devnull:
+            handler = logging.StreamHandler(devnull)
+            handler.setFormatter(logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT))
+            queue_handler = queue_handler_class(log_queue)
+            (queue_handler if filter_on_caller else handler).addFilter(filter_class())
+            listener = QueueListener(log_queue, handler)
+
+            bench_logger = logging.getLogger(f"benchmark.{queue_handler_class.__name__}")
+            bench_logger.handlers = [queue_handler]
+            bench_logger.setLevel(logging.INFO)
+            bench_logger.propagate = False
+
+            listener.start()
+            started = time.perf_counter()
+            for i in range(records):
+                bench_logger.info("Sales %s created for owner_id: %s", i, 1)
+            caller = time.perf_counter() - started
+            # stop() returns once the listener has written every queued record
+            listener.stop()
+            total = time.perf_counter() - started
+        return caller, total
@@ -0,0 +1,109 @@
+import re
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+from utils.report_engine import PeriodReport, REPORTS
+from utils.tenant_context import TenantContext
+from wmaApp.api import api_view
+from wmaApp.models import *
+from wmaApp.views import dashboard_daily_series, dashboard_summaries
+
+DATATABLE_VIEWS = [
+    api_view.CustomerListJson,
+    api_view.SalesListJson,
+    api_view.PaymentListJson,
+    api_view.JarListJson,
+    api_view.ExpenseListJson,
+    api_view.BookingListJson,
+    api_view.CustomerLedgerListJson,
+    api_view.JarAllocationListJson,
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN on the main dashboard, report and datatable queries for one owner "
+        "and list the ones that still read a table with a full scan"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", type=int, help="Owner ID (defaults to the first owner)")
+        parser.add_argument("--days", type=int, default=30, help="Date range used by report/list queries")
+        parser.add_argument("--plans", action="store_true", help="Print every query plan")
+
+    def handle(self, *args, **options):
+        owner = Owner.objects.filter(pk=options["owner"]) if options["owner"] else Owner.objects.order_by("id")
+        owner = owner.first()
+        if owner is None:
+            raise CommandError("No owner found")
+
+        end_date = date.today()
+        start_date = end_date - timedelta(days=options["days"])
+        full_scans = 0
+        for name, queryset in self.get_queries(owner, start_date, end_date):
+            plan = self.explain(queryset)
+            tables = self.full_scan_tables(plan)
+            if options["plans"]:
+                rows = (row.values() if isinstance(row, dict) else row for row in plan)
+                self.stdout.write(f"--- {name}\n" + "\n".join(" | ".join(map(str, row)) for row in rows))
+            if tables:
+                full_scans += 1
+                self.stdout.write(self.style.WARNING(f"FULL SCAN  {name}: {', '.join(tables)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"indexed    {name}"))
+        self.stdout.write(f"{full_scans} queries with full scans")
+
+    def get_queries(self, owner, start_date, end_date):
+        # built by the code paths that run them, so the plans follow any change to those
+        owner_id = owner.pk
+        staff = StaffUser.objects.filter(ownerID_id=owner_id).values_list("id", flat=True).first()
+        yield "dashboard today", dashboard_summaries(owner_id, None, end_date)
+        if staff is not None:
+            yield "dashboard today, driver", dashboard_summaries(owner_id, staff, end_date)
+        yield "dashboard 7 day series", dashboard_daily_series(owner_id, end_date)
+
+        for name, report in REPORTS.items():
+            if isinstance(report, PeriodReport):
+                yield f"report {name}", report.rows_queryset(report.queryset(start_date, end_date, "All", owner_id))
+
+        customer = Customer.objects.filter(ownerID_id=owner_id).values_list("id", flat=True).first()
+        request = RequestFactory().get("/", {
+            "startDate": start_date.strftime("%d/%m/%Y"),
+            "endDate": end_date.strftime("%d/%m/%Y"),
+            "staffID": "All",
+            "customer_id": customer or "",
+        })
+        request.user = owner.userID
+        request.tenant = TenantContext(owner_id, staff, ["Owner"])
+        for view_class in DATATABLE_VIEWS:
+            view = view_class()
+            view.request = request
+            view.args, view.kwargs = (), {}
+            yield f"datatable {view_class.__name__}", view.get_initial_queryset()
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        prefix = "EXPLAIN QUERY PLAN " if connection.vendor == "sqlite" else "EXPLAIN "
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) if connection.vendor == "mysql" else row for row in cursor.fetchall()]
+
+    def full_scan_tables(self, plan):
+        tables = []
+        for row in plan:
+            if connection.vendor == "mysql":
+                if row.get("type") == "ALL":
+                    tables.append(row.get("table"))
+            elif connection.vendor == "sqlite":
+                match = re.match(r"SCAN (\S+)$", str(row[-1]))
+                if match:
+                    tables.append(match.group(1))
+            else:
+                match = re.search(r"Seq Scan on (\S+)", str(row[0]))
+                if match:
+                    tables.append(match.group(1))
+        return tables
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.ledger_rebalance import REBALANCE_CHUNK_SIZE, rebalance_customer_ledger, rebalance_owner_ledgers
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the running balances of CustomerLedger (and the CustomerBalance rows) from the "
+        "live entries, for one customer or every customer of an owner"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", type=int, help="Rebalance every customer of this owner ID")
+        parser.add_argument("--customer", type=int, help="Rebalance only this customer ID")
+        parser.add_argument("--from-id", type=int, help="With --customer, start at this ledger entry ID")
+        parser.add_argument("--workers", type=int, default=4, help="Threads rebalancing an owner's customers")
+        parser.add_argument("--chunk-size", type=int, default=REBALANCE_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options["customer"]:
+            try:
+                count = rebalance_customer_ledger(options["customer"], options["from_id"])
+            except Exception as e:
+                raise CommandError(f"Ledger of customer {options['customer']} could not be rebalanced: {e}")
+            failed = []
+        elif options["owner"]:
+            count, failed = rebalance_owner_ledgers(
+                options["owner"], workers=options["workers"], chunk_size=options["chunk_size"]
+            )
+        else:
+            raise CommandError("Pass --owner or --customer")
+        self.stdout.write(self.style.SUCCESS(f"{count} ledger entries rebalanced"))
+        if failed:
+            raise CommandError(
+                f"{len(failed)} customers could not be rebalanced: {', '.join(map(str, failed))}"
+            )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from utils.customer_balance import rebuild_customer_balances
+
+
+class Command(BaseCommand):
+    help = "Rebuild the CustomerBalance table from CustomerLedger"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", type=int, help="Only rebuild customers of this owner ID")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_customer_balances(options["owner"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{count} customer balances rebuilt"))
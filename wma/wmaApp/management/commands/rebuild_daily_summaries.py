@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from utils.daily_summary import rebuild_daily_summaries
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailySummary table from sales, payments, jars and expenses"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", type=int, help="Only rebuild this owner ID")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_daily_summaries(options["owner"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{count} daily summaries rebuilt"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from utils.search_index import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the SearchToken table used by the datatable search boxes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", type=int, help="Only rebuild rows of this owner ID")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = rebuild_search_index(options["owner"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{count} rows indexed"))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from utils.report_jobs import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = "Render queued PDF report jobs in the background"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+        parser.add_argument("--interval", type=float, default=2, help="Seconds to wait when the queue is empty")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Report worker started")
+        while True:
+            close_old_connections()
+            job = claim_next_job()
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+                continue
+            job = run_job(job)
+            self.stdout.write(f"job {job.pk} {job.reportType}: {job.status}")
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from utils.search_index import claim_next_index_job, run_index_job
+
+
+class Command(BaseCommand):
+    help = "Re-index the rows showing a renamed customer, location or staff user in the background"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+        parser.add_argument("--interval", type=float, default=2, help="Seconds to wait when the queue is empty")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        self.stdout.write("Search index worker started")
+        while True:
+            close_old_connections()
+            job = claim_next_index_job()
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
+                continue
+            try:
+                count = run_index_job(job, options["batch_size"])
+            except Exception as e:
+                # the rows keep their old tokens until the next change or rebuild_search_index
+                self.stderr.write(f"{job.modelName} {job.objectID}: failed: {e}")
+                continue
+            self.stdout.write(f"{job.modelName} {job.objectID}: {count} rows indexed")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from utils.ledger_checkpoints import write_all_checkpoints, write_checkpoints
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the month-end CustomerLedger checkpoints up to the last complete month. Run it "
+        "after each month end (e.g. from cron on the 1st); each run only reads the new entries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--owner", type=int, help="Only write checkpoints of this owner ID")
+        parser.add_argument("--rebuild", action="store_true", help="Drop the checkpoints and rebuild from the first entry")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options["owner"]:
+            count = write_checkpoints(options["owner"], rebuild=options["rebuild"], batch_size=options["batch_size"])
+        else:
+            count = write_all_checkpoints(rebuild=options["rebuild"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"{count} ledger checkpoints written"))
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models import Q
 from stdimage import StdImageField
 
 class Owner(models.Model):
@@ -83,6 +84,11 @@ class Expense(models.Model):
     dateCreated = models.DateTimeField(auto_now_add=True, auto_now=False)
     lastUpdatedOn = models.DateTimeField(auto_now_add=False, auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["ownerID", "expenseDate"], name="expense_owner_date_idx", condition=Q(isDeleted=False)),
+        ]
+
     def __str__(self):
         return self.expenseDescription
 
@@ -106,6 +112,12 @@ class Customer(models.Model):
     dateCreated = models.DateTimeField(auto_now_add=True, auto_now=False)
     lastUpdatedOn = models.DateTimeField(auto_now_add=False, auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["ownerID", "name"], name="customer_owner_name_idx", condition=Q(isDeleted=False)),
+            models.Index(fields=["ownerID", "lastUpdatedOn"], name="customer_owner_updated_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -124,9 +136,85 @@ class CustomerLedger(models.Model):
     dateCreated = models.DateTimeField(auto_now_add=True, auto_now=False)
     lastUpdatedOn = models.DateTimeField(auto_now_add=False, auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["ownerID", "addedDate"], name="ledger_owner_date_idx", condition=Q(isDeleted=False)),
+            models.Index(fields=["customerID", "id"], name="ledger_customer_id_idx"),
+            # keyset paging of the datatables (sorted by dateCreated by default)
+            models.Index(fields=["customerID", "dateCreated", "id"], name="ledger_created_idx"),
+            # balance as of a date: the entries after a customer's checkpoint
+            models.Index(fields=["customerID", "addedDate"], name="ledger_customer_date_idx"),
+        ]
+
     def __str__(self):
         return self.ownerID.name
 
+class CustomerBalance(models.Model):
+    # one row per customer, the head of its ledger chain (see append_ledger_entries)
+    ownerID = models.ForeignKey(Owner, on_delete=models.CASCADE,null=True, blank=True)
+    customerID = models.OneToOneField(Customer, on_delete=models.CASCADE, null=True, blank=True)
+    totalCredit = models.FloatField(default=0.00)
+    totalDebit = models.FloatField(default=0.00)
+    balance = models.FloatField(default=0.00)
+    lastTransactionDate = models.DateField(blank=True, null=True)
+    dateCreated = models.DateTimeField(auto_now_add=True, auto_now=False)
+    lastUpdatedOn = models.DateTimeField(auto_now_add=False, auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["ownerID", "balance"], name="balance_owner_balance_idx"),
+        ]
+
+    def __str__(self):
+        return self.customerID.name
+
+class LedgerCheckpoint(models.Model):
+    # running ledger totals of a customer up to the end of a month with entries
+    # (see utils/ledger_checkpoints.py); only live entries are counted
+    ownerID = models.ForeignKey(Owner, on_delete=models.CASCADE,null=True, blank=True)
+    customerID = models.ForeignKey(Customer, on_delete=models.CASCADE, null=True, blank=True)
+    periodEnd = models.DateField()
+    totalCredit = models.FloatField(default=0.00)
+    totalDebit = models.FloatField(default=0.00)
+    balance = models.FloatField(default=0.00)
+    dateCreated = models.DateTimeField(auto_now_add=True, auto_now=False)
+    lastUpdatedOn = models.DateTimeField(auto_now_add=False, auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["customerID", "periodEnd"], name="unique_ledger_checkpoint"),
+        ]
+        indexes = [
+            models.Index(fields=["ownerID", "periodEnd"], name="checkpoint_owner_period_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.customerID_id} {self.periodEnd}"
+
+class DailySummary(models.Model):
+    # per owner, day and staff totals maintained by the write apis (see utils/daily_summary.py);
+    # staffID is empty for entries made by the owner
+    ownerID = models.ForeignKey(Owner, on_delete=models.CASCADE,null=True, blank=True)
+    staffID = models.ForeignKey(StaffUser, on_delete=models.CASCADE, null=True, blank=True)
+    date = models.DateField()
+    salesAmount = models.FloatField(default=0.00)
+    salesAmountAfterTax = models.FloatField(default=0.00)
+    taxAmount = models.FloatField(default=0.00)
+    paymentAmount = models.FloatField(default=0.00)
+    jarsIn = models.FloatField(default=0.00)
+    jarsOut = models.FloatField(default=0.00)
+    expenseAmount = models.FloatField(default=0.00)
+    dateCreated = models.DateTimeField(auto_now_add=True, auto_now=False)
+    lastUpdatedOn = models.DateTimeField(auto_now_add=False, auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["ownerID", "date", "staffID"], name="unique_daily_summary"),
+        ]
+
+    def __str__(self):
+        return str(self.date)
+
 class TaxAndHsn(models.Model):
     ownerID = models.ForeignKey(Owner, on_delete=models.CASCADE,null=True, blank=True)
     taxRate = models.FloatField(default=0.00)
@@ -172,6 +260,11 @@ class Product(models.Model):
     dateCreated = models.DateTimeField(auto_now_add=True, auto_now=False)
     lastUpdatedOn = models.DateTimeField(auto_now_add=False, auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["ownerID", "lastUpdatedOn"], name="product_owner_updated_idx"),
+        ]
+
     def __str__(self):
         return self.productName
 
@@ -251,6 +344,13 @@ class Sales(models.Model):
     dateCreated = models.DateTimeField(auto_now_add=True, auto_now=False)
     lastUpdatedOn = models.DateTimeField(auto_now_add=False, auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["ownerID", "saleDate"], name="sales_owner_date_idx", condition=Q(isDeleted=False)),
+            # keyset paging of the datatables (sorted by dateCreated by default)
+            models.Index(fields=["ownerID", "dateCreated", "id"], name="sales_created_idx"),
+        ]
+
     def __str__(self):
         return self.customerID.name
 
@@ -288,6 +388,13 @@ class Payment(models.Model):
     dateCreated = models.DateTimeField(auto_now_add=True, auto_now=False)
     lastUpdatedOn = models.DateTimeField(auto_now_add=False, auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["ownerID", "paymentDate"], name="payment_owner_date_idx", condition=Q(isDeleted=False)),
+            # keyset paging of the datatables (sorted by dateCreated by default)
+            models.Index(fields=["ownerID", "dateCreated", "id"], name="payment_created_idx"),
+        ]
+
     def __str__(self):
         return self.customerID.name
 
@@ -308,6 +415,11 @@ class AdvanceOrder(models.Model):
     dateCreated = models.DateTimeField(auto_now_add=True, auto_now=False)
     lastUpdatedOn = models.DateTimeField(auto_now_add=False, auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["ownerID", "expectedDeliveryDate"], name="booking_owner_date_idx", condition=Q(isDeleted=False)),
+        ]
+
     def __str__(self):
         return self.customerID.name
 
@@ -343,6 +455,13 @@ class JarCounter(models.Model):
     dateCreated = models.DateTimeField(auto_now_add=True, auto_now=False)
     lastUpdatedOn = models.DateTimeField(auto_now_add=False, auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["ownerID", "date"], name="jar_owner_date_idx", condition=Q(isDeleted=False)),
+            # keyset paging of the datatables (sorted by dateCreated by default)
+            models.Index(fields=["ownerID", "dateCreated", "id"], name="jar_created_idx"),
+        ]
+
     def __str__(self):
         return self.customerID.name
 
@@ -358,5 +477,82 @@ class JarAllocation(models.Model):
     dateCreated = models.DateTimeField(auto_now_add=True, auto_now=False)
     lastUpdatedOn = models.DateTimeField(auto_now_add=False, auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["ownerID", "date"], name="jar_alloc_owner_date_idx", condition=Q(isDeleted=False)),
+        ]
+
+    def __str__(self):
+        return self.driverID.name
+
+class DocumentSequence(models.Model):
+    # last number handed out per owner and prefix ("S" sales, "B" bookings, "CID" customers)
+    ownerID = models.ForeignKey(Owner, on_delete=models.CASCADE,null=True, blank=True)
+    prefix = models.CharField(max_length=10)
+    lastNumber = models.BigIntegerField(default=0)
+    dateCreated = models.DateTimeField(auto_now_add=True, auto_now=False)
+    lastUpdatedOn = models.DateTimeField(auto_now_add=False, auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["ownerID", "prefix"], name="unique_document_sequence"),
+        ]
+
+    def __str__(self):
+        return self.prefix + str(self.lastNumber)
+
+class ReportJob(models.Model):
+    STATUS_CHOICES = (
+        ('Pending', 'Pending'),
+        ('Running', 'Running'),
+        ('Done', 'Done'),
+        ('Failed', 'Failed'),
+    )
+    ownerID = models.ForeignKey(Owner, on_delete=models.CASCADE,null=True, blank=True)
+    requestedByID = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
+    reportType = models.CharField(max_length=50)
+    startDate = models.DateField()
+    endDate = models.DateField()
+    location = models.CharField(max_length=20, default='All')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
+    dataVersion = models.CharField(max_length=64, blank=True, null=True)
+    filePath = models.CharField(max_length=500, blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    startedOn = models.DateTimeField(blank=True, null=True)
+    finishedOn = models.DateTimeField(blank=True, null=True)
+    dateCreated = models.DateTimeField(auto_now_add=True, auto_now=False)
+    lastUpdatedOn = models.DateTimeField(auto_now_add=False, auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"], name="report_job_status_idx"),
+        ]
+
+    def __str__(self):
+        return self.reportType + ' ' + self.status
+
+class SearchIndexJob(models.Model):
+    # a row whose change has too many dependent rows to re-index on commit, see utils/search_index.py
+    ownerID = models.ForeignKey(Owner, on_delete=models.CASCADE,null=True, blank=True)
+    modelName = models.CharField(max_length=30)
+    objectID = models.BigIntegerField()
+    dateCreated = models.DateTimeField(auto_now_add=True, auto_now=False)
+
+    def __str__(self):
+        return f"{self.modelName} {self.objectID}"
+
+class SearchToken(models.Model):
+    # lower-cased words of a row's searchable columns, maintained by utils/search_index.py
+    ownerID = models.ForeignKey(Owner, on_delete=models.CASCADE,null=True, blank=True)
+    modelName = models.CharField(max_length=30)
+    objectID = models.BigIntegerField()
+    token = models.CharField(max_length=50)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["ownerID", "modelName", "token"], name="search_owner_token_idx"),
+            models.Index(fields=["modelName", "objectID"], name="search_object_idx"),
+        ]
+
     def __str__(self):
-        return self.driverID.name
\ No newline at end of file
+        return self.token
@@ -0,0 +1,80 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete, pre_save, m2m_changed
+from django.dispatch import receiver
+
+from utils.search_index import (
+    SEARCH_FIELDS, related_models, schedule_dependent_index, schedule_index, watched_columns,
+)
+from utils.tenant_context import invalidate_tenant_context
+from utils.versioned_cache import dependent_models, expire_cached_model
+from .models import Owner, SearchToken, StaffUser
+
+
+# ---------------------------- tenant context ---------------------------
+@receiver([post_save, post_delete], sender=StaffUser)
+@receiver([post_save, post_delete], sender=Owner)
+def expire_tenant_context_on_identity_change(sender, instance, **kwargs):
+    if instance.userID_id:
+        invalidate_tenant_context(instance.userID_id)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def expire_tenant_context_on_group_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        # user.groups.add/remove/clear
+        invalidate_tenant_context(instance.pk)
+        return
+    # group.user_set.add/remove/clear
+    if action == "pre_clear":
+        pk_set = instance.user_set.values_list("pk", flat=True)
+    for user_id in pk_set or ():
+        invalidate_tenant_context(user_id)
+
+
+# ---------------------------- search index ---------------------------
+def index_saved_row(sender, instance, **kwargs):
+    schedule_index(instance)
+
+
+def drop_deleted_row_tokens(sender, instance, **kwargs):
+    SearchToken.objects.filter(modelName=sender.__name__, objectID=instance.pk).delete()
+
+
+def note_shown_column_change(sender, instance, **kwargs):
+    # e.g. a customer rename has to reach the tokens of that customer's sales and payments
+    instance._search_columns_changed = False
+    if instance.pk is None:
+        return
+    columns = watched_columns(sender)
+    old = sender.objects.filter(pk=instance.pk).values(*columns).first()
+    if old is not None:
+        instance._search_columns_changed = any(
+            str(old[column]) != str(getattr(instance, column)) for column in columns
+        )
+
+
+def reindex_rows_showing(sender, instance, created, **kwargs):
+    if getattr(instance, "_search_columns_changed", False):
+        schedule_dependent_index(instance)
+
+
+for model in SEARCH_FIELDS:
+    post_save.connect(index_saved_row, sender=model, dispatch_uid=f"search_index_{model.__name__}")
+    post_delete.connect(drop_deleted_row_tokens, sender=model, dispatch_uid=f"search_drop_{model.__name__}")
+
+for model in related_models():
+    pre_save.connect(note_shown_column_change, sender=model, dispatch_uid=f"search_watch_{model.__name__}")
+    post_save.connect(reindex_rows_showing, sender=model, dispatch_uid=f"search_dependents_{model.__name__}")
+
+
+# ---------------------------- cached lists ---------------------------
+def expire_cached_views(sender, instance, **kwargs):
+    if instance.ownerID_id:
+        expire_cached_model(sender, instance.ownerID_id)
+
+
+for model in dependent_models():
+    post_save.connect(expire_cached_views, sender=model, dispatch_uid=f"cache_version_{model.__name__}")
+    post_delete.connect(expire_cached_views, sender=model, dispatch_uid=f"cache_version_drop_{model.__name__}")
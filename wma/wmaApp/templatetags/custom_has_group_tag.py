@@ -4,8 +4,12 @@ register = template.Library()
 
 
 @register.filter(name='has_group')
-def has_group(user, group_name):
-    return user.groups.filter(name=group_name).exists()
+def has_group(tenant, group_name):
+    """Usage: {% if request.tenant|has_group:"Owner" %} (groups are loaded once per session)."""
+    if hasattr(tenant, 'has_group'):
+        return tenant.has_group(group_name)
+    # a User object
+    return tenant.groups.filter(name=group_name).exists()
 
 @register.filter(name='convert')
 def formatINR(number):
@@ -1,3 +1,889 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import logging
+import queue
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import date, datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User, Group
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, modify_settings, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from utils.customer_ledger_generator import CREDIT, DEBIT, append_ledger_entries
+from utils.ledger_checkpoints import balance_as_of, write_checkpoints
+from utils.ledger_rebalance import rebalance_customer_ledger, rebalance_owner_ledgers
+from utils.db_router import ReplicaRouter, read_from_replica, replica_reads
+from utils.daily_summary import apply_summary_change, summary_values
+from utils.logger import DeferredQueueHandler
+from utils.report_engine import customer_summary
+from utils.report_jobs import DONE, FAILED, PENDING, claim_next_job, run_job
+from utils.tenant_context import _load_tenant_context, _version_key
+
+from .models import *
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class OwnerTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("owner", password="password")
+        Group.objects.get_or_create(name="Owner")[0].user_set.add(self.user)
+        self.owner = Owner.objects.create(userID=self.user, name="Owner")
+        self.location = Location.objects.create(ownerID=self.owner, name="Market")
+        self.customer = Customer.objects.create(ownerID=self.owner, locationID=self.location, name="Customer")
+        self.product = Product.objects.create(ownerID=self.owner, productName="Jar 20L", sp=50)
+        self.client.force_login(self.user)
+
+
+class TenantContextTest(OwnerTestCase):
+    def load(self, session):
+        request = RequestFactory().get("/")
+        request.user, request.session = self.user, session
+        return _load_tenant_context(request)
+
+    def test_context_is_cached_in_the_session(self):
+        session = {}
+        self.assertEqual(self.load(session).owner_id, self.owner.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(self.load(session).has_group("Owner"))
+
+    def test_evicted_version_does_not_revive_a_revoked_context(self):
+        cache.delete(_version_key(self.user.pk))
+        session = {}
+        self.assertTrue(self.load(session).has_group("Owner"))
+        Group.objects.get(name="Owner").user_set.remove(self.user)
+        # the cache loses the version key before the session is used again
+        cache.delete(_version_key(self.user.pk))
+        self.assertFalse(self.load(session).has_group("Owner"))
+
+
+class SalesLineItemTest(OwnerTestCase):
+    def sale_data(self, lines):
+        item = f"{self.product.pk}|Jar 20L|1|50|50||pcs@"
+        return {
+            "customer": self.customer.pk,
+            "saleDate": "01/04/2025",
+            "grandTotal": str(50 * lines),
+            "additionalCharge": "0",
+            "tax": "0",
+            "datas": item * lines,
+            "subTotal": str(50 * lines),
+            "jarIn": "0",
+            "jarOut": "0",
+            "amountCollected": "0",
+            "catering": "0",
+            "remarkAdditional": "",
+        }
+
+    def post_sale(self, lines):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/add_sales_api/", self.sale_data(lines))
+        self.assertTrue(response.json()["success"])
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_lines(self):
+        self.post_sale(1)  # resolves and stores the tenant context in the session
+        single_line = self.post_sale(1)
+        thirty_lines = self.post_sale(30)
+        self.assertEqual(single_line, thirty_lines)
+        self.assertLessEqual(thirty_lines, 18)
+        self.assertEqual(SaleProduct.objects.filter(isDeleted=False).count(), 32)
+
+    def test_update_replaces_items(self):
+        self.post_sale(3)
+        sale = Sales.objects.get()
+        data = dict(self.sale_data(2), id=sale.pk)
+        response = self.client.post("/api/update_sales_api/", data)
+        self.assertTrue(response.json()["success"])
+        self.assertEqual(SaleProduct.objects.filter(salesID=sale, isDeleted=False).count(), 2)
+        self.assertEqual(SaleProduct.objects.filter(salesID=sale, isDeleted=True).count(), 3)
+
+    def test_invalid_item_writes_nothing(self):
+        data = self.sale_data(1)
+        data["datas"] = f"{self.product.pk}|Jar 20L|one|50|50||pcs@"
+        response = self.client.post("/api/add_sales_api/", data)
+        self.assertFalse(response.json()["success"])
+        self.assertFalse(Sales.objects.exists())
+
+
+class DatatableSearchTest(OwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer.name = "Ramesh Kumar"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.save()
+            self.sale = Sales.objects.create(
+                ownerID=self.owner, customerID=self.customer, invoiceNumber="S00000042",
+                saleDate=date(2025, 4, 1), totalAmount=150,
+            )
+
+    def search(self, text):
+        response = self.client.get("/api/SalesListJson/", {
+            "startDate": "01/04/2025", "endDate": "30/04/2025", "staffID": "All",
+            "search[value]": text, "draw": 1, "start": 0, "length": 10,
+        })
+        return response.json()["recordsFiltered"]
+
+    def test_matches_word_prefixes_of_any_column(self):
+        self.assertEqual(self.search("rame"), 1)
+        self.assertEqual(self.search("KUMAR market"), 1)
+        self.assertEqual(self.search("42"), 1)
+        self.assertEqual(self.search("150"), 1)
+        self.assertEqual(self.search("2025-04"), 1)
+        self.assertEqual(self.search("suresh"), 0)
+
+    def test_matches_the_middle_of_numbers_only(self):
+        self.assertEqual(self.search("0004"), 1)
+        self.customer.phone = "9876543210"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.save()
+        response = self.client.get("/api/CustomerListJson/", {"search[value]": "6543", "draw": 1, "start": 0, "length": 10})
+        self.assertEqual(response.json()["recordsFiltered"], 1)
+        # words are still matched from their start
+        self.assertEqual(self.search("mesh"), 0)
+
+    def test_customer_rename_reaches_sales(self):
+        self.customer.name = "Suresh"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer.save()
+        self.assertEqual(self.search("suresh"), 1)
+        self.assertEqual(self.search("ramesh"), 0)
+
+    def test_rename_shown_by_many_rows_is_queued(self):
+        self.customer.name = "Suresh"
+        with mock.patch("utils.search_index.DEPENDENT_INDEX_INLINE_LIMIT", 0):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.customer.save()
+        self.assertEqual(self.search("suresh"), 0)
+        self.assertEqual(SearchIndexJob.objects.count(), 1)
+        call_command("run_search_index_worker", once=True, stdout=io.StringIO())
+        self.assertEqual(self.search("suresh"), 1)
+        self.assertFalse(SearchIndexJob.objects.exists())
+
+
+class DatatableQueryCountTest(OwnerTestCase):
+    def add_sales(self, count):
+        Sales.objects.bulk_create([
+            Sales(ownerID=self.owner, customerID=self.customer, saleDate=date(2025, 4, 1), totalAmount=50)
+            for _ in range(count)
+        ])
+
+    def draw(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/SalesListJson/", {
+                "startDate": "01/04/2025", "endDate": "30/04/2025", "staffID": "All",
+                "draw": 1, "start": 0, "length": 100,
+            })
+        return len(response.json()["data"]), len(queries)
+
+    def test_page_draw_query_count_does_not_grow_with_rows(self):
+        self.add_sales(1)
+        self.draw()  # resolves and stores the tenant context in the session
+        rows, single_row = self.draw()
+        self.assertEqual(rows, 1)
+        self.add_sales(49)
+        rows, fifty_rows = self.draw()
+        self.assertEqual(rows, 50)
+        self.assertEqual(single_row, fifty_rows)
+        self.assertLessEqual(fifty_rows, 5)
+
+
+class KeysetPaginationTest(OwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        # ties on the sort column and NULLs, the cases the id tiebreak has to get right
+        Sales.objects.bulk_create([
+            Sales(ownerID=self.owner, customerID=self.customer, saleDate=date(2025, 4, 1 + i % 3), totalAmount=i,
+                  invoiceNumber=None if i % 5 == 0 else f"S{i % 4}")
+            for i in range(23)
+        ])
+
+    def pages(self, column, direction, keyset):
+        """totalAmount of every row, following the pages to the end."""
+        params = {
+            "draw": 1, "length": 5, "order[0][column]": column, "order[0][dir]": direction,
+            "startDate": "01/04/2025", "endDate": "30/04/2025", "staffID": "All",
+        }
+        seen, start, cursor = [], 0, None
+        while True:
+            page = dict(params, start=start)
+            if keyset:
+                page["keyset"] = 1
+                if cursor:
+                    page["cursor"] = cursor
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get("/api/SalesListJson/", page).json()
+            if cursor:
+                self.assertFalse([q for q in queries if "OFFSET" in q["sql"]])
+            seen += [float(row[3]) for row in response["data"]]
+            if len(response["data"]) < 5 or (keyset and "nextCursor" not in response):
+                return seen
+            start += 5
+            cursor = response.get("nextCursor")
+
+    def test_cursor_pages_cover_the_same_rows_as_offset_pages(self):
+        self.assertEqual(sorted(self.pages(1, "desc", keyset=False)), list(range(23)))
+        self.assertEqual(sorted(self.pages(1, "desc", keyset=True)), list(range(23)))
+
+    def test_every_row_once_in_both_directions_with_nulls(self):
+        for direction in ("asc", "desc"):
+            self.assertEqual(sorted(self.pages(0, direction, keyset=True)), list(range(23)))
+
+
+class DatatableCountTest(OwnerTestCase):
+    def draw(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/CustomerListJson/", {"draw": 1, "start": 0, "length": 10, **params}).json()
+        counts = [q["sql"] for q in queries if "COUNT(" in q["sql"]]
+        return response, counts
+
+    def test_total_is_counted_once_without_the_balance_join(self):
+        response, counts = self.draw()
+        self.assertEqual((response["recordsTotal"], response["recordsFiltered"]), (1, 1))
+        self.assertEqual(len(counts), 1)
+        self.assertNotIn("customerbalance", counts[0])
+
+        response, counts = self.draw()
+        self.assertEqual((response["recordsTotal"], counts), (1, []))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Customer.objects.create(ownerID=self.owner, locationID=self.location, name="Another")
+        response, counts = self.draw(**{"search[value]": "another"})
+        self.assertEqual((response["recordsTotal"], response["recordsFiltered"]), (2, 1))
+        self.assertEqual(len(counts), 2)
+
+
+class CachedListInvalidationTest(OwnerTestCase):
+    def customer_list(self):
+        return self.client.get("/cached_api/customer_list_api_cached/").json()["data"]
+
+    def test_location_rename_expires_customer_list(self):
+        self.assertEqual(self.customer_list()[0]["DisplayDetail"], "Customer - Market")
+        self.location.name = "Bazaar"
+        self.location.save()
+        self.assertEqual(self.customer_list()[0]["DisplayDetail"], "Customer - Bazaar")
+
+    def test_hit_serves_gzipped_body_without_queries(self):
+        self.customer_list()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/cached_api/customer_list_api_cached/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.content))["data"][0]["Name"], "Customer")
+        # only the session and user lookups of the request itself
+        self.assertFalse([q for q in queries if "wmaApp_customer" in q["sql"]])
+
+
+class DeltaSyncTest(OwnerTestCase):
+    def customer_changes(self, since):
+        return self.client.get("/cached_api/customer_list_api_cached/", {"since": since}).json()["data"]
+
+    def test_only_changes_after_token_are_returned(self):
+        first = self.customer_changes("0")
+        self.assertEqual([row["Name"] for row in first["changed"]], ["Customer"])
+        # push the existing rows out of the overlap window
+        Customer.objects.update(lastUpdatedOn=datetime.now() - timedelta(hours=1))
+        Location.objects.update(lastUpdatedOn=datetime.now() - timedelta(hours=1))
+        self.assertEqual(self.customer_changes(first["token"])["changed"], [])
+
+        self.customer.isDeleted = True
+        self.customer.save()
+        delta = self.customer_changes(first["token"])
+        self.assertEqual((delta["changed"], delta["deleted"]), ([], [self.customer.pk]))
+
+    def test_location_rename_resends_its_customers(self):
+        token = self.customer_changes("0")["token"]
+        Customer.objects.update(lastUpdatedOn=datetime.now() - timedelta(hours=1))
+        self.location.name = "Bazaar"
+        self.location.save()
+        self.assertEqual(self.customer_changes(token)["changed"][0]["DisplayDetail"], "Customer - Bazaar")
+
+    def test_bad_token_is_rejected(self):
+        response = self.client.get("/cached_api/customer_list_api_cached/", {"since": "yesterday"}).json()
+        self.assertFalse(response["success"])
+
+
+class CustomerImportTest(OwnerTestCase):
+    def upload(self, rows):
+        body = "Name,Location,Address,Phone\n" + "".join(f"{row}\n" for row in rows)
+        file = SimpleUploadedFile("customers.csv", body.encode("utf-8"), content_type="text/csv")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/upload_customer_csv_api/", {"file": file, "importID": "t1"})
+        return response.json(), len(queries)
+
+    def test_rows_are_created_skipped_and_reported(self):
+        self.customer.address = "Road 1"
+        self.customer.save()
+        response, _ = self.upload([
+            "customer,market,road 1,",
+            "Ravi,Market,Road 2,98765",
+            "Ravi,Market,Road 2,98765",
+            ",Market,Road 3,",
+            "Meena,Hill Top,Road 4,",
+        ])
+        self.assertTrue(response["success"])
+        data = response["data"]
+        self.assertEqual((data["created"], data["duplicates"], data["errorCount"]), (2, 2, 1))
+        self.assertEqual(data["errors"], [{"line": 5, "error": "Name is required"}])
+
+        ravi = Customer.objects.get(name="Ravi")
+        self.assertEqual(ravi.locationID, self.location)
+        self.assertTrue(ravi.customerId.startswith("CID"))
+        self.assertTrue(CustomerBalance.objects.filter(customerID=ravi).exists())
+        self.assertTrue(SearchToken.objects.filter(modelName="Customer", objectID=ravi.pk, token="ravi").exists())
+        self.assertTrue(Location.objects.filter(ownerID=self.owner, name="Hill Top").exists())
+        self.assertEqual(self.client.get("/api/customer_import_progress_api/", {"importID": "t1"}).json()["data"]["percent"], 100)
+
+    def test_query_count_does_not_grow_per_row(self):
+        self.upload(["Warm up,Market,Road,"])  # resolves and stores the tenant context in the session
+        _, ten_rows = self.upload([f"Ten {i},Market,Road,{i}" for i in range(10)])
+        _, hundred_rows = self.upload([f"Hundred {i},Market,Road,{i}" for i in range(100)])
+        # only the backend's bulk insert batching adds a few statements
+        self.assertLessEqual(hundred_rows, ten_rows + 5)
+        self.assertEqual(Customer.objects.filter(customerId__isnull=False).values("customerId").distinct().count(), 111)
+
+
+class ReportExportTest(OwnerTestCase):
+    def export(self, export_format):
+        Payment.objects.create(ownerID=self.owner, customerID=self.customer, paymentAmount=150, paymentDate=date(2025, 4, 1))
+        Payment.objects.create(ownerID=self.owner, customerID=self.customer, paymentAmount=50, paymentDate=date(2025, 4, 2))
+        # outside the range
+        Payment.objects.create(ownerID=self.owner, customerID=self.customer, paymentAmount=99, paymentDate=date(2025, 4, 3))
+        response = self.client.get("/api/export_report/", {
+            "startDate": "01/04/2025", "endDate": "02/04/2025", "location": "All",
+            "reportType": "Collection", "format": export_format,
+        })
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content)
+
+    def test_csv_has_rows_and_totals(self):
+        rows = list(csv.reader(io.StringIO(self.export("csv").decode("utf-8-sig"))))
+        self.assertEqual(rows[0][:2], ["CustomerName", "Amount"])
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[-1][:2], ["Total (2 rows)", "200.0"])
+
+    def test_xlsx_is_a_workbook(self):
+        workbook = zipfile.ZipFile(io.BytesIO(self.export("xlsx")))
+        self.assertIsNone(workbook.testzip())
+        sheet = workbook.read("xl/worksheets/sheet1.xml").decode()
+        self.assertEqual(sheet.count("<row>"), 5)
+        self.assertIn("<c><v>200.0</v></c>", sheet)
+
+
+def write_fake_pdf(reportType, startDate, endDate, location, owner_id, target):
+    with open(target, "wb") as file:
+        file.write(b"%PDF-1.4")
+
+
+class ReportJobTest(OwnerTestCase):
+    params = {"startDate": "01/04/2025", "endDate": "30/04/2025", "location": "All", "reportType": "Sales"}
+
+    def setUp(self):
+        super().setUp()
+        cache_root = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_root.cleanup)
+        settings_override = override_settings(REPORT_CACHE_ROOT=cache_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def queue(self):
+        return self.client.post("/api/queue_report_pdf/", self.params).json()["data"]
+
+    def run_next_job(self, render=write_fake_pdf):
+        with mock.patch("utils.report_jobs.render_report_pdf", side_effect=render):
+            return run_job(claim_next_job())
+
+    def test_waiting_job_is_reused_for_the_same_data(self):
+        first = self.queue()
+        self.assertEqual(first["status"], PENDING)
+        self.assertEqual(self.queue()["jobID"], first["jobID"])
+        Sales.objects.create(ownerID=self.owner, customerID=self.customer, saleDate=date(2025, 4, 1), totalAmount=50)
+        self.assertNotEqual(self.queue()["jobID"], first["jobID"])
+
+    def test_finished_pdf_is_reused_without_rendering(self):
+        self.queue()
+        job = self.run_next_job()
+        self.assertEqual(job.status, DONE)
+        with mock.patch("utils.report_jobs.render_report_pdf") as render:
+            again = self.queue()
+        render.assert_not_called()
+        self.assertEqual(again["status"], DONE)
+        self.assertEqual(ReportJob.objects.get(pk=again["jobID"]).filePath, job.filePath)
+        response = self.client.get("/api/download_report_pdf/", {"id": again["jobID"]})
+        self.assertEqual(b"".join(response.streaming_content), b"%PDF-1.4")
+
+    def test_job_is_claimed_once(self):
+        self.queue()
+        self.assertIsNotNone(claim_next_job())
+        self.assertIsNone(claim_next_job())
+
+    def test_failed_render_is_reported(self):
+        job_id = self.queue()["jobID"]
+        self.run_next_job(render=OSError("disk full"))
+        data = self.client.get("/api/report_job_status/", {"id": job_id}).json()["data"]
+        self.assertEqual((data["status"], data["error"]), (FAILED, "disk full"))
+        self.assertNotIn("downloadUrl", data)
+
+    def test_other_owners_job_is_not_found(self):
+        job_id = self.queue()["jobID"]
+        self.run_next_job()
+        other_user = User.objects.create_user("other", password="password")
+        Group.objects.get(name="Owner").user_set.add(other_user)
+        Owner.objects.create(userID=other_user, name="Other")
+        self.client.force_login(other_user)
+        self.assertEqual(self.client.get("/api/report_job_status/", {"id": job_id}).status_code, 404)
+        self.assertEqual(self.client.get("/api/download_report_pdf/", {"id": job_id}).status_code, 404)
+
+
+class CustomerSummaryTest(OwnerTestCase):
+    def test_range_totals_per_customer(self):
+        other = Customer.objects.create(ownerID=self.owner, locationID=self.location, name="Another")
+        Customer.objects.create(ownerID=self.owner, locationID=self.location, name="Idle")
+        Sales.objects.create(ownerID=self.owner, customerID=self.customer, saleDate=date(2025, 4, 1), totalAmountAfterTax=100)
+        Sales.objects.create(ownerID=self.owner, customerID=self.customer, saleDate=date(2025, 4, 2), totalAmountAfterTax=50)
+        Payment.objects.create(ownerID=self.owner, customerID=other, paymentDate=date(2025, 4, 2), paymentAmount=30)
+        Sales.objects.create(ownerID=self.owner, customerID=other, saleDate=date(2025, 4, 3), totalAmountAfterTax=999)
+
+        with CaptureQueriesContext(connection) as queries:
+            rows, totals = customer_summary(date(2025, 4, 1), date(2025, 4, 2), "All", self.owner.pk)
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(
+            [(row["name"], row["sales_amount"], row["payment_amount"], row["due_amount"]) for row in rows],
+            [("Another", 0, 30, -30), ("Customer", 150, 0, 150)],
+        )
+        self.assertEqual(totals, {"sales_amount": 150, "payment_amount": 30, "due_amount": 120})
+
+
+class ReportEngineTest(OwnerTestCase):
+    def test_json_rows_and_totals_in_one_aggregate(self):
+        Sales.objects.create(ownerID=self.owner, customerID=self.customer, saleDate=date(2025, 4, 1), totalAmountAfterTax=100, invoiceNumber="S1")
+        Sales.objects.create(ownerID=self.owner, customerID=self.customer, saleDate=date(2025, 4, 2), totalAmountAfterTax=50, invoiceNumber="S2")
+        # the day after the range is not part of it
+        Sales.objects.create(ownerID=self.owner, customerID=self.customer, saleDate=date(2025, 4, 3), totalAmountAfterTax=999)
+        params = {"startDate": "01/04/2025", "endDate": "02/04/2025", "location": str(self.location.pk), "reportType": "Sales"}
+        self.client.get("/api/report_json/", params)  # resolves and stores the tenant context in the session
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get("/api/report_json/", params).json()["data"]
+        report_queries = [q["sql"] for q in queries if "wmaApp_sales" in q["sql"]]
+        self.assertEqual(len(report_queries), 2)
+        self.assertEqual(data["totals"]["totalAmountAfterTax"], 150)
+        self.assertEqual([(row["invoiceNumber"], row["location"]) for row in data["rows"]], [("S1", "Market"), ("S2", "Market")])
+
+
+class DashboardCacheTest(OwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        driver_user = User.objects.create_user("driver", password="password")
+        Group.objects.get_or_create(name="Driver")[0].user_set.add(driver_user)
+        self.driver = StaffUser.objects.create(ownerID=self.owner, userID=driver_user, name="Driver")
+
+    def sell(self, amount, staff):
+        with self.captureOnCommitCallbacks(execute=True):
+            sale = Sales.objects.create(
+                ownerID=self.owner, customerID=self.customer, addedByID=staff,
+                saleDate=date.today(), totalAmount=amount, totalAmountAfterTax=amount,
+            )
+            apply_summary_change(None, summary_values(sale))
+
+    def dashboard(self, user):
+        self.client.force_login(user)
+        return self.client.get("/dashboard/").context
+
+    def test_owner_and_driver_get_their_own_figures(self):
+        self.sell(100, self.driver)
+        self.sell(40, None)
+        self.assertEqual(self.dashboard(self.user)["total_sales"], 140)
+        self.assertEqual(self.dashboard(self.driver.userID)["total_sales"], 100)
+        self.assertEqual(self.dashboard(self.driver.userID)["total_customers"], 0)
+
+    def test_cached_until_a_sale_commits(self):
+        self.assertEqual(self.dashboard(self.user)["total_sales"], 0)
+        with CaptureQueriesContext(connection) as queries:
+            self.dashboard(self.user)
+        self.assertFalse([q for q in queries if "wmaApp_dailysummary" in q["sql"]])
+        self.sell(75, None)
+        self.assertEqual(self.dashboard(self.user)["total_sales"], 75)
+
+
+class LedgerAppendTest(OwnerTestCase):
+    def test_entries_chain_onto_the_balance_head(self):
+        append_ledger_entries(self.owner.pk, None, self.customer.pk, [(CREDIT, 100, "New Sales")])
+        with CaptureQueriesContext(connection) as queries:
+            ledgers = append_ledger_entries(
+                self.owner.pk, None, self.customer.pk,
+                [(CREDIT, 50, "New Sales"), (DEBIT, 120, "Payment Received")],
+            )
+        # lock the head, insert the entries, update the head
+        statements = [q["sql"] for q in queries if "SAVEPOINT" not in q["sql"]]
+        self.assertEqual(len(statements), 3)
+        self.assertTrue(all(ledger.pk for ledger in ledgers))
+        self.assertEqual([(l.balanceAtDate, l.balance) for l in ledgers], [(100, 150), (150, 30)])
+        head = CustomerBalance.objects.get(customerID=self.customer)
+        self.assertEqual((head.totalCredit, head.totalDebit, head.balance), (150, 120, 30))
+
+    def test_appended_entries_are_searchable_and_counted(self):
+        url = "/api/CustomerLedgerListJson/"
+        params = {"customer_id": self.customer.pk, "draw": 1, "start": 0, "length": 10}
+        self.assertEqual(self.client.get(url, params).json()["recordsTotal"], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            append_ledger_entries(self.owner.pk, None, self.customer.pk, [(DEBIT, 10, "Payment Received")])
+        self.assertEqual(self.client.get(url, params).json()["recordsTotal"], 1)
+        found = self.client.get(url, {**params, "search[value]": "payment"}).json()
+        self.assertEqual(found["recordsFiltered"], 1)
+
+    def test_deleted_entries_are_not_chained_onto(self):
+        append_ledger_entries(self.owner.pk, None, self.customer.pk, [(CREDIT, 100, "New Sales")])
+        mistake, = append_ledger_entries(self.owner.pk, None, self.customer.pk, [(DEBIT, 40, "Payment Received")])
+        mistake.isDeleted = True
+        mistake.save()
+        # entries deleted outside the write path are taken out of the chain by a rebalance
+        rebalance_customer_ledger(self.customer.pk)
+        ledger, = append_ledger_entries(self.owner.pk, None, self.customer.pk, [(DEBIT, 10, "Payment Received")])
+        self.assertEqual((ledger.balanceAtDate, ledger.balance), (100, 90))
+
+    def test_missing_head_is_seeded_from_the_ledger(self):
+        CustomerLedger.objects.create(
+            ownerID=self.owner, customerID=self.customer, credit=100, isCredit=True, balanceAtDate=0, balance=100,
+        )
+        CustomerLedger.objects.create(
+            ownerID=self.owner, customerID=self.customer, debit=30, balanceAtDate=100, balance=70,
+        )
+        CustomerLedger.objects.create(
+            ownerID=self.owner, customerID=self.customer, debit=50, balanceAtDate=70, balance=20, isDeleted=True,
+        )
+        self.assertFalse(CustomerBalance.objects.filter(customerID=self.customer).exists())
+        ledger, = append_ledger_entries(self.owner.pk, None, self.customer.pk, [(DEBIT, 10, "Payment Received")])
+        self.assertEqual((ledger.balanceAtDate, ledger.balance), (70, 60))
+        head = CustomerBalance.objects.get(customerID=self.customer)
+        self.assertEqual((head.totalCredit, head.totalDebit, head.balance), (100, 40, 60))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class LedgerConcurrencyTest(TransactionTestCase):
+    workers = 8
+    appends = 10
+
+    def setUp(self):
+        self.owner = Owner.objects.create(name="Owner")
+        self.customer = Customer.objects.create(ownerID=self.owner, name="Customer")
+
+    def append_many(self, errors):
+        try:
+            for _ in range(self.appends):
+                while True:
+                    try:
+                        append_ledger_entries(self.owner.pk, None, self.customer.pk, [(CREDIT, 1, "New Sales")])
+                        break
+                    except OperationalError as e:
+                        # SQLite has no row locks, a writer that finds the database busy tries again
+                        if "locked" not in str(e):
+                            raise
+                        time.sleep(0.01)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connections.close_all()
+
+    def test_parallel_appends_lose_no_balance(self):
+        errors = []
+        threads = [threading.Thread(target=self.append_many, args=(errors,)) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        total = self.workers * self.appends
+        self.assertEqual(CustomerBalance.objects.get(customerID=self.customer).balance, total)
+        chain = list(CustomerLedger.objects.filter(customerID=self.customer).order_by("id").values_list(
+            "balanceAtDate", "balance"
+        ))
+        self.assertEqual(chain, [(float(i), float(i + 1)) for i in range(total)])
+
+
+class LedgerReversalTest(OwnerTestCase):
+    def balance(self):
+        return CustomerBalance.objects.get(customerID=self.customer).balance
+
+    def test_deleted_sale_is_reversed(self):
+        data = dict(SalesLineItemTest.sale_data(self, 2), amountCollected="30")
+        self.client.post("/api/add_sales_api/", data)
+        self.assertEqual(self.balance(), 70)
+        sale = Sales.objects.get()
+        self.client.post("/api/delete_sales_api/", {"id": sale.pk})
+        self.assertEqual(self.balance(), -30)
+        last = CustomerLedger.objects.order_by("id").last()
+        self.assertEqual((last.debit, last.balanceAtDate, last.balance), (100, 70, -30))
+        self.assertEqual(last.remark, f"Reversal: Sales {sale.invoiceNumber} deleted")
+
+    def test_payment_moved_to_another_customer(self):
+        other = Customer.objects.create(ownerID=self.owner, locationID=self.location, name="Other")
+        self.client.post("/api/add_payment_api/", {"customer": self.customer.pk, "amount": "40", "remark": "cash"})
+        payment = Payment.objects.get()
+        data = {"id": payment.pk, "customer": other.pk, "amount": "25", "remark": "cash"}
+        self.client.post("/api/update_payment_api/", data)
+        self.assertEqual(self.balance(), 0)
+        self.assertEqual(CustomerBalance.objects.get(customerID=other).balance, -25)
+
+    def test_rebalance_from_an_entry_is_one_update(self):
+        append_ledger_entries(
+            self.owner.pk, None, self.customer.pk, [(CREDIT, amount, "New Sales") for amount in (10, 20, 30, 40)]
+        )
+        ids = list(CustomerLedger.objects.order_by("id").values_list("id", flat=True))
+        # an entry deleted without a reversal leaves every later balance wrong
+        CustomerLedger.objects.filter(pk=ids[1]).update(isDeleted=True)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(rebalance_customer_ledger(self.customer.pk, from_id=ids[1]), 2)
+        updates = [q for q in queries if q["sql"].startswith("UPDATE") and "customerledger" in q["sql"]]
+        self.assertEqual(len(updates), 1)
+        chain = CustomerLedger.objects.filter(isDeleted=False).order_by("id").values_list("balanceAtDate", "balance")
+        self.assertEqual(list(chain), [(0, 10), (10, 40), (40, 80)])
+        head = CustomerBalance.objects.get(customerID=self.customer)
+        self.assertEqual((head.totalCredit, head.balance), (80, 80))
+
+    def test_rebalance_every_customer_of_the_owner(self):
+        other = Customer.objects.create(ownerID=self.owner, locationID=self.location, name="Other")
+        for customer in (self.customer, other):
+            append_ledger_entries(self.owner.pk, None, customer.pk, [(CREDIT, 10, ""), (DEBIT, 4, "")])
+        CustomerLedger.objects.update(balance=0, balanceAtDate=0)
+        self.assertEqual(rebalance_owner_ledgers(self.owner.pk, workers=1, chunk_size=1), (4, []))
+        self.assertEqual(set(CustomerLedger.objects.values_list("balance", flat=True)), {10, 6})
+
+    def test_rebalance_expires_the_cached_counts_and_reports_failures(self):
+        url = "/api/CustomerLedgerListJson/"
+        params = {"customer_id": self.customer.pk, "draw": 1, "start": 0, "length": 10}
+        append_ledger_entries(self.owner.pk, None, self.customer.pk, [(CREDIT, 10, ""), (DEBIT, 4, "")])
+        self.assertEqual(self.client.get(url, params).json()["recordsTotal"], 2)
+        CustomerLedger.objects.filter(debit=4).update(isDeleted=True)
+        rebalance_customer_ledger(self.customer.pk)
+        self.assertEqual(self.client.get(url, params).json()["recordsTotal"], 1)
+
+        with mock.patch("utils.ledger_rebalance.rebalance_customer_ledger", side_effect=OperationalError("locked")):
+            self.assertEqual(rebalance_owner_ledgers(self.owner.pk, workers=1), (0, [self.customer.pk]))
+            with self.assertRaises(CommandError):
+                call_command("rebalance_customer_ledgers", owner=self.owner.pk, workers=1, stdout=io.StringIO())
+
+
+class LedgerCheckpointTest(OwnerTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = Customer.objects.create(ownerID=self.owner, locationID=self.location, name="Other")
+        for day, customer, entries in [
+            (date(2025, 1, 10), self.customer, [(CREDIT, 100, "")]),
+            (date(2025, 1, 31), self.customer, [(DEBIT, 30, "")]),
+            (date(2025, 3, 5), self.customer, [(CREDIT, 50, "")]),
+            (date(2025, 3, 6), self.other, [(CREDIT, 20, "")]),
+            (date(2025, 4, 2), self.customer, [(DEBIT, 5, "")]),
+        ]:
+            append_ledger_entries(self.owner.pk, None, customer.pk, entries, entry_date=day)
+
+    def summed(self, customer, as_of):
+        totals = CustomerLedger.objects.filter(customerID=customer, isDeleted=False, addedDate__lte=as_of).aggregate(
+            credit=Sum("credit"), debit=Sum("debit")
+        )
+        return (totals["credit"] or 0) - (totals["debit"] or 0)
+
+    def test_monthly_checkpoints_carry_forward(self):
+        self.assertEqual(write_checkpoints(self.owner.pk, until=date(2025, 3, 31)), 4)
+        self.assertEqual(
+            list(LedgerCheckpoint.objects.order_by("customerID", "periodEnd").values_list("customerID", "periodEnd", "balance")),
+            [
+                (self.customer.pk, date(2025, 1, 31), 70),
+                (self.customer.pk, date(2025, 2, 28), 70),
+                (self.customer.pk, date(2025, 3, 31), 120),
+                (self.other.pk, date(2025, 3, 31), 20),
+            ],
+        )
+        # the next run only adds the new month
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(write_checkpoints(self.owner.pk, until=date(2025, 4, 30)), 2)
+        ledger_reads = [q["sql"] for q in queries if "wmaApp_customerledger" in q["sql"]]
+        self.assertEqual(len(ledger_reads), 1)
+        # entries after the last checkpoint only
+        self.assertIn("2025-03-31", ledger_reads[0])
+
+    def test_balance_as_of_matches_the_history(self):
+        write_checkpoints(self.owner.pk, until=date(2025, 3, 31))
+        for as_of in (date(2024, 12, 31), date(2025, 1, 10), date(2025, 2, 28), date(2025, 3, 5), date(2025, 4, 30)):
+            for customer in (self.customer, self.other):
+                self.assertEqual(balance_as_of(self.owner.pk, customer.pk, as_of), self.summed(customer, as_of), as_of)
+        with CaptureQueriesContext(connection) as queries:
+            balance_as_of(self.owner.pk, self.customer.pk, date(2025, 4, 30))
+        self.assertEqual(len(queries), 3)
+
+    def test_back_dated_entries_update_the_checkpoints(self):
+        write_checkpoints(self.owner.pk, until=date(2025, 3, 31))
+        append_ledger_entries(self.owner.pk, None, self.customer.pk, [(DEBIT, 10, "")], entry_date=date(2025, 2, 1))
+        late = Customer.objects.create(ownerID=self.owner, locationID=self.location, name="Late")
+        append_ledger_entries(self.owner.pk, None, late.pk, [(CREDIT, 7, "")], entry_date=date(2025, 2, 1))
+        for customer in (self.customer, late):
+            for as_of in (date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31)):
+                self.assertEqual(balance_as_of(self.owner.pk, customer.pk, as_of), self.summed(customer, as_of), as_of)
+
+    def test_back_dated_entry_before_the_first_checkpoint(self):
+        write_checkpoints(self.owner.pk, until=date(2025, 3, 31))
+        # the other customer's checkpoints start at March
+        append_ledger_entries(self.owner.pk, None, self.other.pk, [(CREDIT, 9, "")], entry_date=date(2025, 1, 15))
+        self.assertEqual(
+            list(LedgerCheckpoint.objects.filter(customerID=self.other).order_by("periodEnd").values_list("balance", flat=True)),
+            [9, 9, 29],
+        )
+        for as_of in (date(2025, 1, 31), date(2025, 2, 15), date(2025, 3, 31)):
+            self.assertEqual(balance_as_of(self.owner.pk, self.other.pk, as_of), self.summed(self.other, as_of), as_of)
+
+    def test_back_dated_payment_into_a_closed_month(self):
+        write_checkpoints(self.owner.pk, until=date(2025, 3, 31))
+        response = self.client.post("/api/add_payment_api/", {
+            "customer": self.customer.pk, "amount": "10", "remark": "cash", "paymentDate": "15/02/2025",
+        })
+        self.assertTrue(response.json()["success"])
+        payment = Payment.objects.get(customerID=self.customer)
+        self.assertEqual(CustomerLedger.objects.order_by("-id").first().addedDate, date(2025, 2, 15))
+        checkpoints = LedgerCheckpoint.objects.filter(customerID=self.customer).order_by("periodEnd")
+        self.assertEqual(list(checkpoints.values_list("balance", flat=True)), [70, 60, 110])
+
+        # the reversal of a deletion is dated like the payment
+        self.client.post("/api/delete_payment_api/", {"id": payment.pk})
+        self.assertEqual(list(checkpoints.values_list("balance", flat=True)), [70, 70, 120])
+        for as_of in (date(2025, 2, 14), date(2025, 2, 28), date(2025, 4, 30)):
+            self.assertEqual(balance_as_of(self.owner.pk, self.customer.pk, as_of), self.summed(self.customer, as_of), as_of)
+
+    def test_statement_balances_on_the_ledger_page(self):
+        write_checkpoints(self.owner.pk, until=date(2025, 3, 31))
+        response = self.client.get(
+            f"/customer_ledger/{self.customer.pk}/", {"startDate": "01/02/2025", "endDate": "31/03/2025"}
+        )
+        self.assertEqual((response.context["opening"], response.context["closing"]), (70, 120))
+        data = self.client.get(
+            "/api/customer_balance_as_of_api/", {"customerID": self.customer.pk, "date": "02/04/2025"}
+        ).json()["data"]
+        self.assertEqual(data["balance"], 115)
+
+
+# the primary stands in for the replica: only the router's choice of alias is checked
+@override_settings(CACHES=LOCMEM_CACHE, REPLICA_DATABASE="default", REPLICA_PIN_SECONDS=5)
+class ReplicaRouterTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("owner", password="password")
+        Group.objects.get_or_create(name="Owner")[0].user_set.add(self.user)
+        self.owner = Owner.objects.create(userID=self.user, name="Owner")
+        self.client.force_login(self.user)
+
+    def routed_alias(self):
+        routed = []
+
+        @replica_reads
+        def view(request):
+            routed.append(ReplicaRouter().db_for_read(Customer))
+            with transaction.atomic():
+                routed.append(ReplicaRouter().db_for_read(Customer))
+            return None
+
+        request = RequestFactory().get("/")
+        request.user = self.user
+        view(request)
+        return routed
+
+    def test_reads_of_marked_views_only(self):
+        self.assertIsNone(ReplicaRouter().db_for_read(Customer))
+        # reads inside a transaction stay with its writes
+        self.assertEqual(self.routed_alias(), ["default", None])
+        self.assertIsNone(ReplicaRouter().db_for_read(Customer))
+        self.assertEqual(ReplicaRouter().db_for_write(Customer), "default")
+
+    def test_user_who_wrote_is_pinned_to_the_primary(self):
+        self.client.post("/api/add_location_api/", {"name": "Market"})
+        self.assertEqual(self.routed_alias(), [None, None])
+        cache.clear()
+        self.assertEqual(self.routed_alias(), ["default", None])
+        with read_from_replica():
+            # background work has no user to pin
+            self.assertEqual(ReplicaRouter().db_for_read(Customer), "default")
+
+
+# the activation app is not in INSTALLED_APPS, so its table is created for these tests only
+@modify_settings(INSTALLED_APPS={"append": "activation"})
+class ActivationValidityTest(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from activation.models import Validity
+        with connection.schema_editor() as editor:
+            editor.create_model(Validity)
+
+    @classmethod
+    def tearDownClass(cls):
+        from activation.models import Validity
+        with connection.schema_editor() as editor:
+            editor.delete_model(Validity)
+        super().tearDownClass()
+
+    def setUp(self):
+        from activation import validity
+        from activation.models import Validity
+        self.validity, self.Validity = validity, Validity
+        validity.invalidate_validity()
+        self.addCleanup(validity.invalidate_validity)
+
+    def activate(self, expiry):
+        return self.Validity.objects.create(activationDate=date(2025, 1, 1), expiryDate=expiry)
+
+    def test_window_is_read_once_per_refresh(self):
+        self.activate(date.today() + timedelta(days=9))
+        self.assertTrue(self.validity.is_valid())
+        with self.assertNumQueries(0):
+            self.assertTrue(self.validity.is_valid())
+            self.assertEqual(self.validity.days_remaining(), 10)
+        # a change made by another process (no signal here) shows once the copy is older than REFRESH_AFTER
+        self.Validity.objects.update(expiryDate=date.today() - timedelta(days=1))
+        self.assertTrue(self.validity.is_valid())
+        later = time.monotonic() + self.validity.REFRESH_AFTER + 1
+        with mock.patch("activation.validity.time.monotonic", return_value=later):
+            self.assertFalse(self.validity.is_valid())
+
+    def test_save_expires_the_window(self):
+        window = self.activate(date.today())
+        self.assertTrue(self.validity.is_valid())
+        window.expiryDate = date.today() - timedelta(days=1)
+        window.save()
+        self.assertFalse(self.validity.is_valid())
+        self.assertEqual(self.validity.days_remaining(), 0)
+
+    def test_never_activated_install_is_redirected(self):
+        from activation.views import is_activated
+        view = is_activated()(lambda request: HttpResponse("ok"))
+        request = RequestFactory().get("/")
+        self.assertIsNone(self.validity.days_remaining())
+        response = view(request)
+        self.assertEqual((response.status_code, response["Location"]), (302, "/activate/"))
+        self.activate(date.today())
+        self.assertEqual(view(request).status_code, 200)
+
+
+class DeferredQueueHandlerTest(TestCase):
+    def test_queued_record_is_a_copy_without_frames(self):
+        try:
+            raise ValueError("bad amount")
+        except ValueError:
+            record = logging.getLogger("test").makeRecord(
+                "test", logging.ERROR, __file__, 1, "Sales %s failed", (Customer(name="Ramesh"),), sys.exc_info()
+            )
+        queued = DeferredQueueHandler(queue.Queue()).prepare(record)
+        self.assertIsNot(queued, record)
+        self.assertEqual((record.msg, record.exc_info[0]), ("Sales %s failed", ValueError))
+        self.assertEqual((queued.msg, queued.exc_info), ("Sales Ramesh failed", None))
+        formatted = logging.Formatter().format(queued)
+        self.assertIn("ValueError: bad amount", formatted)
@@ -1,8 +1,6 @@
 import datetime
 import json
 
-from django.utils import timezone
-
 from django.contrib.auth import logout, authenticate, login
 from django.db import transaction
 from django.db.models import Sum
@@ -11,11 +9,15 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.csrf import csrf_exempt
 
 from utils.check_group_with_authentication import check_groups
-from utils.get_user_id_detail import get_owner_id
+from utils.db_router import replica_reads
+from utils.ledger_checkpoints import opening_closing
 from utils.logger import logger
+from utils.versioned_cache import cached_value
 from .models import *
 # Create your views here.
-from django.views.decorators.cache import cache_page
+
+# a day's dashboard is rebuilt on the next visit after any write that changes it (see signals)
+DASHBOARD_CACHE_TIMEOUT = 60 * 60 * 24
 
 @csrf_exempt
 @transaction.atomic
@@ -73,12 +75,7 @@ def post_login(request):
 
         if user is not None:
             login(request, user)
-            user_groups = request.user.groups.values_list("name", flat=True)
-            if (
-                "Owner" in user_groups
-                or "Driver" in user_groups
-                or "Manager" in user_groups
-            ):
+            if request.tenant.has_group("Owner", "Driver", "Manager"):
                 return JsonResponse(
                     {"message": "success", "data": "/home/"}, safe=False
                 )
@@ -88,11 +85,9 @@ def post_login(request):
 
 def homepage(request):
     if request.user.is_authenticated:
-        if "Owner" in request.user.groups.values_list(
-            "name", flat=True
-        ) or "Manager" in request.user.groups.values_list("name", flat=True):
+        if request.tenant.has_group("Owner", "Manager"):
             return redirect("wmaApp:dashboard")
-        elif "Driver" in request.user.groups.values_list("name", flat=True):
+        elif request.tenant.has_group("Driver"):
             return redirect("wmaApp:dashboard")
         else:
             return redirect("wmaApp:login_page")
@@ -100,43 +95,47 @@ def homepage(request):
         return redirect("wmaApp:login_page")
 
 
-@cache_page(60 * 5)  # Cache for 5 minutes
 @check_groups("Owner", "Manager", "Admin", "Driver")
+@replica_reads
 def dashboard(request):
     logger.info("Dashboard called")
-    owner_id = get_owner_id(request)
-    today = datetime.datetime.today()
-    if "Driver" not in request.user.groups.values_list("name", flat=True):
-        payments_today = (
-            Payment.objects.filter(
-                paymentDate=today, isDeleted=False, ownerID_id=owner_id
-            ).aggregate(total=Sum("paymentAmount"))["total"]
-            or 0
-        )
-        jars_in = (
-            JarCounter.objects.filter(
-                date=today, ownerID_id=owner_id, isDeleted=False
-            ).aggregate(total=Sum("inJar"))["total"]
-            or 0
-        )
-        jars_out = (
-            JarCounter.objects.filter(
-                date=today, ownerID_id=owner_id, isDeleted=False
-            ).aggregate(total=Sum("outJar"))["total"]
-            or 0
-        )
-        total_expense = (
-            Expense.objects.filter(
-                isDeleted=False, ownerID_id=owner_id, expenseDate=today
-            ).aggregate(total=Sum("expenseAmount"))["total"]
-            or 0
-        )
-        total_sales = (
-            Sales.objects.filter(
-                isDeleted=False, ownerID_id=owner_id, saleDate=today
-            ).aggregate(total=Sum("totalAmount"))["total"]
-            or 0
+    owner_id = request.tenant.owner_id
+    # drivers see their own day, everyone else the whole business
+    staff_id = request.tenant.staff_id if request.tenant.has_group("Driver") else None
+    today = datetime.date.today()
+    key = f"Dashboard{owner_id}:{staff_id or 'all'}:{today.isoformat()}"
+    context = cached_value(
+        "Dashboard", owner_id, key, lambda: dashboard_context(owner_id, staff_id, today),
+        timeout=DASHBOARD_CACHE_TIMEOUT,
+    )
+    return render(request, "wmaApp/dashboard.html", context)
+
+
+def dashboard_summaries(owner_id, staff_id, today):
+    """The DailySummary rows the day's dashboard figures are summed from."""
+    summaries = DailySummary.objects.filter(ownerID_id=owner_id, date=today)
+    if staff_id is not None:
+        summaries = summaries.filter(staffID_id=staff_id)
+    return summaries
+
+
+def dashboard_daily_series(owner_id, today):
+    """Sales and payments per day of the last 7 days (today included), for the whole business."""
+    return (
+        DailySummary.objects.filter(
+            date__range=[today - datetime.timedelta(days=6), today],
+            ownerID_id=owner_id,
         )
+        .values("date")
+        .annotate(sales=Sum("salesAmountAfterTax"), payments=Sum("paymentAmount"))
+        .order_by("date")
+    )
+
+
+def dashboard_context(owner_id, staff_id, today):
+    """Figures of the dashboard for the owner, or for one driver when staff_id is given."""
+    summaries = dashboard_summaries(owner_id, staff_id, today)
+    if staff_id is None:
         total_customers = Customer.objects.filter(
             isDeleted=False, ownerID_id=owner_id
         ).count()
@@ -149,122 +148,41 @@ def dashboard(request):
         total_locations = Location.objects.filter(
             isDeleted=False, ownerID_id=owner_id
         ).count()
-
-        today = timezone.now().date()
-        seven_days_ago = today - datetime.timedelta(
-            days=6
-        )  # last 7 days including today
-
-        # Get sales grouped by date
-        sales_data = (
-            Sales.objects.filter(
-                saleDate__range=[seven_days_ago, today],
-                isDeleted=False,
-                ownerID_id=owner_id,
-            )
-            .values("saleDate")  # directly group by date
-            .annotate(total=Sum("totalAmountAfterTax"))
-            .order_by("saleDate")
-        )
-        # Get sales grouped by date
-        payment_data = (
-            Payment.objects.filter(
-                paymentDate__range=[seven_days_ago, today],
-                isDeleted=False,
-                ownerID_id=owner_id,
-            )
-            .values("paymentDate")  # directly group by date
-            .annotate(total=Sum("paymentAmount"))
-            .order_by("paymentDate")
-        )
     else:
-        payments_today = (
-            Payment.objects.filter(
-                paymentDate=today,
-                isDeleted=False,
-                ownerID_id=owner_id,
-                addedByID__userID_id=request.user.pk,
-            ).aggregate(total=Sum("paymentAmount"))["total"]
-            or 0
-        )
-        jars_in = (
-            JarCounter.objects.filter(
-                date=today,
-                ownerID_id=owner_id,
-                isDeleted=False,
-                addedByID__userID_id=request.user.pk,
-            ).aggregate(total=Sum("inJar"))["total"]
-            or 0
-        )
-        jars_out = (
-            JarCounter.objects.filter(
-                date=today,
-                ownerID_id=owner_id,
-                isDeleted=False,
-                addedByID__userID_id=request.user.pk,
-            ).aggregate(total=Sum("outJar"))["total"]
-            or 0
-        )
-        total_expense = (
-            Expense.objects.filter(
-                isDeleted=False,
-                ownerID_id=owner_id,
-                expenseDate=today,
-                staffID__userID_id=request.user.pk,
-            ).aggregate(total=Sum("expenseAmount"))["total"]
-            or 0
-        )
-        total_sales = (
-            Sales.objects.filter(
-                isDeleted=False,
-                ownerID_id=owner_id,
-                saleDate=today,
-                addedByID__userID_id=request.user.pk,
-            ).aggregate(total=Sum("totalAmount"))["total"]
-            or 0
-        )
         total_customers = 0
         total_staff = 0
         total_suppliers = 0
         total_locations = 0
 
-        today = timezone.now().date()
-        seven_days_ago = today - datetime.timedelta(
-            days=6
-        )  # last 7 days including today
-
-        # Get sales grouped by date
-        sales_data = (
-            Sales.objects.filter(
-                saleDate__range=[seven_days_ago, today],
-                isDeleted=False,
-                ownerID_id=owner_id,
-            )
-            .values("saleDate")  # directly group by date
-            .annotate(total=Sum("totalAmountAfterTax"))
-            .order_by("saleDate")
-        )
-        # Get sales grouped by date
-        payment_data = (
-            Payment.objects.filter(
-                paymentDate__range=[seven_days_ago, today],
-                isDeleted=False,
-                ownerID_id=owner_id,
-            )
-            .values("paymentDate")  # directly group by date
-            .annotate(total=Sum("paymentAmount"))
-            .order_by("paymentDate")
-        )
+    totals = summaries.aggregate(
+        payments=Sum("paymentAmount"),
+        jars_in=Sum("jarsIn"),
+        jars_out=Sum("jarsOut"),
+        expense=Sum("expenseAmount"),
+        sales=Sum("salesAmount"),
+    )
+    payments_today = totals["payments"] or 0
+    jars_in = totals["jars_in"] or 0
+    jars_out = totals["jars_out"] or 0
+    total_expense = totals["expense"] or 0
+    total_sales = totals["sales"] or 0
+
+    seven_days_ago = today - datetime.timedelta(
+        days=6
+    )  # last 7 days including today
+
+    # Get sales and payments grouped by date, for the whole business
+    daily_data = dashboard_daily_series(owner_id, today)
 
     # Convert to dict for quick lookup
-    sales_dict = {entry["saleDate"]: entry["total"] for entry in sales_data}
+    sales_dict = {entry["date"]: entry["sales"] for entry in daily_data}
 
     final_dates = [(seven_days_ago + datetime.timedelta(days=i)) for i in range(7)]
     sales_date = [d.strftime("%b %d") for d in final_dates]
     sales_totals_by_date = [sales_dict.get(d, 0) for d in final_dates]
 
     # Convert to dict for quick lookup
-    payment_dict = {entry["paymentDate"]: entry["total"] for entry in payment_data}
+    payment_dict = {entry["date"]: entry["payments"] for entry in daily_data}
     payment_totals_by_date = [payment_dict.get(d, 0) for d in final_dates]
 
     context = {
@@ -281,7 +199,7 @@ def dashboard(request):
         "total_locations": total_locations,
         "payment_totals_by_date": json.dumps(payment_totals_by_date),
     }
-    return render(request, "wmaApp/dashboard.html", context)
+    return context
 
 
 def admin_home(request):
@@ -291,7 +209,7 @@ def admin_home(request):
 @check_groups("Owner", "Manager", "Admin")
 def manage_staff(request):
     logger.info("Manage staff called")
-    owner_id = get_owner_id(request)
+    owner_id = request.tenant.owner_id
     groups = UserGroup.objects.filter(isDeleted=False, ownerID_id=owner_id)
 
     context = {"groups": groups}
@@ -302,7 +220,7 @@ def manage_staff(request):
 def manage_customer(request):
     logger.info("Manage customer called")
     location = Location.objects.filter(
-        isDeleted=False, ownerID_id=get_owner_id(request)
+        isDeleted=False, ownerID_id=request.tenant.owner_id
     )
 
     context = {"locations": location}
@@ -358,10 +276,10 @@ def manage_hsn_and_tax(request):
 def manage_product(request):
     logger.info("Manage product called")
     categories = Category.objects.filter(
-        isDeleted=False, ownerID_id=get_owner_id(request)
+        isDeleted=False, ownerID_id=request.tenant.owner_id
     )
-    taxs = TaxAndHsn.objects.filter(isDeleted=False, ownerID_id=get_owner_id(request))
-    units = Unit.objects.filter(isDeleted=False, ownerID_id=get_owner_id(request))
+    taxs = TaxAndHsn.objects.filter(isDeleted=False, ownerID_id=request.tenant.owner_id)
+    units = Unit.objects.filter(isDeleted=False, ownerID_id=request.tenant.owner_id)
 
     context = {"categories": categories, "taxs": taxs, "units": units}
 
@@ -377,7 +295,7 @@ def add_sale(request):
 @check_groups("Owner", "Manager", "Admin", "Driver")
 def sales_list(request):
     logger.info("Sales list called")
-    staffs = StaffUser.objects.filter(isDeleted=False, ownerID_id=get_owner_id(request))
+    staffs = StaffUser.objects.filter(isDeleted=False, ownerID_id=request.tenant.owner_id)
     context = {"staffs": staffs}
     return render(request, "wmaApp/sales/sales_list.html", context)
 
@@ -386,10 +304,10 @@ def sales_list(request):
 def edit_sale(request, id=None):
     logger.info("Edit sale called")
     object = get_object_or_404(
-        Sales, pk=id, isDeleted=False, ownerID_id=get_owner_id(request)
+        Sales, pk=id, isDeleted=False, ownerID_id=request.tenant.owner_id
     )
     products = SaleProduct.objects.filter(
-        isDeleted=False, ownerID_id=get_owner_id(request), salesID_id=object.id
+        isDeleted=False, ownerID_id=request.tenant.owner_id, salesID_id=object.id
     )
 
     context = {"object": object, "products": products}
@@ -400,10 +318,10 @@ def edit_sale(request, id=None):
 def detail_sale(request, id=None):
     logger.info("Detail sale called")
     object = get_object_or_404(
-        Sales, pk=id, isDeleted=False, ownerID_id=get_owner_id(request)
+        Sales, pk=id, isDeleted=False, ownerID_id=request.tenant.owner_id
     )
     products = SaleProduct.objects.filter(
-        isDeleted=False, ownerID_id=get_owner_id(request), salesID_id=object.id
+        isDeleted=False, ownerID_id=request.tenant.owner_id, salesID_id=object.id
     )
 
     context = {"object": object, "products": products}
@@ -414,7 +332,7 @@ def detail_sale(request, id=None):
 def manage_expense(request):
     logger.info("Manage expense called")
     instances = ExpenseGroup.objects.filter(
-        isDeleted=False, ownerID_id=get_owner_id(request)
+        isDeleted=False, ownerID_id=request.tenant.owner_id
     )
     context = {"instances": instances}
 
@@ -453,24 +371,35 @@ def my_profile(request):
 def customer_ledger(request, id=None):
     logger.info("Customer Ledger called with id: " + str(id))
     object = get_object_or_404(
-        Customer, pk=id, isDeleted=False, ownerID_id=get_owner_id(request)
+        Customer, pk=id, isDeleted=False, ownerID_id=request.tenant.owner_id
     )
 
-    last_entry = CustomerLedger.objects.filter(
-        customerID_id=id, isDeleted=False, ownerID_id=get_owner_id(request)
-    ).last()
-    if last_entry:
-        running_balance = last_entry.balance
-    else:
-        running_balance = 0
-    context = {"object": object, "balance": running_balance}
+    running_balance = CustomerBalance.objects.filter(customerID_id=id).values_list(
+        "balance", flat=True
+    ).first()
+    context = {"object": object, "balance": running_balance or 0}
+
+    # opening and closing balance of a statement period, ?startDate=&endDate= as dd/mm/yyyy
+    try:
+        startDate = datetime.datetime.strptime(request.GET["startDate"], "%d/%m/%Y").date()
+        endDate = datetime.datetime.strptime(request.GET["endDate"], "%d/%m/%Y").date()
+    except (KeyError, ValueError):
+        startDate = endDate = None
+    if startDate and endDate:
+        opening, closing = opening_closing(request.tenant.owner_id, [object.pk], startDate, endDate)[object.pk]
+        context.update({
+            "startDate": startDate.strftime("%d/%m/%Y"),
+            "endDate": endDate.strftime("%d/%m/%Y"),
+            "opening": opening,
+            "closing": closing,
+        })
     return render(request, "wmaApp/customer/customer_ledger.html", context)
 
 
 @check_groups("Owner", "Manager", "Admin", "Driver")
 def reports(request):
     logger.info("Reports called")
-    owner_id = get_owner_id(request)
+    owner_id = request.tenant.owner_id
     locations = Location.objects.filter(ownerID_id=owner_id, isDeleted=False).order_by(
         "name"
     )
@@ -482,7 +411,7 @@ def reports(request):
 @check_groups("Owner", "Manager", "Admin", "Driver")
 def booking_list(request):
     logger.info("Booking list called")
-    staffs = StaffUser.objects.filter(isDeleted=False, ownerID_id=get_owner_id(request))
+    staffs = StaffUser.objects.filter(isDeleted=False, ownerID_id=request.tenant.owner_id)
     context = {"staffs": staffs}
     return render(request, "wmaApp/booking/booking_list.html", context)
 
@@ -491,10 +420,10 @@ def booking_list(request):
 def edit_booking(request, id=None):
     logger.info("Edit booking called")
     object = get_object_or_404(
-        AdvanceOrder, pk=id, isDeleted=False, ownerID_id=get_owner_id(request)
+        AdvanceOrder, pk=id, isDeleted=False, ownerID_id=request.tenant.owner_id
     )
     products = AdvanceOrderProduct.objects.filter(
-        isDeleted=False, ownerID_id=get_owner_id(request), orderID_id=object.id
+        isDeleted=False, ownerID_id=request.tenant.owner_id, orderID_id=object.id
     )
 
     context = {"object": object, "products": products}
@@ -505,10 +434,10 @@ def edit_booking(request, id=None):
 def detail_booking(request, id=None):
     logger.info("Detail booking called")
     object = get_object_or_404(
-        AdvanceOrder, pk=id, isDeleted=False, ownerID_id=get_owner_id(request)
+        AdvanceOrder, pk=id, isDeleted=False, ownerID_id=request.tenant.owner_id
     )
     products = AdvanceOrderProduct.objects.filter(
-        isDeleted=False, ownerID_id=get_owner_id(request), orderID_id=object.id
+        isDeleted=False, ownerID_id=request.tenant.owner_id, orderID_id=object.id
     )
 
     context = {"object": object, "products": products}
@@ -519,7 +448,7 @@ def detail_booking(request, id=None):
 def driver_jar_allocation(request):
     drivers = StaffUser.objects.filter(
         isDeleted=False,
-        ownerID_id=get_owner_id(request),
+        ownerID_id=request.tenant.owner_id,
         groupID__name__icontains="Driver",
     )
     logger.info("Driver jar allocation called")